@@ -0,0 +1,466 @@
+import argparse
+import glob
+import json
+import os
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    raise ImportError("analytics.py requires the 'pyarrow' package: pip install pyarrow")
+
+# ------------------------------------------------------------
+# COLUMNAR ANALYTICS EXPORT OF CAMPAIGN HISTORY
+# ------------------------------------------------------------
+# Flattens the result_*.json files written by save_result_to_json into two
+# Parquet tables, partitioned by run date (hive layout):
+#
+#   analytics/runs/date=2025-01-01/part-<ts>.parquet    one row per run
+#   analytics/posts/date=2025-01-01/part-<ts>.parquet   one row per post
+#
+# `export` only reads result files that are not yet in the manifest
+# (analytics/manifest.db), so it can run after every campaign or from cron.
+# Each export adds one small part file per date; `compact` rewrites every
+# date that has several parts into a single file. Reports then read only
+# the columns and dates they need instead of parsing every JSON file.
+#
+# Each partition keeps a `_parts.json` listing its live part files, and
+# readers only open listed parts. Writers put the new part in place first
+# and then swap the listing atomically (tmp file + os.replace), so a crash
+# at any point leaves either the old or the new set of parts visible, never
+# both. Unlisted leftovers are deleted by the next `compact`.
+
+ANALYTICS_DIR = "analytics"
+RESULTS_GLOB = "result_*.json"
+PARTS_MANIFEST = "_parts.json"
+
+RUNS_SCHEMA = pa.schema([
+    ("run_id", pa.string()),
+    ("created_at", pa.timestamp("s")),
+    ("topic", pa.string()),
+    ("brand", pa.string()),
+    ("num_posts", pa.int32()),
+    ("num_image_prompts", pa.int32()),
+    ("num_images", pa.int32()),
+    ("has_reel_script", pa.bool_()),
+    ("reel_scenes", pa.int32()),
+    ("reel_video", pa.string()),
+    ("zapier_status", pa.string()),
+    ("zapier_mode", pa.string()),
+    ("elapsed_seconds", pa.float64()),
+    ("estimated_cost", pa.float64()),
+    ("degradations", pa.list_(pa.string())),
+    ("source_file", pa.string()),
+])
+
+POSTS_SCHEMA = pa.schema([
+    ("run_id", pa.string()),
+    ("created_at", pa.timestamp("s")),
+    ("topic", pa.string()),
+    ("brand", pa.string()),
+    ("position", pa.int32()),
+    ("title", pa.string()),
+    ("caption", pa.string()),
+    ("hashtags", pa.string()),
+    ("caption_chars", pa.int32()),
+    ("image_prompt", pa.string()),
+    ("image_url", pa.string()),
+    ("clean_url", pa.string()),
+    ("zapier_status", pa.string()),
+])
+
+TABLES = {"runs": RUNS_SCHEMA, "posts": POSTS_SCHEMA}
+
+_FILENAME_TIME = re.compile(r"result_(\d{8}_\d{6})")
+
+
+# ------------------------------------------------------------
+# FLATTENING
+# ------------------------------------------------------------
+def _run_time(path):
+    """Run time from the result filename, falling back to the file mtime."""
+    match = _FILENAME_TIME.search(os.path.basename(path))
+    if match:
+        return datetime.strptime(match.group(1), "%Y%m%d_%H%M%S")
+    return datetime.fromtimestamp(int(os.path.getmtime(path)))
+
+
+def _post_image_index(images, position):
+    """Index in image_urls of a post's main image (same rule as tools.primary_image_index)."""
+    image_urls = images.get("image_urls") or []
+    if images.get("shared"):
+        return 0 if image_urls else None
+    variants = images.get("variants")
+    if variants is None:
+        return position if position < len(image_urls) else None
+    post_positions = images.get("post_positions")
+    if post_positions is None:
+        post_positions = list(range(len(variants)))
+    if position not in post_positions:
+        return None
+    prompt_index = post_positions.index(position)
+    if prompt_index >= len(variants) or not variants[prompt_index]:
+        return None
+    return sum(len(v) for v in variants[:prompt_index])
+
+
+def _status(value):
+    return None if value is None else str(value)
+
+
+def flatten_result(result, run_id, created_at, source_file=None):
+    """Flatten one pipeline result into a run row and its post rows.
+
+    Returns:
+        tuple: (run dict, list of post dicts), keyed like RUNS_SCHEMA / POSTS_SCHEMA
+    """
+    posts = result.get("posts") or []
+    prompts = result.get("image_prompts") or []
+    images = result.get("images") or {}
+    image_urls = images.get("image_urls") or []
+    clean_urls = images.get("clean_urls") or []
+    script = result.get("reel_script") or {}
+    script = script.get("reel_script", script)
+    zapier = result.get("zapier_status") or {}
+    budget = result.get("budget") or {}
+
+    # Per-post delivery status: "items" after publishing, "deliveries" when queued
+    post_status = {}
+    for item in zapier.get("items") or []:
+        post_status[item.get("position")] = _status(item.get("status"))
+    for item in zapier.get("deliveries") or []:
+        post_status[item.get("position")] = "queued"
+    if zapier and not post_status and zapier.get("status") is not None:
+        post_status[0] = _status(zapier["status"])  # Single-post ("first") mode
+
+    run = {
+        "run_id": run_id,
+        "created_at": created_at,
+        "topic": result.get("topic"),
+        "brand": result.get("brand"),
+        "num_posts": len(posts),
+        "num_image_prompts": len(prompts),
+        "num_images": len(image_urls),
+        "has_reel_script": bool(script),
+        "reel_scenes": len(script.get("scenes") or []),
+        "reel_video": result.get("reel_video"),
+        "zapier_status": _status(zapier.get("status")),
+        "zapier_mode": zapier.get("mode"),
+        "elapsed_seconds": budget.get("elapsed_seconds"),
+        "estimated_cost": budget.get("estimated_cost"),
+        "degradations": [str(d) for d in budget.get("degradations") or []],
+        "source_file": source_file,
+    }
+
+    # Prompt of each post: untitled posts get none, so prompts are not aligned with posts
+    post_positions = images.get("post_positions")
+    if post_positions is None:
+        post_positions = list(range(len(prompts)))
+    prompt_by_post = dict(zip(post_positions, prompts))
+
+    post_rows = []
+    for position, post in enumerate(posts):
+        image_index = _post_image_index(images, position)
+        caption = post.get("caption") or ""
+        hashtags = post.get("hashtags")
+        post_rows.append({
+            "run_id": run_id,
+            "created_at": created_at,
+            "topic": result.get("topic"),
+            "brand": result.get("brand"),
+            "position": position,
+            "title": post.get("title"),
+            "caption": caption,
+            "hashtags": " ".join(hashtags) if isinstance(hashtags, list) else hashtags,
+            "caption_chars": len(caption),
+            "image_prompt": prompt_by_post.get(position),
+            "image_url": image_urls[image_index] if image_index is not None else None,
+            "clean_url": clean_urls[image_index] if image_index is not None and image_index < len(clean_urls) else None,
+            "zapier_status": post_status.get(position),
+        })
+    return run, post_rows
+
+
+def live_parts(directory):
+    """Part file names a date partition currently serves, in write order.
+
+    Partitions written before the listing existed serve every part file.
+    """
+    try:
+        with open(os.path.join(directory, PARTS_MANIFEST), encoding="utf-8") as f:
+            return json.load(f)["parts"]
+    except FileNotFoundError:
+        return sorted(os.path.basename(path) for path in glob.glob(os.path.join(directory, "part-*.parquet")))
+
+
+def _write_parts_manifest(directory, parts):
+    """Atomically replace the list of live part files of a partition."""
+    path = os.path.join(directory, PARTS_MANIFEST)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"parts": parts}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+
+
+# ------------------------------------------------------------
+# EXPORTER
+# ------------------------------------------------------------
+class AnalyticsExporter:
+    """Incrementally exports result files into date-partitioned Parquet tables."""
+
+    def __init__(self, analytics_dir=ANALYTICS_DIR, results_glob=RESULTS_GLOB):
+        self.analytics_dir = analytics_dir
+        self.results_glob = results_glob
+        self.db_path = os.path.join(analytics_dir, "manifest.db")
+        os.makedirs(analytics_dir, exist_ok=True)
+        self._init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @contextmanager
+    def _db(self):
+        conn = self._connect()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _init_db(self):
+        with self._db() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS exported_runs (
+                    source_file TEXT PRIMARY KEY,
+                    run_id TEXT NOT NULL,
+                    run_date TEXT NOT NULL,
+                    exported_at TEXT NOT NULL
+                )
+            """)
+
+    def pending_files(self):
+        """Result files that have not been exported yet, oldest first."""
+        with self._db() as conn:
+            exported = {row["source_file"] for row in conn.execute("SELECT source_file FROM exported_runs")}
+        files = [os.path.abspath(path) for path in glob.glob(self.results_glob)]
+        return sorted((path for path in files if path not in exported), key=_run_time)
+
+    def _write_part(self, table_name, rows, run_date, stamp):
+        """Write rows as a new part file in a date partition, then list it."""
+        directory = os.path.join(self.analytics_dir, table_name, f"date={run_date}")
+        os.makedirs(directory, exist_ok=True)
+        parts = live_parts(directory)
+        name = f"part-{stamp}.parquet"
+        table = pa.Table.from_pylist(rows, schema=TABLES[table_name])
+        pq.write_table(table, os.path.join(directory, name + ".tmp"))
+        os.replace(os.path.join(directory, name + ".tmp"), os.path.join(directory, name))
+        _write_parts_manifest(directory, parts + [name])
+
+    def export(self, limit=None):
+        """Export result files that are not in the manifest yet.
+
+        Args:
+            limit (int): Export at most this many files (None = all pending)
+
+        Returns:
+            dict: {"runs": files exported, "posts": post rows, "skipped": unreadable files}
+        """
+        started = time.monotonic()
+        pending = self.pending_files()[:limit]
+
+        by_date = {}
+        skipped = 0
+        for path in pending:
+            try:
+                with open(path, encoding="utf-8") as f:
+                    result = json.load(f)
+                created_at = _run_time(path)
+                run_id = os.path.splitext(os.path.basename(path))[0]
+                run, post_rows = flatten_result(result, run_id, created_at, path)
+            except (OSError, ValueError, AttributeError) as e:
+                print(f"⚠️ Skipping {path}: {e}")
+                skipped += 1
+                continue
+            batch = by_date.setdefault(created_at.date().isoformat(), {"runs": [], "posts": [], "files": []})
+            batch["runs"].append(run)
+            batch["posts"].extend(post_rows)
+            batch["files"].append((path, run_id))
+
+        stamp = datetime.now().strftime("%Y%m%d%H%M%S%f")
+        exported_runs = exported_posts = 0
+        for run_date, batch in sorted(by_date.items()):
+            self._write_part("runs", batch["runs"], run_date, stamp)
+            if batch["posts"]:
+                self._write_part("posts", batch["posts"], run_date, stamp)
+            # Record only after the part files are in place
+            now = datetime.now().isoformat()
+            with self._db() as conn:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO exported_runs (source_file, run_id, run_date, exported_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    [(path, run_id, run_date, now) for path, run_id in batch["files"]]
+                )
+            exported_runs += len(batch["runs"])
+            exported_posts += len(batch["posts"])
+
+        print(f"✓ Exported {exported_runs} runs / {exported_posts} posts "
+              f"into {len(by_date)} date partition(s) in {time.monotonic() - started:.2f}s")
+        return {"runs": exported_runs, "posts": exported_posts, "skipped": skipped}
+
+    def compact(self, min_parts=2):
+        """Merge the part files of each date partition into one file.
+
+        Args:
+            min_parts (int): Only rewrite partitions with at least this many parts
+
+        Returns:
+            int: Number of partitions compacted
+        """
+        compacted = 0
+        for table_name, schema in TABLES.items():
+            for directory in sorted(glob.glob(os.path.join(self.analytics_dir, table_name, "date=*"))):
+                parts = live_parts(directory)
+                if len(parts) >= min_parts:
+                    table = pa.concat_tables([
+                        pq.read_table(os.path.join(directory, part), schema=schema) for part in parts
+                    ])
+                    table = table.sort_by([("created_at", "ascending")])
+                    name = f"part-{datetime.now().strftime('%Y%m%d%H%M%S%f')}-c.parquet"
+                    pq.write_table(table, os.path.join(directory, name + ".tmp"))
+                    os.replace(os.path.join(directory, name + ".tmp"), os.path.join(directory, name))
+                    # Switch readers to the merged part before removing anything
+                    _write_parts_manifest(directory, [name])
+                    parts = [name]
+                    compacted += 1
+                # Old parts and leftovers of an interrupted export or compact
+                for path in glob.glob(os.path.join(directory, "part-*.parquet*")):
+                    if os.path.basename(path) not in parts:
+                        os.remove(path)
+        print(f"✓ Compacted {compacted} partition(s)")
+        return compacted
+
+    def stats(self):
+        with self._db() as conn:
+            row = conn.execute(
+                "SELECT COUNT(*) AS runs, MIN(run_date) AS first_date, MAX(run_date) AS last_date "
+                "FROM exported_runs"
+            ).fetchone()
+        return dict(row)
+
+
+# ------------------------------------------------------------
+# QUERY HELPER
+# ------------------------------------------------------------
+def query(table="runs", start=None, end=None, columns=None, where=None, analytics_dir=ANALYTICS_DIR):
+    """Read an exported table, pruning date partitions and columns.
+
+    Args:
+        table (str): "runs" or "posts"
+        start (str): First date to include, "YYYY-MM-DD" (None = no lower bound)
+        end (str): Last date to include, "YYYY-MM-DD" (None = no upper bound)
+        columns (list): Columns to read (None = all, including "date")
+        where: Extra pyarrow.dataset expression, e.g. ds.field("zapier_status") == "200"
+        analytics_dir (str): Export directory
+
+    Returns:
+        pyarrow.Table (call .to_pandas() for a DataFrame)
+    """
+    if table not in TABLES:
+        raise ValueError(f"Unknown table {table!r} (expected one of: {', '.join(TABLES)})")
+
+    schema = TABLES[table].append(pa.field("date", pa.string()))
+    directory = os.path.join(analytics_dir, table)
+    if not os.path.isdir(directory):
+        return schema.empty_table().select(columns) if columns else schema.empty_table()
+
+    files = [
+        os.path.join(partition, part)
+        for partition in sorted(glob.glob(os.path.join(directory, "date=*")))
+        for part in live_parts(partition)
+    ]
+    dataset = ds.dataset(
+        files, format="parquet", schema=schema,
+        partitioning=ds.partitioning(pa.schema([("date", pa.string())]), flavor="hive"),
+        partition_base_dir=directory,
+        exclude_invalid_files=True
+    )
+    expression = where
+    for bound in (
+        ds.field("date") >= start if start else None,
+        ds.field("date") <= end if end else None,
+    ):
+        if bound is not None:
+            expression = bound if expression is None else expression & bound
+    return dataset.to_table(columns=columns, filter=expression)
+
+
+def weekly_report(start=None, end=None, analytics_dir=ANALYTICS_DIR):
+    """Runs, posts, images and estimated cost per ISO week.
+
+    Returns:
+        pyarrow.Table with columns week, runs, posts, images, estimated_cost
+    """
+    runs = query(
+        "runs", start, end,
+        columns=["created_at", "num_posts", "num_images", "estimated_cost"],
+        analytics_dir=analytics_dir
+    )
+    weeks = pc.strftime(runs["created_at"], format="%G-W%V")
+    runs = runs.append_column("week", weeks)
+    report = runs.group_by("week").aggregate([
+        ("created_at", "count"),
+        ("num_posts", "sum"),
+        ("num_images", "sum"),
+        ("estimated_cost", "sum"),
+    ])
+    report = report.rename_columns(["week", "runs", "posts", "images", "estimated_cost"])
+    return report.sort_by("week")
+
+
+# ------------------------------------------------------------
+# COMMAND LINE
+# ------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Columnar export of campaign results")
+    parser.add_argument("--dir", default=ANALYTICS_DIR, help="Export directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="Export new result_*.json files")
+    export.add_argument("--results", default=RESULTS_GLOB, help="Glob of result files")
+    export.add_argument("--compact", action="store_true", help="Compact partitions afterwards")
+
+    commands.add_parser("compact", help="Merge part files per date partition")
+
+    report = commands.add_parser("report", help="Runs, posts, images and cost per week")
+    report.add_argument("--start", help="First date, YYYY-MM-DD")
+    report.add_argument("--end", help="Last date, YYYY-MM-DD")
+
+    args = parser.parse_args()
+
+    if args.command == "export":
+        exporter = AnalyticsExporter(args.dir, args.results)
+        exporter.export()
+        if args.compact:
+            exporter.compact()
+    elif args.command == "compact":
+        AnalyticsExporter(args.dir).compact()
+    else:
+        table = weekly_report(args.start, args.end, args.dir)
+        print(f"{'week':<10}  {'runs':>5}  {'posts':>6}  {'images':>6}  {'cost':>8}")
+        for row in table.to_pylist():
+            print(f"{row['week']:<10}  {row['runs']:>5}  {row['posts'] or 0:>6}  "
+                  f"{row['images'] or 0:>6}  ${row['estimated_cost'] or 0:>7.4f}")
+
+
+if __name__ == "__main__":
+    main()
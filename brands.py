@@ -0,0 +1,192 @@
+import json
+import os
+import threading
+
+from config import BRANDS_PATH, DEFAULT_BRAND
+from overlay import load_font, load_watermark, brand_layer
+
+# ------------------------------------------------------------
+# BRAND PROFILES
+# ------------------------------------------------------------
+# A campaign is run for a named brand profile instead of loose brand_text /
+# text_size arguments. Profiles are read from BRANDS_PATH (JSON, optional):
+#
+#   {
+#     "experts": {"brand_text": "Experts Group FZE", "website_text": "www.example.com",
+#                 "font_path": "fonts/Montserrat-Bold.ttf", "text_size": 80,
+#                 "text_color": "#FFFFFF", "shadow_color": "#000000",
+#                 "watermark_path": "brands/experts_logo.png", "watermark_position": "top-right",
+#                 "image_style": "Warm gold and navy palette, modern Dubai offices."}
+#   }
+#
+# Profiles are loaded once per process. Their fonts and watermarks are
+# cached by overlay.py, and the finished overlay layer is cached per image
+# size, so a worker running campaigns for several brands lays each brand
+# out once instead of once per image.
+
+# Default of agent.run(brand_text=...): take the text from the brand profile
+USE_PROFILE = object()
+
+BUILTIN_PROFILES = {
+    "default": {"brand_text": "Experts Group FZE", "text_size": 80},
+}
+
+
+def parse_color(value):
+    """Turn "#RRGGBB", "#RRGGBBAA" or a list of ints into a color tuple (None stays None)."""
+    if value is None or isinstance(value, tuple):
+        return value
+    if isinstance(value, str):
+        hex_value = value.lstrip("#")
+        if len(hex_value) not in (6, 8):
+            raise ValueError(f"Invalid color: {value}")
+        return tuple(int(hex_value[i:i + 2], 16) for i in range(0, len(hex_value), 2))
+    return tuple(int(channel) for channel in value)
+
+
+class BrandProfile:
+    """Overlay settings and prompt fragments for one brand."""
+
+    def __init__(
+        self,
+        name,
+        brand_text,
+        website_text="",
+        text_size=80,
+        font_path=None,
+        text_color=(255, 255, 255),
+        shadow_color=(0, 0, 0),
+        watermark_path=None,
+        watermark_position="bottom-right",
+        watermark_scale=0.15,
+        watermark_opacity=1.0,
+        image_style=""
+    ):
+        """
+        Args:
+            name (str): Profile name campaigns select it by
+            brand_text (str): Overlay line 1
+            website_text (str): Overlay line 2, drawn 30% smaller (optional)
+            text_size (int): Font size for line 1
+            font_path (str): TrueType font file (None = system font)
+            text_color: Text color ("#RRGGBB" or RGB tuple)
+            shadow_color: Drop shadow color (None = no shadow)
+            watermark_path (str): Logo image pasted in a corner (optional)
+            watermark_position (str): "top-left", "top-right", "bottom-left" or "bottom-right"
+            watermark_scale (float): Logo width as a fraction of the image width
+            watermark_opacity (float): 0.0 - 1.0
+            image_style (str): Style fragment added to every image prompt (optional)
+        """
+        self.name = name
+        self.brand_text = brand_text
+        self.website_text = website_text or ""
+        self.text_size = int(text_size)
+        self.font_path = font_path
+        self.text_color = parse_color(text_color)
+        self.shadow_color = parse_color(shadow_color)
+        self.watermark_path = watermark_path
+        self.watermark_position = watermark_position
+        self.watermark_scale = float(watermark_scale)
+        self.watermark_opacity = float(watermark_opacity)
+        self.image_style = " ".join((image_style or "").split())
+
+    def overlay_style(self):
+        """Keyword arguments for overlay.brand_layer besides the text and its size."""
+        return {
+            "font_path": self.font_path,
+            "text_color": self.text_color,
+            "shadow_color": self.shadow_color,
+            "watermark_path": self.watermark_path,
+            "watermark_position": self.watermark_position,
+            "watermark_scale": self.watermark_scale,
+            "watermark_opacity": self.watermark_opacity,
+        }
+
+    def layer(self, size, brand_text=None, text_size=None):
+        """Cached overlay pieces for an image size (see overlay.brand_layer).
+
+        Args:
+            size (tuple): (width, height) of the image
+            brand_text (str): Override for line 1 (None = the profile's text)
+            text_size (int): Override for the font size (None = the profile's size)
+        """
+        return brand_layer(
+            tuple(size),
+            brand_text if brand_text is not None else self.brand_text,
+            self.website_text,
+            text_size or self.text_size,
+            **self.overlay_style()
+        )
+
+    def preload(self, sizes=()):
+        """Load this profile's fonts and watermark, and build its layers for the given sizes."""
+        load_font(self.text_size, self.font_path)
+        load_font(int(self.text_size * 0.7), self.font_path)
+        if self.watermark_path:
+            load_watermark(self.watermark_path)
+        for size in sizes:
+            self.layer(size)
+
+    def to_dict(self):
+        return {"name": self.name, "brand_text": self.brand_text, "website_text": self.website_text,
+                "text_size": self.text_size, **self.overlay_style(), "image_style": self.image_style}
+
+
+# ------------------------------------------------------------
+# PROFILE REGISTRY
+# ------------------------------------------------------------
+_profiles = None
+_profiles_lock = threading.Lock()
+
+
+def load_brands(path=BRANDS_PATH):
+    """Read brand profiles from a JSON file (built-in profiles are always included).
+
+    Returns:
+        dict: name -> BrandProfile
+    """
+    definitions = {name: dict(settings) for name, settings in BUILTIN_PROFILES.items()}
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for name, settings in json.load(f).items():
+                definitions[name] = settings
+
+    profiles = {}
+    for name, settings in definitions.items():
+        try:
+            profiles[name] = BrandProfile(name, **settings)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Invalid brand profile '{name}' in {path}: {e}")
+    return profiles
+
+
+def get_brands():
+    """All brand profiles, loaded once per process."""
+    global _profiles
+    if _profiles is None:
+        with _profiles_lock:
+            if _profiles is None:
+                _profiles = load_brands()
+    return _profiles
+
+
+def get_brand(name=None):
+    """Look up a brand profile by name (None = DEFAULT_BRAND)."""
+    brands = get_brands()
+    name = name or DEFAULT_BRAND
+    if name not in brands:
+        raise ValueError(f"Unknown brand profile: {name} (available: {', '.join(sorted(brands))})")
+    return brands[name]
+
+
+def preload_brands(sizes=()):
+    """Warm every profile's fonts, watermark and overlay layers (e.g. at worker start).
+
+    Returns:
+        list: Names of the loaded profiles
+    """
+    brands = get_brands()
+    for brand in brands.values():
+        brand.preload(sizes)
+    print(f"🏷️  Loaded {len(brands)} brand profile(s): {', '.join(sorted(brands))}")
+    return sorted(brands)
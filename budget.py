@@ -0,0 +1,125 @@
+import threading
+import time
+
+# ------------------------------------------------------------
+# PER-RUN DEADLINE AND COST BUDGET
+# ------------------------------------------------------------
+# A RunBudget is created once per pipeline run and handed to every
+# stage. Stages ask it for timeouts and whether they can still afford a
+# call, and degrade (template prompts, fewer images, no overlay) instead
+# of blocking past the deadline or overspending.
+
+# Rough USD cost per external call, used for budgeting only
+DEFAULT_COSTS = {
+    "text": 0.001,          # gpt-4o-mini posts / reel script completion
+    "smart_prompt": 0.0003,  # gpt-4o-mini image prompt completion
+    "image": 0.003,         # one flux-schnell output image
+    "embedding": 0.00002,   # text-embedding-3-small request for one run's image prompts
+}
+
+MIN_TIMEOUT = 1.0  # Never hand out a timeout shorter than this
+
+
+class BudgetExceeded(Exception):
+    """Raised when a required stage cannot run within the run's limits."""
+
+
+class RunBudget:
+    """Deadline and cost limits shared by all stages of one pipeline run."""
+
+    def __init__(self, deadline_seconds=None, max_cost=None, costs=None):
+        """
+        Args:
+            deadline_seconds (float): Wall-clock limit for the run (None = no limit)
+            max_cost (float): Cost limit in USD (None = no limit)
+            costs (dict): Overrides for DEFAULT_COSTS
+        """
+        self.started = time.monotonic()
+        self.deadline = self.started + deadline_seconds if deadline_seconds else None
+        self.max_cost = max_cost
+        self.costs = dict(DEFAULT_COSTS, **(costs or {}))
+        self.spent = 0.0
+        self.degradations = []
+        self._cost_lock = threading.Lock()
+
+    # --------------------------------------------------------
+    # TIME
+    # --------------------------------------------------------
+    def remaining_time(self):
+        """Seconds left before the deadline (None = no deadline)."""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def expired(self):
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def has_time_for(self, seconds):
+        """True if at least `seconds` remain before the deadline."""
+        remaining = self.remaining_time()
+        return remaining is None or remaining >= seconds
+
+    def timeout(self, default):
+        """Timeout for the next external call: the default, capped by the deadline."""
+        remaining = self.remaining_time()
+        if remaining is None:
+            return default
+        if remaining <= 0:
+            raise BudgetExceeded("Run deadline reached")
+        return max(MIN_TIMEOUT, min(default, remaining)) if default else max(MIN_TIMEOUT, remaining)
+
+    # --------------------------------------------------------
+    # COST
+    # --------------------------------------------------------
+    def remaining_cost(self):
+        """USD left in the budget (None = no cost limit)."""
+        if self.max_cost is None:
+            return None
+        return max(0.0, self.max_cost - self.spent)
+
+    def affordable(self, kind):
+        """How many calls of `kind` still fit in the cost budget (None = unlimited)."""
+        remaining = self.remaining_cost()
+        if remaining is None:
+            return None
+        return int(remaining // self.costs[kind]) if self.costs[kind] else None
+
+    def can_afford(self, kind, count=1):
+        """True if `count` calls of `kind` fit in the budget and time remains."""
+        if self.expired():
+            return False
+        affordable = self.affordable(kind)
+        return affordable is None or affordable >= count
+
+    def charge(self, kind, count=1):
+        with self._cost_lock:
+            self.spent += self.costs[kind] * count
+
+    def reserve(self, kind, count=1):
+        """Charge `count` calls of `kind` if they fit (atomic across threads).
+
+        Returns:
+            bool: False (nothing charged) if the calls can't be afforded
+        """
+        with self._cost_lock:
+            if not self.can_afford(kind, count):
+                return False
+            self.spent += self.costs[kind] * count
+            return True
+
+    # --------------------------------------------------------
+    # REPORTING
+    # --------------------------------------------------------
+    def degrade(self, message):
+        """Record (and print) a graceful degradation."""
+        print(f"⏱️  Budget: {message}")
+        self.degradations.append(message)
+
+    def summary(self):
+        return {
+            "elapsed_seconds": round(time.monotonic() - self.started, 2),
+            "deadline_seconds": round(self.deadline - self.started, 2) if self.deadline else None,
+            "estimated_cost": round(self.spent, 4),
+            "max_cost": self.max_cost,
+            "degradations": list(self.degradations),
+        }
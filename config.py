@@ -9,6 +9,51 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 ZAPIER_WEBHOOK_URL = os.getenv("ZAPIER_WEBHOOK_URL")
 REPLICATE_API_TOKEN = os.getenv("REPLICATE_API_TOKEN")
 IMGBB_API_KEY = os.getenv("IMGBB_API_KEY", "")  # Optional - for image hosting
+IMGBB_EXPIRATION = int(os.getenv("IMGBB_EXPIRATION", "0"))  # Optional - seconds until hosted images expire (0 = never)
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))  # Seconds per OpenAI request
+
+# Text model routing: comma-separated model list per function (first = primary,
+# the rest are hedge/failover models)
+OPENAI_MODEL_ROUTES = {
+    "posts": os.getenv("OPENAI_MODELS_POSTS", "gpt-4o-mini,gpt-4.1-mini").split(","),
+    "image_prompt": os.getenv("OPENAI_MODELS_IMAGE_PROMPT", "gpt-4o-mini,gpt-4.1-mini").split(","),
+    "reel_script": os.getenv("OPENAI_MODELS_REEL_SCRIPT", "gpt-4o-mini,gpt-4.1-mini").split(","),
+}
+OPENAI_HEDGE_PERCENTILE = float(os.getenv("OPENAI_HEDGE_PERCENTILE", "95"))  # 0 = failover only, no hedging
+
+# Replicate webhooks (optional - used by prediction_mode="webhook")
+REPLICATE_WEBHOOK_URL = os.getenv("REPLICATE_WEBHOOK_URL", "")  # Public URL forwarding to the local receiver
+REPLICATE_WEBHOOK_PORT = int(os.getenv("REPLICATE_WEBHOOK_PORT", "8765"))
+REPLICATE_WEBHOOK_SECRET = os.getenv("REPLICATE_WEBHOOK_SECRET", "")  # "whsec_..." signing secret
+
+# Image encoding before upload (all optional)
+IMAGE_TARGET = os.getenv("IMAGE_TARGET", "original")  # original | instagram_square | instagram_portrait | instagram_landscape
+IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "JPEG").upper()  # JPEG (progressive) or WEBP
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "85"))
+IMAGE_MAX_KB = int(os.getenv("IMAGE_MAX_KB", "0"))  # Size budget per image (0 = no budget)
+
+# Memory / disk limits for image handling
+MAX_DOWNLOAD_MB = int(os.getenv("MAX_DOWNLOAD_MB", "25"))  # Largest image download accepted
+IMAGES_DIR_MAX_MB = int(os.getenv("IMAGES_DIR_MAX_MB", "500"))  # Evict generated images above this (0 = no limit)
+IMAGES_MAX_AGE_HOURS = float(os.getenv("IMAGES_MAX_AGE_HOURS", "72"))  # Evict generated images older than this (0 = keep)
+
+# Screening of generated images before branding (blank frames, text leaks, near-duplicates)
+SCREEN_IMAGES = os.getenv("SCREEN_IMAGES", "true").lower() in ("1", "true", "yes")
+SCREEN_MAX_RETRIES = int(os.getenv("SCREEN_MAX_RETRIES", "1"))  # Regenerations per rejected image
+
+# Index of generated base images and reuse for near-identical prompts
+IMAGE_INDEX = os.getenv("IMAGE_INDEX", "false").lower() in ("1", "true", "yes")  # Index every accepted image
+IMAGE_REUSE = os.getenv("IMAGE_REUSE", "false").lower() in ("1", "true", "yes")  # Reuse indexed images
+IMAGE_REUSE_SIMILARITY = float(os.getenv("IMAGE_REUSE_SIMILARITY", "0.95"))  # Min prompt cosine similarity
+IMAGE_REUSE_COOLDOWN_DAYS = float(os.getenv("IMAGE_REUSE_COOLDOWN_DAYS", "7"))  # Don't reuse an image again sooner
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+
+# Scheduler: hours (local time) in which scheduled campaigns are pre-generated
+OFFPEAK_HOURS = os.getenv("OFFPEAK_HOURS", "1-6")  # "start-end", end exclusive, may wrap midnight
+
+# Brand profiles (text, website line, font, colors, watermark, image style)
+BRANDS_PATH = os.getenv("BRANDS_PATH", "brands.json")  # Optional - JSON file of named profiles
+DEFAULT_BRAND = os.getenv("DEFAULT_BRAND", "default")  # Profile used when a campaign names none
 
 # Validate that all required keys are present
 if not OPENAI_API_KEY:
@@ -1,6 +1,7 @@
 import streamlit as st
 import os
 from main import SocialMediaPipelineAgent
+from brands import get_brands, get_brand
 
 
 # -----------------------------------------------------------
@@ -36,6 +37,26 @@ def main():
         help="The main topic/theme for your social media content"
     )
 
+    col_var1, col_var2 = st.columns(2)
+
+    with col_var1:
+        num_posts = st.number_input(
+            "Number of posts",
+            min_value=1,
+            max_value=10,
+            value=3,
+            help="Post variants generated in a single request"
+        )
+
+    with col_var2:
+        images_per_prompt = st.number_input(
+            "Images per post",
+            min_value=1,
+            max_value=4,
+            value=1,
+            help="Image variants per post, generated in a single prediction"
+        )
+
     st.markdown("---")
     
     col1, col2, col3 = st.columns(3)
@@ -60,17 +81,38 @@ def main():
             value=False,
             help="Automatically publish to Instagram via Zapier"
         )
+        zap_mode = st.selectbox(
+            "Publishing Mode",
+            options=["first", "batch", "concurrent"],
+            format_func=lambda m: {
+                "first": "First post only",
+                "batch": "All posts (one batched webhook)",
+                "concurrent": "All posts (one webhook per post)"
+            }[m],
+            disabled=not post_to_instagram,
+            help="Send only the first post, or every generated post and image"
+        )
     
     # Text overlay settings
     st.markdown("---")
     st.subheader("✍️ Image Text Overlay")
+
+    brand_names = sorted(get_brands())
+    brand = st.selectbox(
+        "🏷️ Brand Profile",
+        options=brand_names,
+        index=brand_names.index(get_brand().name),
+        help="Text, website line, font, colors and watermark come from the profile (brands.json)"
+    )
+    profile = get_brand(brand)
     
     col_text1, col_text2, col_text3 = st.columns(3)
     
     with col_text1:
         brand_text = st.text_input(
             "Brand Text to Display on Image",
-            value="Experts Group FZE",
+            value=profile.brand_text,
+            key=f"brand_text_{brand}",
             help="This text will appear on your generated images"
         )
     
@@ -79,9 +121,10 @@ def main():
             "Text Size",
             min_value=30,
             max_value=150,
-            value=80,
+            value=min(150, max(30, profile.text_size)),
             step=10,
-            help="Adjust the size of the text overlay (default: 80)"
+            key=f"text_size_{brand}",
+            help=f"Adjust the size of the text overlay (profile default: {profile.text_size})"
         )
     
     with col_text3:
@@ -197,8 +240,12 @@ NO TEXT in image.""",
                     use_custom_image=use_custom,
                     custom_image_path=custom_image_path,
                     push_to_zap=post_to_instagram,
+                    brand=brand,
                     brand_text=brand_text if add_text_overlay else None,
-                    text_size=text_size
+                    text_size=text_size,
+                    zap_mode=zap_mode,
+                    num_posts=int(num_posts),
+                    images_per_prompt=int(images_per_prompt)
                 )
 
                 st.success("✅ Campaign Completed Successfully!")
@@ -218,7 +265,17 @@ NO TEXT in image.""",
                         st.write(f"**Hashtags:** {post['hashtags']}")
                 
                 # Images
-                if result["images"]["image_urls"]:
+                if any(len(v) > 1 for v in result["images"].get("variants") or []):
+                    st.subheader("🎨 Images")
+                    for i, post_images in enumerate(result["images"]["variants"], 1):
+                        if not post_images:
+                            continue
+                        st.write(f"**Post {i} variants:**")
+                        cols = st.columns(len(post_images))
+                        for j, img in enumerate(post_images):
+                            with cols[j]:
+                                st.image(img, caption=f"Variant {chr(ord('A') + j)}")
+                elif result["images"]["image_urls"]:
                     st.subheader("🎨 Images")
                     cols = st.columns(min(3, len(result["images"]["image_urls"])))
                     for i, img in enumerate(result["images"]["image_urls"]):
@@ -227,7 +284,7 @@ NO TEXT in image.""",
                 
                 # Reel Script
                 st.subheader("🎬 Reel Script")
-                reel = result.get("reel_script", {}).get("reel_script", result.get("reel_script", {}))
+                reel = (result.get("reel_script") or {}).get("reel_script", result.get("reel_script") or {})
                 
                 if isinstance(reel, dict):
                     st.write(f"**Hook:** {reel.get('hook', 'N/A')}")
@@ -249,6 +306,10 @@ NO TEXT in image.""",
                     else:
                         st.warning(f"⚠️ Zapier status: {status.get('status', 'Unknown')}")
                     
+                    if status.get("items"):
+                        for item in status["items"]:
+                            st.write(f"- Post {item['position'] + 1}: {item['status']}")
+                    
                     with st.expander("View Zapier Details"):
                         st.json(status)
                 
@@ -0,0 +1,388 @@
+import json
+import time
+import random
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+# ------------------------------------------------------------
+# DURABLE OUTBOUND DELIVERY QUEUE (ZAPIER / IMGBB)
+# ------------------------------------------------------------
+# Deliveries are stored in a local SQLite file and processed by a
+# background worker with exponential backoff. A delivery is only
+# removed from the pending set after its handler succeeded, so every
+# delivery is attempted at least once even if the process crashes
+# mid-flight (expired leases are picked up again). Deliveries that
+# keep failing are moved to the dead-letter table.
+
+DELIVERY_DB_PATH = "deliveries.db"
+
+
+class DeliveryError(Exception):
+    """Raised by a handler when a delivery should be retried later."""
+
+
+class DeliveryQueue:
+    """SQLite-backed queue of outbound deliveries."""
+
+    def __init__(
+        self,
+        db_path=DELIVERY_DB_PATH,
+        max_attempts=6,
+        base_delay=5,
+        max_delay=600,
+        lease_seconds=120
+    ):
+        """
+        Args:
+            db_path (str): SQLite file holding the queue
+            max_attempts (int): Attempts before a delivery is dead-lettered
+            base_delay (float): First retry delay in seconds (doubles each attempt)
+            max_delay (float): Upper bound for the retry delay in seconds
+            lease_seconds (float): How long a claimed delivery stays reserved
+                before another worker may pick it up again
+        """
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lease_seconds = lease_seconds
+        self._init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @contextmanager
+    def _db(self):
+        conn = self._connect()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _init_db(self):
+        with self._db() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS deliveries (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    dedupe_key TEXT UNIQUE,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    lease_expires_at REAL,
+                    last_error TEXT,
+                    result TEXT,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS dead_letters (
+                    delivery_id INTEGER PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    attempts INTEGER NOT NULL,
+                    last_error TEXT,
+                    dead_at TEXT NOT NULL
+                )
+            """)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_deliveries_ready "
+                "ON deliveries (status, next_attempt_at)"
+            )
+
+    # --------------------------------------------------------
+    # PRODUCER SIDE
+    # --------------------------------------------------------
+    def enqueue(self, kind, payload, dedupe_key=None):
+        """Add a delivery and return its id.
+
+        If a delivery with the same dedupe_key already exists, the existing
+        id is returned and nothing new is queued.
+        """
+        now = datetime.now().isoformat()
+        with self._db() as conn:
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO deliveries "
+                "(kind, dedupe_key, payload, next_attempt_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (kind, dedupe_key, json.dumps(payload), time.time(), now, now)
+            )
+            if cur.rowcount:
+                return cur.lastrowid
+            row = conn.execute(
+                "SELECT id FROM deliveries WHERE dedupe_key = ?", (dedupe_key,)
+            ).fetchone()
+            return row["id"]
+
+    def get(self, delivery_id):
+        """Return a delivery as a dict (payload and result decoded), or None."""
+        with self._db() as conn:
+            row = conn.execute(
+                "SELECT * FROM deliveries WHERE id = ?", (delivery_id,)
+            ).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    # --------------------------------------------------------
+    # CONSUMER SIDE
+    # --------------------------------------------------------
+    def claim(self):
+        """Reserve the next ready delivery for this worker, or return None."""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT * FROM deliveries "
+                "WHERE (status = 'pending' AND next_attempt_at <= ?) "
+                "   OR (status = 'in_progress' AND lease_expires_at <= ?) "
+                "ORDER BY next_attempt_at, id LIMIT 1",
+                (now, now)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE deliveries SET status = 'in_progress', attempts = attempts + 1, "
+                "lease_expires_at = ?, updated_at = ? WHERE id = ?",
+                (now + self.lease_seconds, datetime.now().isoformat(), row["id"])
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+        delivery = self._row_to_dict(row)
+        delivery["attempts"] += 1
+        return delivery
+
+    def complete(self, delivery_id, result=None):
+        """Mark a delivery as successfully delivered."""
+        with self._db() as conn:
+            conn.execute(
+                "UPDATE deliveries SET status = 'done', result = ?, last_error = NULL, "
+                "lease_expires_at = NULL, updated_at = ? WHERE id = ?",
+                (json.dumps(result), datetime.now().isoformat(), delivery_id)
+            )
+
+    def release(self, delivery_id, delay):
+        """Put a claimed delivery back without counting the attempt."""
+        with self._db() as conn:
+            conn.execute(
+                "UPDATE deliveries SET status = 'pending', attempts = attempts - 1, "
+                "next_attempt_at = ?, lease_expires_at = NULL, updated_at = ? WHERE id = ?",
+                (time.time() + delay, datetime.now().isoformat(), delivery_id)
+            )
+
+    def fail(self, delivery_id, error):
+        """Record a failed attempt; schedule a retry or dead-letter the delivery.
+
+        Returns:
+            str: "retry" or "dead"
+        """
+        delivery = self.get(delivery_id)
+        if delivery is None:
+            return "dead"
+
+        now = datetime.now().isoformat()
+        with self._db() as conn:
+            if delivery["attempts"] >= self.max_attempts:
+                conn.execute(
+                    "UPDATE deliveries SET status = 'dead', last_error = ?, "
+                    "lease_expires_at = NULL, updated_at = ? WHERE id = ?",
+                    (str(error), now, delivery_id)
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO dead_letters "
+                    "(delivery_id, kind, payload, attempts, last_error, dead_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (delivery_id, delivery["kind"], json.dumps(delivery["payload"]),
+                     delivery["attempts"], str(error), now)
+                )
+                return "dead"
+
+            delay = self.backoff_delay(delivery["attempts"])
+            conn.execute(
+                "UPDATE deliveries SET status = 'pending', last_error = ?, next_attempt_at = ?, "
+                "lease_expires_at = NULL, updated_at = ? WHERE id = ?",
+                (str(error), time.time() + delay, now, delivery_id)
+            )
+            return "retry"
+
+    def backoff_delay(self, attempts):
+        """Exponential backoff with jitter for the given attempt count."""
+        delay = min(self.max_delay, self.base_delay * (2 ** max(0, attempts - 1)))
+        return delay * random.uniform(0.8, 1.2)
+
+    # --------------------------------------------------------
+    # INSPECTION / DEAD LETTERS
+    # --------------------------------------------------------
+    def stats(self):
+        """Return the number of deliveries per status."""
+        with self._db() as conn:
+            rows = conn.execute(
+                "SELECT status, COUNT(*) AS n FROM deliveries GROUP BY status"
+            ).fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+    def dead_letters(self):
+        """Return all dead-lettered deliveries."""
+        with self._db() as conn:
+            rows = conn.execute(
+                "SELECT * FROM dead_letters ORDER BY dead_at"
+            ).fetchall()
+        letters = []
+        for row in rows:
+            letter = dict(row)
+            letter["payload"] = json.loads(letter["payload"])
+            letters.append(letter)
+        return letters
+
+    def requeue_dead(self, delivery_id):
+        """Move a dead-lettered delivery back to the pending queue."""
+        with self._db() as conn:
+            conn.execute("DELETE FROM dead_letters WHERE delivery_id = ?", (delivery_id,))
+            conn.execute(
+                "UPDATE deliveries SET status = 'pending', attempts = 0, next_attempt_at = ?, "
+                "updated_at = ? WHERE id = ? AND status = 'dead'",
+                (time.time(), datetime.now().isoformat(), delivery_id)
+            )
+
+    @staticmethod
+    def _row_to_dict(row):
+        delivery = dict(row)
+        delivery["payload"] = json.loads(delivery["payload"])
+        delivery["result"] = json.loads(delivery["result"]) if delivery["result"] else None
+        return delivery
+
+
+# ------------------------------------------------------------
+# DELIVERY HANDLERS
+# ------------------------------------------------------------
+class DeliveryNotReady(Exception):
+    """Raised when a delivery depends on another one that is still pending."""
+
+
+def deliver_zapier(payload, queue):
+    """Send one Zapier item. Waits for a pending branded-image upload first."""
+    from tools import _load_zapier_ledger, _record_zapier_delivery, _send_zapier_item
+
+    item = dict(payload)
+    key = item["idempotency_key"]
+
+    if key in _load_zapier_ledger():
+        return {"status": "skipped", "response": "already delivered"}
+
+    # Use the branded image once its queued upload has completed
+    image_delivery_id = item.pop("image_delivery_id", None)
+    if image_delivery_id is not None:
+        upload = queue.get(image_delivery_id)
+        if upload and upload["status"] in ("pending", "in_progress"):
+            raise DeliveryNotReady(f"waiting for image upload {image_delivery_id}")
+        if upload and upload["status"] == "done" and upload["result"]:
+            item["image_url"] = upload["result"]["url"]
+
+    status = _send_zapier_item(item)
+    if status["status"] != 200:
+        raise DeliveryError(f"Zapier returned {status['status']}: {status['response'][:200]}")
+
+    _record_zapier_delivery([key])
+    return status
+
+
+def deliver_imgbb(payload, queue):
+    """Upload a local image to ImgBB and return its hosted URL."""
+    from tools import upload_to_imgbb
+
+    url = upload_to_imgbb(payload["image_path"])
+    if not url:
+        raise DeliveryError(f"ImgBB upload failed for {payload['image_path']}")
+    return {"url": url}
+
+
+DEFAULT_HANDLERS = {
+    "zapier": deliver_zapier,
+    "imgbb": deliver_imgbb,
+}
+
+
+# ------------------------------------------------------------
+# BACKGROUND WORKER
+# ------------------------------------------------------------
+class DeliveryWorker(threading.Thread):
+    """Background thread that drains a DeliveryQueue."""
+
+    def __init__(self, queue, handlers=None, poll_interval=1.0):
+        super().__init__(name="delivery-worker", daemon=True)
+        self.queue = queue
+        self.handlers = handlers or DEFAULT_HANDLERS
+        self.poll_interval = poll_interval
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            if not self.process_one():
+                self._stop_event.wait(self.poll_interval)
+
+    def process_one(self):
+        """Process a single ready delivery. Returns False if none was ready."""
+        delivery = self.queue.claim()
+        if delivery is None:
+            return False
+
+        handler = self.handlers.get(delivery["kind"])
+        if handler is None:
+            self.queue.fail(delivery["id"], f"No handler for kind '{delivery['kind']}'")
+            return True
+
+        try:
+            result = handler(delivery["payload"], self.queue)
+            self.queue.complete(delivery["id"], result)
+            print(f"✓ Delivery {delivery['id']} ({delivery['kind']}) delivered")
+        except DeliveryNotReady:
+            self.queue.release(delivery["id"], self.poll_interval * 5)
+        except Exception as e:
+            outcome = self.queue.fail(delivery["id"], e)
+            if outcome == "dead":
+                print(f"❌ Delivery {delivery['id']} ({delivery['kind']}) moved to dead letters: {e}")
+            else:
+                print(f"⚠️  Delivery {delivery['id']} ({delivery['kind']}) failed, will retry: {e}")
+        return True
+
+
+_background_worker = None
+_background_lock = threading.Lock()
+
+
+def start_background_worker(queue):
+    """Start (once per process) a daemon worker for the given queue."""
+    global _background_worker
+    with _background_lock:
+        if _background_worker is None or not _background_worker.is_alive():
+            _background_worker = DeliveryWorker(queue)
+            _background_worker.start()
+        return _background_worker
+
+
+# ------------------------------------------------------------
+# STANDALONE WORKER: python delivery_queue.py
+# ------------------------------------------------------------
+if __name__ == "__main__":
+    queue = DeliveryQueue()
+    print(f"📬 Delivery worker started ({DELIVERY_DB_PATH}): {queue.stats()}")
+    worker = DeliveryWorker(queue)
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        print(f"\n⏹️  Delivery worker stopped: {queue.stats()}")
@@ -0,0 +1,247 @@
+import os
+import sqlite3
+import hashlib
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+
+from screening import hamming_distances, DUPLICATE_DISTANCE
+
+# ------------------------------------------------------------
+# INDEX OF GENERATED BASE IMAGES (CROSS-CAMPAIGN REUSE)
+# ------------------------------------------------------------
+# Every accepted clean FLUX image is copied to images/library/ and indexed
+# with its prompt, the prompt's embedding and its perceptual hash. A new
+# prompt is embedded and compared against all stored prompts (cosine
+# similarity, one NumPy matrix product); if a stored image is close enough
+# it can be branded directly instead of calling Replicate again.
+
+IMAGE_INDEX_DB_PATH = "image_index.db"
+IMAGE_LIBRARY_DIR = os.path.join("images", "library")
+
+
+class ImageIndex:
+    """SQLite index of library images with in-memory nearest-neighbour search."""
+
+    def __init__(self, db_path=IMAGE_INDEX_DB_PATH, library_dir=IMAGE_LIBRARY_DIR):
+        self.db_path = db_path
+        self.library_dir = library_dir
+        self._lock = threading.Lock()
+        self._ids = None          # Row ids, aligned with _matrix rows
+        self._hashes = None       # Perceptual hashes, aligned with _matrix rows
+        self._matrix = None       # Unit-length prompt embeddings, one row per image
+        self._init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @contextmanager
+    def _db(self):
+        conn = self._connect()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _init_db(self):
+        with self._db() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS images (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    prompt TEXT NOT NULL,
+                    embedding BLOB NOT NULL,
+                    phash TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    source_url TEXT,
+                    use_count INTEGER NOT NULL DEFAULT 0,
+                    last_used_at REAL,
+                    created_at TEXT NOT NULL
+                )
+            """)
+
+    # --------------------------------------------------------
+    # IN-MEMORY MATRIX
+    # --------------------------------------------------------
+    def _load(self):
+        """Load all embeddings into one normalized matrix (once per process)."""
+        if self._matrix is not None:
+            return
+        with self._db() as conn:
+            rows = conn.execute("SELECT id, embedding, phash FROM images ORDER BY id").fetchall()
+        self._ids = [row["id"] for row in rows]
+        self._hashes = [int(row["phash"], 16) for row in rows]
+        if rows:
+            self._matrix = np.vstack([np.frombuffer(row["embedding"], dtype=np.float32) for row in rows])
+        else:
+            self._matrix = np.zeros((0, 0), dtype=np.float32)
+
+    def _drop(self, image_ids):
+        """Remove rows from the in-memory matrix (call with the lock held)."""
+        image_ids = set(image_ids)
+        keep = [i for i, image_id in enumerate(self._ids) if image_id not in image_ids]
+        self._ids = [self._ids[i] for i in keep]
+        self._hashes = [self._hashes[i] for i in keep]
+        self._matrix = self._matrix[keep] if keep else np.zeros((0, 0), dtype=np.float32)
+
+    def _has_file(self, image_id):
+        with self._db() as conn:
+            row = conn.execute("SELECT path FROM images WHERE id = ?", (image_id,)).fetchone()
+        return row is not None and os.path.exists(row["path"])
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    # --------------------------------------------------------
+    # PUBLIC API
+    # --------------------------------------------------------
+    def add(self, prompt, embedding, image_bytes, phash, source_url=None):
+        """Store an image in the library and index it.
+
+        Images within DUPLICATE_DISTANCE bits of a stored image are not added
+        again; the id of the stored image is returned instead.
+
+        Returns:
+            int: Id of the indexed image
+        """
+        vector = self._normalize(embedding)
+        with self._lock:
+            self._load()
+            distances = hamming_distances(phash, self._hashes)
+            if distances.size and distances.min() <= DUPLICATE_DISTANCE:
+                duplicate_id = self._ids[int(distances.argmin())]
+                if self._has_file(duplicate_id):
+                    return duplicate_id
+                # Evicted (possibly by another process): index this copy instead
+                with self._db() as conn:
+                    conn.execute("DELETE FROM images WHERE id = ?", (duplicate_id,))
+                self._drop([duplicate_id])
+
+            os.makedirs(self.library_dir, exist_ok=True)
+            digest = hashlib.sha256(image_bytes).hexdigest()[:32]
+            path = os.path.join(self.library_dir, f"{digest}.img")
+            with open(path, "wb") as f:
+                f.write(image_bytes)
+
+            with self._db() as conn:
+                cur = conn.execute(
+                    "INSERT INTO images (prompt, embedding, phash, path, source_url, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (prompt, vector.tobytes(), f"{phash:016x}", path, source_url,
+                     datetime.now().isoformat())
+                )
+                image_id = cur.lastrowid
+
+            self._ids.append(image_id)
+            self._hashes.append(phash)
+            self._matrix = vector[None, :] if self._matrix.size == 0 else np.vstack([self._matrix, vector])
+            return image_id
+
+    def nearest(self, embedding, k=1, min_similarity=0.95, exclude_hashes=(), cooldown_seconds=0):
+        """Find the stored images whose prompts are closest to an embedding.
+
+        Args:
+            embedding: Prompt embedding to search for
+            k (int): Maximum number of images to return
+            min_similarity (float): Minimum cosine similarity of the prompts
+            exclude_hashes: Perceptual hashes to skip (e.g. images already in this campaign)
+            cooldown_seconds (float): Skip images used more recently than this
+
+        Returns:
+            list: Image dicts (id, prompt, path, phash, use_count, similarity), best first
+        """
+        with self._lock:
+            self._load()
+            if self._matrix.size == 0:
+                return []
+            similarities = self._matrix @ self._normalize(embedding)
+            candidates = np.flatnonzero(similarities >= min_similarity)
+            candidates = candidates[np.argsort(-similarities[candidates])]
+            ids = [self._ids[i] for i in candidates]
+            scores = {self._ids[i]: float(similarities[i]) for i in candidates}
+
+        if not ids:
+            return []
+
+        placeholders = ", ".join("?" for _ in ids)
+        with self._db() as conn:
+            rows = {
+                row["id"]: row for row in conn.execute(
+                    f"SELECT id, prompt, path, phash, use_count, last_used_at FROM images "
+                    f"WHERE id IN ({placeholders})", ids
+                )
+            }
+
+        now = datetime.now().timestamp()
+        excluded = list(exclude_hashes)
+        matches = []
+        for image_id in ids:
+            row = rows.get(image_id)
+            if row is None or not os.path.exists(row["path"]):
+                continue
+            if cooldown_seconds and row["last_used_at"] and now - row["last_used_at"] < cooldown_seconds:
+                continue
+            phash = int(row["phash"], 16)
+            distances = hamming_distances(phash, excluded)
+            if distances.size and distances.min() <= DUPLICATE_DISTANCE:
+                continue
+            matches.append({
+                "id": image_id,
+                "prompt": row["prompt"],
+                "path": row["path"],
+                "phash": phash,
+                "use_count": row["use_count"],
+                "similarity": round(scores[image_id], 4),
+            })
+            excluded.append(phash)
+            if len(matches) >= k:
+                break
+        return matches
+
+    def mark_used(self, image_id):
+        """Record that a library image was reused."""
+        with self._db() as conn:
+            conn.execute(
+                "UPDATE images SET use_count = use_count + 1, last_used_at = ? WHERE id = ?",
+                (datetime.now().timestamp(), image_id)
+            )
+            row = conn.execute("SELECT path FROM images WHERE id = ?", (image_id,)).fetchone()
+        # Eviction removes the least recently modified library files first
+        if row is not None and os.path.exists(row["path"]):
+            os.utime(row["path"])
+
+    def remove_paths(self, paths):
+        """Drop the index entries of library files that were deleted (e.g. by eviction).
+
+        Returns:
+            int: Number of entries removed
+        """
+        paths = list(paths)
+        if not paths:
+            return 0
+        placeholders = ", ".join("?" for _ in paths)
+        with self._lock:
+            with self._db() as conn:
+                image_ids = [
+                    row["id"] for row in conn.execute(
+                        f"SELECT id FROM images WHERE path IN ({placeholders})", paths
+                    )
+                ]
+                conn.execute(f"DELETE FROM images WHERE path IN ({placeholders})", paths)
+            if self._matrix is not None:
+                self._drop(image_ids)
+        return len(image_ids)
+
+    def stats(self):
+        with self._db() as conn:
+            row = conn.execute(
+                "SELECT COUNT(*) AS images, COALESCE(SUM(use_count), 0) AS reuses FROM images"
+            ).fetchone()
+        return dict(row)
@@ -0,0 +1,425 @@
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime
+
+# ------------------------------------------------------------
+# CAMPAIGN JOBS + PLUGGABLE QUEUE BACKENDS
+# ------------------------------------------------------------
+# A job is one campaign: a topic plus the keyword settings for
+# SocialMediaPipelineAgent.run. Workers lease jobs for a limited time and
+# keep the lease alive with heartbeats; a job whose lease expires (worker
+# died) goes back to the queue. Publishing is guarded separately by
+# claim_publish(), which succeeds only ONCE per job, so a job that is
+# re-run after a crash is never posted to Zapier twice (at-most-once).
+#
+# Backends: InMemoryJobQueue (tests / single process), SQLiteJobQueue
+# (several processes on one machine) and RedisJobQueue (several machines).
+
+JOBS_DB_PATH = "jobs.db"
+DEFAULT_LEASE_SECONDS = 300
+DEFAULT_MAX_ATTEMPTS = 3
+
+
+def new_job(topic, settings=None):
+    """Build a new pending job dict."""
+    if not topic or not topic.strip():
+        raise ValueError("Topic cannot be empty")
+    return {
+        "job_id": uuid.uuid4().hex,
+        "topic": topic,
+        "settings": dict(settings or {}),
+        "status": "pending",
+        "attempts": 0,
+        "lease_owner": None,
+        "lease_expires_at": None,
+        "published_at": None,
+        "result": None,
+        "error": None,
+        "created_at": datetime.now().isoformat(),
+        "updated_at": datetime.now().isoformat(),
+    }
+
+
+class LeaseLost(Exception):
+    """Raised when a worker no longer owns the lease of its job."""
+
+
+class JobQueue(ABC):
+    """Interface shared by all job queue backends."""
+
+    @abstractmethod
+    def submit(self, topic, settings=None):
+        """Queue a campaign and return its job id."""
+
+    @abstractmethod
+    def lease(self, worker_id, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """Lease the next pending (or expired) job, or return None."""
+
+    @abstractmethod
+    def heartbeat(self, job_id, worker_id, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """Extend a lease. Returns False if the worker lost it."""
+
+    @abstractmethod
+    def complete(self, job_id, worker_id, result):
+        """Store the result of a job leased by worker_id."""
+
+    @abstractmethod
+    def fail(self, job_id, worker_id, error):
+        """Record a failure; the job is retried until max_attempts."""
+
+    @abstractmethod
+    def claim_publish(self, job_id):
+        """Reserve the right to publish a job. True exactly once per job."""
+
+    @abstractmethod
+    def get(self, job_id):
+        """Return a job dict, or None."""
+
+
+# ------------------------------------------------------------
+# IN-PROCESS BACKEND (TESTS / SINGLE PROCESS)
+# ------------------------------------------------------------
+class InMemoryJobQueue(JobQueue):
+    """Thread-safe in-process queue with the same semantics as the real backends."""
+
+    def __init__(self, max_attempts=DEFAULT_MAX_ATTEMPTS, clock=time.time):
+        self.max_attempts = max_attempts
+        self.clock = clock
+        self._jobs = {}
+        self._order = []
+        self._lock = threading.Lock()
+
+    def submit(self, topic, settings=None):
+        job = new_job(topic, settings)
+        with self._lock:
+            self._jobs[job["job_id"]] = job
+            self._order.append(job["job_id"])
+        return job["job_id"]
+
+    def lease(self, worker_id, lease_seconds=DEFAULT_LEASE_SECONDS):
+        now = self.clock()
+        with self._lock:
+            for job_id in self._order:
+                job = self._jobs[job_id]
+                expired = job["status"] == "leased" and job["lease_expires_at"] <= now
+                if job["status"] == "pending" or expired:
+                    job.update(
+                        status="leased",
+                        lease_owner=worker_id,
+                        lease_expires_at=now + lease_seconds,
+                        attempts=job["attempts"] + 1,
+                        updated_at=datetime.now().isoformat(),
+                    )
+                    return json.loads(json.dumps(job))
+        return None
+
+    def heartbeat(self, job_id, worker_id, lease_seconds=DEFAULT_LEASE_SECONDS):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job or job["status"] != "leased" or job["lease_owner"] != worker_id:
+                return False
+            job["lease_expires_at"] = self.clock() + lease_seconds
+            return True
+
+    def complete(self, job_id, worker_id, result):
+        with self._lock:
+            job = self._owned(job_id, worker_id)
+            job.update(status="done", result=result, error=None, lease_owner=None,
+                       lease_expires_at=None, updated_at=datetime.now().isoformat())
+
+    def fail(self, job_id, worker_id, error):
+        with self._lock:
+            job = self._owned(job_id, worker_id)
+            status = "failed" if job["attempts"] >= self.max_attempts else "pending"
+            job.update(status=status, error=str(error), lease_owner=None,
+                       lease_expires_at=None, updated_at=datetime.now().isoformat())
+
+    def claim_publish(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job or job["published_at"]:
+                return False
+            job["published_at"] = datetime.now().isoformat()
+            return True
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return json.loads(json.dumps(job)) if job else None
+
+    def _owned(self, job_id, worker_id):
+        job = self._jobs.get(job_id)
+        if not job or job["status"] != "leased" or job["lease_owner"] != worker_id:
+            raise LeaseLost(f"Worker {worker_id} does not hold job {job_id}")
+        return job
+
+
+# ------------------------------------------------------------
+# SQLITE BACKEND (SEVERAL PROCESSES, ONE MACHINE)
+# ------------------------------------------------------------
+class SQLiteJobQueue(JobQueue):
+    """Job queue stored in a local SQLite file."""
+
+    def __init__(self, db_path=JOBS_DB_PATH, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        with self._db() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    seq INTEGER NOT NULL,
+                    topic TEXT NOT NULL,
+                    settings TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    lease_owner TEXT,
+                    lease_expires_at REAL,
+                    published_at TEXT,
+                    result TEXT,
+                    error TEXT,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, seq)")
+
+    @contextmanager
+    def _db(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def submit(self, topic, settings=None):
+        job = new_job(topic, settings)
+        with self._db() as conn:
+            conn.execute(
+                "INSERT INTO jobs (job_id, seq, topic, settings, status, created_at, updated_at) "
+                "VALUES (?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM jobs), ?, ?, 'pending', ?, ?)",
+                (job["job_id"], topic, json.dumps(job["settings"]), job["created_at"], job["updated_at"])
+            )
+        return job["job_id"]
+
+    def lease(self, worker_id, lease_seconds=DEFAULT_LEASE_SECONDS):
+        now = time.time()
+        with self._db() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT job_id FROM jobs "
+                    "WHERE status = 'pending' OR (status = 'leased' AND lease_expires_at <= ?) "
+                    "ORDER BY seq LIMIT 1",
+                    (now,)
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                conn.execute(
+                    "UPDATE jobs SET status = 'leased', lease_owner = ?, lease_expires_at = ?, "
+                    "attempts = attempts + 1, updated_at = ? WHERE job_id = ?",
+                    (worker_id, now + lease_seconds, datetime.now().isoformat(), row["job_id"])
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return self.get(row["job_id"])
+
+    def heartbeat(self, job_id, worker_id, lease_seconds=DEFAULT_LEASE_SECONDS):
+        with self._db() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET lease_expires_at = ? "
+                "WHERE job_id = ? AND status = 'leased' AND lease_owner = ?",
+                (time.time() + lease_seconds, job_id, worker_id)
+            )
+            return cur.rowcount == 1
+
+    def complete(self, job_id, worker_id, result):
+        self._finish(job_id, worker_id, "status = 'done', result = ?, error = NULL", (json.dumps(result),))
+
+    def fail(self, job_id, worker_id, error):
+        self._finish(
+            job_id, worker_id,
+            "status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, error = ?",
+            (self.max_attempts, str(error))
+        )
+
+    def _finish(self, job_id, worker_id, assignments, params):
+        with self._db() as conn:
+            cur = conn.execute(
+                f"UPDATE jobs SET {assignments}, lease_owner = NULL, lease_expires_at = NULL, "
+                "updated_at = ? WHERE job_id = ? AND status = 'leased' AND lease_owner = ?",
+                params + (datetime.now().isoformat(), job_id, worker_id)
+            )
+            if cur.rowcount != 1:
+                raise LeaseLost(f"Worker {worker_id} does not hold job {job_id}")
+
+    def claim_publish(self, job_id):
+        with self._db() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET published_at = ? WHERE job_id = ? AND published_at IS NULL",
+                (datetime.now().isoformat(), job_id)
+            )
+            return cur.rowcount == 1
+
+    def get(self, job_id):
+        with self._db() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job.pop("seq")
+        job["settings"] = json.loads(job["settings"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+
+# ------------------------------------------------------------
+# REDIS BACKEND (SEVERAL MACHINES)
+# ------------------------------------------------------------
+# Keys: {prefix}:job:<id> (hash), {prefix}:pending (list),
+# {prefix}:leases (sorted set of job ids scored by lease expiry).
+# Lease, heartbeat and finish are Lua scripts so they are atomic.
+
+_REDIS_LEASE = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[3])
+for _, id in ipairs(expired) do
+    redis.call('ZREM', KEYS[2], id)
+    redis.call('RPUSH', KEYS[1], id)
+    redis.call('HSET', ARGV[4] .. id, 'status', 'pending')
+end
+local id = redis.call('LPOP', KEYS[1])
+if not id then return false end
+redis.call('ZADD', KEYS[2], ARGV[1], id)
+redis.call('HSET', ARGV[4] .. id, 'status', 'leased', 'lease_owner', ARGV[2], 'lease_expires_at', ARGV[1])
+redis.call('HINCRBY', ARGV[4] .. id, 'attempts', 1)
+return id
+"""
+
+_REDIS_HEARTBEAT = """
+if redis.call('HGET', KEYS[1], 'status') ~= 'leased' or redis.call('HGET', KEYS[1], 'lease_owner') ~= ARGV[1] then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'lease_expires_at', ARGV[2])
+redis.call('ZADD', KEYS[2], ARGV[2], ARGV[3])
+return 1
+"""
+
+_REDIS_FINISH = """
+if redis.call('HGET', KEYS[1], 'status') ~= 'leased' or redis.call('HGET', KEYS[1], 'lease_owner') ~= ARGV[1] then
+    return 0
+end
+redis.call('ZREM', KEYS[2], ARGV[2])
+local status = ARGV[3]
+if status == 'retry' then
+    if tonumber(redis.call('HGET', KEYS[1], 'attempts')) >= tonumber(ARGV[6]) then
+        status = 'failed'
+    else
+        status = 'pending'
+        redis.call('RPUSH', KEYS[3], ARGV[2])
+    end
+end
+redis.call('HSET', KEYS[1], 'status', status, 'lease_owner', '', 'lease_expires_at', '',
+           ARGV[4], ARGV[5], 'updated_at', ARGV[7])
+return 1
+"""
+
+
+class RedisJobQueue(JobQueue):
+    """Job queue shared by workers on several machines through Redis."""
+
+    def __init__(self, redis_url="redis://localhost:6379/0", prefix="social_media", max_attempts=DEFAULT_MAX_ATTEMPTS):
+        try:
+            import redis
+        except ImportError:
+            raise ImportError("RedisJobQueue requires the 'redis' package: pip install redis")
+
+        self.redis = redis.Redis.from_url(redis_url, decode_responses=True)
+        self.prefix = prefix
+        self.max_attempts = max_attempts
+        self._lease = self.redis.register_script(_REDIS_LEASE)
+        self._heartbeat = self.redis.register_script(_REDIS_HEARTBEAT)
+        self._finish = self.redis.register_script(_REDIS_FINISH)
+
+    def _key(self, name):
+        return f"{self.prefix}:{name}"
+
+    def _job_key(self, job_id):
+        return f"{self.prefix}:job:{job_id}"
+
+    def submit(self, topic, settings=None):
+        job = new_job(topic, settings)
+        fields = {
+            key: json.dumps(value) if key == "settings" else value
+            for key, value in job.items()
+            if value is not None
+        }
+        pipe = self.redis.pipeline()
+        pipe.hset(self._job_key(job["job_id"]), mapping=fields)
+        pipe.rpush(self._key("pending"), job["job_id"])
+        pipe.execute()
+        return job["job_id"]
+
+    def lease(self, worker_id, lease_seconds=DEFAULT_LEASE_SECONDS):
+        now = time.time()
+        job_id = self._lease(
+            keys=[self._key("pending"), self._key("leases")],
+            args=[now + lease_seconds, worker_id, now, f"{self.prefix}:job:"]
+        )
+        return self.get(job_id) if job_id else None
+
+    def heartbeat(self, job_id, worker_id, lease_seconds=DEFAULT_LEASE_SECONDS):
+        return bool(self._heartbeat(
+            keys=[self._job_key(job_id), self._key("leases")],
+            args=[worker_id, time.time() + lease_seconds, job_id]
+        ))
+
+    def complete(self, job_id, worker_id, result):
+        self._finish_job(job_id, worker_id, "done", "result", json.dumps(result))
+
+    def fail(self, job_id, worker_id, error):
+        self._finish_job(job_id, worker_id, "retry", "error", str(error))
+
+    def _finish_job(self, job_id, worker_id, status, field, value):
+        ok = self._finish(
+            keys=[self._job_key(job_id), self._key("leases"), self._key("pending")],
+            args=[worker_id, job_id, status, field, value, self.max_attempts, datetime.now().isoformat()]
+        )
+        if not ok:
+            raise LeaseLost(f"Worker {worker_id} does not hold job {job_id}")
+
+    def claim_publish(self, job_id):
+        return bool(self.redis.hsetnx(self._job_key(job_id), "published_at", datetime.now().isoformat()))
+
+    def get(self, job_id):
+        data = self.redis.hgetall(self._job_key(job_id))
+        if not data:
+            return None
+        job = {key: None for key in new_job("-")}
+        job.update({key: (value if value != "" else None) for key, value in data.items()})
+        job["settings"] = json.loads(job["settings"] or "{}")
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        job["attempts"] = int(job["attempts"] or 0)
+        if job["lease_expires_at"]:
+            job["lease_expires_at"] = float(job["lease_expires_at"])
+        return job
+
+
+def get_job_queue(backend="sqlite", **kwargs):
+    """Create a job queue backend by name: "memory", "sqlite" or "redis"."""
+    backends = {
+        "memory": InMemoryJobQueue,
+        "sqlite": SQLiteJobQueue,
+        "redis": RedisJobQueue,
+    }
+    if backend not in backends:
+        raise ValueError(f"Unknown job queue backend: {backend}")
+    return backends[backend](**kwargs)
@@ -2,10 +2,21 @@ from tools import (
     generate_posts,
     generate_image_prompts,
     generate_images,
+    generate_images_speculative,
     generate_reels_script,
     send_to_zapier,
-    save_result_to_json
+    send_all_to_zapier,
+    build_zapier_items,
+    primary_image_index,
+    save_result_to_json,
+    IMAGE_TARGETS
 )
+from config import IMAGE_TARGET, DEFAULT_BRAND
+from brands import get_brand, preload_brands, USE_PROFILE
+from delivery_queue import DeliveryQueue, start_background_worker
+from budget import RunBudget, BudgetExceeded
+from text_batch import generate_text_batch, DEFAULT_BATCH_SIZE
+from reels import render_reel
 
 
 class SocialMediaPipelineAgent:
@@ -13,6 +24,68 @@ class SocialMediaPipelineAgent:
     Main agent class that orchestrates the social media content generation pipeline.
     """
 
+    def __init__(self, delivery_queue=None):
+        """
+        Args:
+            delivery_queue (DeliveryQueue): Queue used when async_delivery=True
+                (created on first use if not provided)
+        """
+        self.delivery_queue = delivery_queue
+
+    def preload_brands(self):
+        """Load every brand profile and warm its fonts, watermark and overlay layer.
+
+        Call once when a long-running process starts (workers, server) so the
+        first campaign of each brand doesn't pay for it.
+        """
+        size = IMAGE_TARGETS.get(IMAGE_TARGET)
+        return preload_brands([size] if size else [])
+
+    def _get_delivery_queue(self):
+        if self.delivery_queue is None:
+            self.delivery_queue = DeliveryQueue()
+        start_background_worker(self.delivery_queue)
+        return self.delivery_queue
+
+    def _enqueue_zapier(self, output, zap_mode, queue):
+        """Queue Zapier deliveries for the output and return a 'queued' status."""
+        items = build_zapier_items(output)
+        if zap_mode == "first":
+            items = items[:1]
+
+        pending_uploads = output["images"].get("pending_uploads", {})
+        deliveries = []
+        for item in items:
+            image_index = primary_image_index(output["images"], item["position"])
+            if image_index in pending_uploads:
+                item["image_delivery_id"] = pending_uploads[image_index]
+            delivery_id = queue.enqueue("zapier", item, dedupe_key=item["idempotency_key"])
+            deliveries.append({
+                "position": item["position"],
+                "idempotency_key": item["idempotency_key"],
+                "delivery_id": delivery_id
+            })
+
+        return {"status": "queued", "mode": zap_mode, "deliveries": deliveries}
+
+    def publish(self, output, zap_mode="first", idempotent=False):
+        """Send a finished pipeline output to Zapier and return the Zapier status.
+
+        With idempotent=True every mode (also "first") goes through the item
+        path with idempotency keys and the delivery ledger, so publishing the
+        same output again never posts an item twice.
+        """
+        try:
+            if zap_mode == "first" and not idempotent:
+                zap_result = send_to_zapier(output)
+            else:
+                zap_result = send_all_to_zapier(output, mode=zap_mode)
+            print("✓ Published to Zapier\n")
+            return zap_result
+        except Exception as e:
+            print(f"⚠️ Zapier publishing failed: {e}\n")
+            return {"status": "error", "error": str(e)}
+
     def run(
         self,
         topic,
@@ -20,9 +93,22 @@ class SocialMediaPipelineAgent:
         use_custom_image=False,
         custom_image_path=None,
         push_to_zap=False,
-        brand_text="Experts Group FZE",
-        text_size=80,
-        custom_image_prompt=None
+        brand=None,
+        brand_text=USE_PROFILE,
+        text_size=None,
+        custom_image_prompt=None,
+        zap_mode="first",
+        async_delivery=False,
+        prediction_mode="blocking",
+        num_posts=3,
+        images_per_prompt=1,
+        deadline_seconds=None,
+        max_cost=None,
+        pregenerated=None,
+        speculative_images=False,
+        speculation_policy="first_ready",
+        speculation_deadline=20,
+        render_reel_video=False
     ):
         """
         Run the complete social media content generation pipeline.
@@ -33,9 +119,34 @@ class SocialMediaPipelineAgent:
             use_custom_image (bool): Whether to use a custom uploaded image
             custom_image_path (str): Path to custom image file
             push_to_zap (bool): Whether to send to Zapier for Instagram posting
-            brand_text (str): Text to overlay on images (None = no overlay)
-            text_size (int): Font size for text overlay (default: 80)
+            brand (str): Brand profile name (None = DEFAULT_BRAND); supplies the overlay
+                text, website line, font, colors, watermark and image style
+            brand_text (str): Overrides the profile's overlay text (None = no overlay)
+            text_size (int): Overrides the profile's font size
             custom_image_prompt (str): Custom prompt template for image generation (None = auto-generate)
+            zap_mode (str): "first" (first post + first image only), "batch" (all posts in one
+                webhook call) or "concurrent" (one webhook call per post, in parallel)
+            async_delivery (bool): Queue Zapier/ImgBB deliveries in the durable delivery
+                queue and return immediately instead of waiting on the webhooks
+            prediction_mode (str): "blocking", "poll" or "webhook" - how Replicate
+                predictions are created and collected (see generate_images)
+            num_posts (int): Number of post variants generated in one request (default: 3)
+            images_per_prompt (int): Image variants per post, generated in one
+                prediction via num_outputs (1-4, default: 1)
+            deadline_seconds (float): Wall-clock limit for the run. Stages shorten their
+                timeouts and degrade (template prompts, no overlay) as it approaches
+            max_cost (float): Estimated USD limit for the run. Optional stages are cut
+                (fewer images, template prompts, no reel script) to stay within it
+            pregenerated (dict): Text generated ahead of time, {"posts": {...}, "reel_script": {...}}
+                (either key may be missing; missing parts are generated as usual)
+            speculative_images (bool): Start each AI image from the fallback prompt while
+                its smart prompt is written, and keep one of the two (AI images without a
+                custom prompt only; costs up to two predictions per post)
+            speculation_policy (str): "first_ready" or "smart_within_deadline"
+            speculation_deadline (float): Seconds the smart image may take under
+                "smart_within_deadline" before the fallback image is used
+            render_reel_video (bool): Render the reel script and images into a vertical
+                MP4 under reels/ (needs ffmpeg)
             
         Returns:
             dict: Complete pipeline output including posts, images, scripts, etc.
@@ -45,6 +156,7 @@ class SocialMediaPipelineAgent:
         print(f"🚀 Starting Social Media Pipeline")
         print(f"{'='*60}")
         print(f"📌 Topic: {topic}")
+        print(f"🏷️  Brand: {brand or DEFAULT_BRAND}")
         print(f"🎨 Generate AI Image: {generate_image}")
         print(f"🖼️  Use Custom Image: {use_custom_image}")
         print(f"📤 Push to Zapier: {push_to_zap}")
@@ -54,26 +166,74 @@ class SocialMediaPipelineAgent:
         if not topic or not topic.strip():
             raise ValueError("Topic cannot be empty")
 
+        profile = get_brand(brand)
+        if brand_text is USE_PROFILE:
+            brand_text = profile.brand_text
+        text_size = text_size or profile.text_size
+
+        queue = self._get_delivery_queue() if async_delivery else None
+        budget = RunBudget(deadline_seconds, max_cost) if (deadline_seconds or max_cost is not None) else None
+
         # ----------------------------
         # 1️⃣ Generate Text Posts
         # ----------------------------
-        print("📝 Step 1: Generating text posts...")
-        posts = generate_posts(topic)
-        print(f"✓ Generated {len(posts['posts'])} posts\n")
+        pregenerated = pregenerated or {}
+
+        if pregenerated.get("posts"):
+            posts = pregenerated["posts"]
+            print(f"📝 Step 1: Using {len(posts['posts'])} pre-generated posts\n")
+        else:
+            print("📝 Step 1: Generating text posts...")
+            posts = generate_posts(topic, num_posts=num_posts, budget=budget)
+            print(f"✓ Generated {len(posts['posts'])} posts\n")
 
         # ----------------------------
         # 2️⃣ Generate Image Prompts (always)
         # ----------------------------
-        print("🎨 Step 2: Generating image prompts...")
-        prompts = generate_image_prompts(posts, custom_prompt_template=custom_image_prompt)
+        speculate = speculative_images and generate_image and not use_custom_image and not custom_image_prompt
+        images = None
+
+        if speculate:
+            print("🎨 Step 2: Generating image prompts and images speculatively...")
+            try:
+                prompts, images = generate_images_speculative(
+                    posts,
+                    policy=speculation_policy,
+                    smart_deadline=speculation_deadline,
+                    brand_text=brand_text,
+                    website_text=profile.website_text,
+                    text_size=text_size,
+                    delivery_queue=queue,
+                    webhook=prediction_mode == "webhook",
+                    images_per_prompt=images_per_prompt,
+                    budget=budget,
+                    brand=profile
+                )
+            except BudgetExceeded as e:
+                budget.degrade(f"skipping image generation ({e})")
+                prompts = generate_image_prompts(posts, budget=budget, style=profile.image_style)
+                images = {"image_urls": []}
+        else:
+            print("🎨 Step 2: Generating image prompts...")
+            prompts = generate_image_prompts(
+                posts, custom_prompt_template=custom_image_prompt, budget=budget, style=profile.image_style
+            )
         print(f"✓ Generated {len(prompts['image_prompts'])} prompts\n")
 
         # ----------------------------
         # 3️⃣ Generate Reels Script
         # ----------------------------
-        print("🎬 Step 3: Generating reel script...")
-        reel_script = generate_reels_script(topic)
-        print("✓ Reel script generated\n")
+        if pregenerated.get("reel_script"):
+            print("🎬 Step 3: Using pre-generated reel script\n")
+            reel_script = pregenerated["reel_script"]
+        else:
+            print("🎬 Step 3: Generating reel script...")
+            try:
+                reel_script = generate_reels_script(topic, budget=budget)
+                print("✓ Reel script generated\n")
+            except BudgetExceeded as e:
+                budget.degrade(f"skipping reel script ({e})")
+                reel_script = None
 
         # ----------------------------
         # 4️⃣ Image Selection Logic
@@ -90,26 +250,53 @@ class SocialMediaPipelineAgent:
             # Check if it's already a web URL or local file
             if custom_image_path.startswith("http://") or custom_image_path.startswith("https://"):
                 # Already a web URL (uploaded via dashboard)
-                images = {"image_urls": [custom_image_path]}
+                images = {"image_urls": [custom_image_path], "shared": True}
             else:
                 # Local file - try to upload
                 print(f"   ⚠️  Custom image is a local file, attempting to upload...")
-                from tools import upload_to_imgbb
+                from tools import upload_to_imgbb, file_sha256
                 
                 web_url = upload_to_imgbb(custom_image_path)
                 
                 if web_url:
                     print(f"   ✓ Uploaded custom image: {web_url}")
-                    images = {"image_urls": [web_url]}
+                    images = {"image_urls": [web_url], "shared": True}
+                elif queue is not None:
+                    delivery_id = queue.enqueue(
+                        "imgbb", {"image_path": custom_image_path},
+                        dedupe_key=f"imgbb:{file_sha256(custom_image_path)}"
+                    )
+                    print(f"   📬 Custom image upload queued for retry (delivery {delivery_id})")
+                    images = {
+                        "image_urls": [custom_image_path], "shared": True, "pending_uploads": {0: delivery_id}
+                    }
                 else:
                     print(f"   ⚠️  Could not upload custom image to web")
                     print(f"   ⚠️  Zapier won't be able to use this image")
                     images = {"image_urls": []}
 
+        elif images is not None:
+            # Already generated speculatively in step 2
+            print("   AI images were generated in step 2")
+
         elif generate_image:
             # AI generates branded images
             print("   Generating AI images...")
-            images = generate_images(prompts, brand_text=brand_text, text_size=text_size)
+            try:
+                images = generate_images(
+                    prompts,
+                    brand_text=brand_text,
+                    website_text=profile.website_text,
+                    text_size=text_size,
+                    delivery_queue=queue,
+                    prediction_mode=prediction_mode,
+                    images_per_prompt=images_per_prompt,
+                    budget=budget,
+                    brand=profile
+                )
+            except BudgetExceeded as e:
+                budget.degrade(f"skipping image generation ({e})")
+                images = {"image_urls": []}
 
         else:
             # No image at all
@@ -118,31 +305,49 @@ class SocialMediaPipelineAgent:
         
         print(f"✓ Image processing complete ({len(images['image_urls'])} images)\n")
 
+        # ----------------------------
+        # 4️⃣b Optional Reel Video
+        # ----------------------------
+        reel_video = None
+        if render_reel_video:
+            print("🎞️  Step 4b: Rendering reel video...")
+            reel_images = images.get("clean_urls") or images["image_urls"]
+            if reel_script and reel_images:
+                try:
+                    reel_video = render_reel(reel_script, reel_images, brand_text=brand_text, brand=profile)
+                except Exception as e:
+                    print(f"⚠️ Reel rendering failed: {e}\n")
+            else:
+                print("   ⏭️  Skipped (needs a reel script and at least one image)\n")
+
         # ----------------------------
         # 5️⃣ FINAL OUTPUT PACKAGE
         # ----------------------------
         print("📦 Step 5: Assembling output package...")
         output = {
             "topic": topic,
+            "brand": profile.name,
             "posts": posts["posts"],
             "image_prompts": prompts["image_prompts"],
             "reel_script": reel_script,
             "images": images,
         }
+        if reel_video:
+            output["reel_video"] = reel_video
+        if budget is not None:
+            output["budget"] = budget.summary()
         print("✓ Output package ready\n")
 
         # ----------------------------
         # 6️⃣ Optional Zapier Publishing
         # ----------------------------
-        if push_to_zap:
+        if push_to_zap and queue is not None:
+            print("📤 Step 6: Queueing Zapier deliveries...")
+            output["zapier_status"] = self._enqueue_zapier(output, zap_mode, queue)
+            print(f"✓ Queued {len(output['zapier_status']['deliveries'])} Zapier deliveries\n")
+        elif push_to_zap:
             print("📤 Step 6: Publishing to Instagram via Zapier...")
-            try:
-                zap_result = send_to_zapier(output)
-                output["zapier_status"] = zap_result
-                print("✓ Published to Zapier\n")
-            except Exception as e:
-                print(f"⚠️ Zapier publishing failed: {e}\n")
-                output["zapier_status"] = {"status": "error", "error": str(e)}
+            output["zapier_status"] = self.publish(output, zap_mode)
         else:
             print("⏭️  Step 6: Skipping Zapier (not requested)\n")
 
@@ -156,4 +361,42 @@ class SocialMediaPipelineAgent:
         print("✅ Pipeline completed successfully!")
         print(f"{'='*60}\n")
 
-        return output
\ No newline at end of file
+        return output
+
+    def run_batch(self, topics, texts=None, text_batch_size=DEFAULT_BATCH_SIZE, **run_kwargs):
+        """
+        Run the pipeline for many topics, generating their text in packed batches.
+
+        Args:
+            topics (list): Topics to process
+            texts (dict): Output of text_batch.generate_text_batch / collect_batch
+                (generated here if not provided)
+            text_batch_size (int): Topics per packed text request
+            **run_kwargs: Passed to run() for every topic (except `pregenerated`,
+                which is built from texts)
+
+        Returns:
+            list: One dict per topic: the run() output, or {"topic", "error"} if it failed
+        """
+        if "pregenerated" in run_kwargs:
+            raise TypeError("run_batch() builds pregenerated from texts; pass texts instead")
+        if texts is None:
+            texts = generate_text_batch(
+                topics,
+                num_posts=run_kwargs.get("num_posts", 3),
+                batch_size=text_batch_size
+            )
+
+        outputs = []
+        for topic in topics:
+            topic = topic.strip()
+            pregenerated = {
+                "posts": texts["posts"].get(topic),
+                "reel_script": texts["reel_scripts"].get(topic),
+            }
+            try:
+                outputs.append(self.run(topic, pregenerated=pregenerated, **run_kwargs))
+            except Exception as e:
+                print(f"❌ Topic '{topic}' failed: {e}")
+                outputs.append({"topic": topic, "error": str(e)})
+        return outputs
@@ -0,0 +1,216 @@
+import bisect
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# ------------------------------------------------------------
+# TEXT MODEL ROUTING: HEDGED REQUESTS + FAILOVER
+# ------------------------------------------------------------
+# Each text function (posts, image prompts, reel script) has an ordered
+# list of models. The first model is tried first; if it has not answered
+# after its own p95 latency (tracked per purpose and model, since a short
+# caption call and a long reel script have very different latencies), a
+# hedge request goes to the next model and whichever answers first wins.
+# Errors fail over to the next model in the list.
+#
+# The sync client can't abort a request on the wire: a losing hedge keeps
+# its thread until it finishes and its tokens are still billed, so hedges
+# are charged to the run budget. Timed-out attempts are recorded at their
+# timeout and other failures are counted, so incidents raise the p95 that
+# triggers hedging instead of disappearing from it.
+
+# Latency histogram bucket upper bounds in seconds (roughly log-spaced)
+LATENCY_BUCKETS = [
+    0.25, 0.5, 0.75, 1, 1.5, 2, 3, 4, 5, 6, 8, 10, 12, 15, 20, 25, 30, 45, 60, 90, 120
+]
+
+
+class LatencyHistogram:
+    """Thread-safe bucketed latency histogram."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Last bucket = overflow
+        self.total = 0
+        self.failures = 0  # Failed calls that were not timeouts (not in the buckets)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            self.total += 1
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+
+    def percentile(self, p):
+        """Upper bound of the bucket holding the p-th percentile (None if empty).
+
+        Latencies above the last bucket report the last bucket's bound, so the
+        result is always finite.
+        """
+        with self._lock:
+            if not self.total:
+                return None
+            target = self.total * p / 100.0
+            running = 0
+            for i, count in enumerate(self.counts):
+                running += count
+                if running >= target:
+                    return self.buckets[min(i, len(self.buckets) - 1)]
+        return self.buckets[-1]
+
+    def snapshot(self):
+        return {
+            "count": self.total,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "failures": self.failures,
+        }
+
+
+class ModelRouter:
+    """Routes chat completions across models with hedging and failover."""
+
+    def __init__(
+        self,
+        client,
+        routes,
+        hedge_percentile=95,
+        min_hedge_delay=1.0,
+        default_hedge_delay=10.0,
+        min_samples=20,
+        max_workers=16
+    ):
+        """
+        Args:
+            client: OpenAI client
+            routes (dict): {function name: [primary model, fallback models...]}
+            hedge_percentile (float): Latency percentile of the primary model after
+                which a hedge request is sent (0 = never hedge, failover only)
+            min_hedge_delay (float): Never hedge earlier than this many seconds
+            default_hedge_delay (float): Hedge delay until min_samples latencies are known
+            min_samples (int): Samples needed before the percentile is trusted
+            max_workers (int): Threads shared by all in-flight requests
+        """
+        self.client = client
+        self.routes = routes
+        self.hedge_percentile = hedge_percentile
+        self.min_hedge_delay = min_hedge_delay
+        self.default_hedge_delay = default_hedge_delay
+        self.min_samples = min_samples
+        self.histograms = {}
+        self._histograms_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="model-router")
+
+    # --------------------------------------------------------
+    # PUBLIC API
+    # --------------------------------------------------------
+    def complete(self, function, purpose=None, hedge=True, budget=None, cost_kind="text", **kwargs):
+        """Run a chat completion for `function` and return the response.
+
+        The losing request of a hedge is NOT cancelled: it runs to completion
+        in the background and is billed, so each hedge is charged to budget.
+
+        Args:
+            function (str): Route name (selects the model list)
+            purpose (str): Latency histogram name (default: function). Calls of
+                one function with very different sizes should use separate purposes
+            hedge (bool): Send hedge requests (False = failover only, e.g. for large
+                requests where a duplicate would double the cost)
+            budget: Optional RunBudget charged one `cost_kind` call per hedge request
+                (the caller charges the primary request itself)
+            cost_kind (str): RunBudget cost kind of one request
+            kwargs: Passed to client.chat.completions.create (minus model)
+        """
+        purpose = purpose or function
+        models = list(self.routes.get(function) or [])
+        if not models:
+            raise ValueError(f"No models configured for '{function}'")
+
+        errors = []
+        while models:
+            primary = models.pop(0)
+            hedge_model = models[0] if models and hedge and self.hedge_percentile else None
+            if hedge_model and budget is not None and not budget.can_afford(cost_kind, 2):
+                hedge_model = None  # Can't pay for a duplicate: failover only
+
+            futures = {self._executor.submit(self._timed_call, purpose, primary, kwargs): primary}
+            delay = self.hedge_delay(purpose, primary, kwargs.get("timeout")) if hedge_model else None
+            done, _ = wait(futures, timeout=delay)
+
+            if not done and hedge_model:
+                print(f"⏳ {primary} slow for '{function}', hedging with {hedge_model}")
+                futures[self._executor.submit(self._timed_call, purpose, hedge_model, kwargs)] = hedge_model
+                models.pop(0)
+                if budget is not None:
+                    budget.charge(cost_kind)
+
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        response = future.result()
+                    except Exception as e:
+                        print(f"⚠️ {futures[future]} failed for '{function}': {e}")
+                        errors.append(e)
+                        continue
+                    # Winner found: drop the loser. A request that is already on the
+                    # wire cannot be aborted by the sync client; it finishes in the
+                    # background (already charged) and its result is discarded.
+                    for loser in pending:
+                        loser.cancel()
+                    return response
+
+            if models:
+                print(f"↪️  Failing over '{function}' to {models[0]}")
+
+        raise errors[-1]
+
+    def hedge_delay(self, purpose, model, timeout=None):
+        """Seconds to wait on `model` for `purpose` calls before sending a hedge request.
+
+        Never longer than the call's own timeout (if any).
+        """
+        histogram = self._histogram(purpose, model)
+        if histogram.total < self.min_samples:
+            delay = self.default_hedge_delay
+        else:
+            delay = max(self.min_hedge_delay, histogram.percentile(self.hedge_percentile))
+        return min(delay, timeout) if timeout else delay
+
+    def stats(self):
+        """Latency snapshot per "purpose/model": count, p50, p95, p99."""
+        with self._histograms_lock:
+            histograms = list(self.histograms.items())
+        return {f"{purpose}/{model}": histogram.snapshot() for (purpose, model), histogram in histograms}
+
+    # --------------------------------------------------------
+    # INTERNALS
+    # --------------------------------------------------------
+    def _histogram(self, purpose, model):
+        key = (purpose, model)
+        with self._histograms_lock:
+            if key not in self.histograms:
+                self.histograms[key] = LatencyHistogram()
+            return self.histograms[key]
+
+    def _timed_call(self, purpose, model, kwargs):
+        histogram = self._histogram(purpose, model)
+        started = time.monotonic()
+        try:
+            response = self.client.chat.completions.create(model=model, **kwargs)
+        except Exception as e:
+            elapsed = time.monotonic() - started
+            timeout = kwargs.get("timeout")
+            if "timeout" in type(e).__name__.lower() or (timeout and elapsed >= timeout):
+                # A timeout took at least this long: record it so p95 reflects it
+                histogram.record(max(elapsed, timeout or 0))
+            else:
+                histogram.record_failure()
+            raise
+        histogram.record(time.monotonic() - started)
+        return response
@@ -0,0 +1,208 @@
+import platform
+import textwrap
+from functools import lru_cache
+
+from PIL import Image, ImageDraw, ImageFont
+
+# ------------------------------------------------------------
+# TEXT OVERLAY DRAWING
+# ------------------------------------------------------------
+# Shared by the branded feed images (tools.add_brand_text) and the reel
+# renderer (reels.py). Only depends on Pillow, so it can be imported in
+# render worker processes without loading the API clients.
+#
+# Fonts, watermarks and whole overlay layers (text + watermark on a
+# transparent canvas) are cached per process: generated images share a few
+# output sizes, so each brand's layer is laid out once per size and then
+# only pasted onto every image.
+
+WATERMARK_POSITIONS = ("top-left", "top-right", "bottom-left", "bottom-right")
+
+
+def get_system_font():
+    """Get appropriate font path based on operating system."""
+    system = platform.system()
+
+    if system == "Windows":
+        return "arial.ttf"
+    elif system == "Darwin":  # macOS
+        return "/System/Library/Fonts/Helvetica.ttc"
+    else:  # Linux
+        return "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+
+
+@lru_cache(maxsize=32)
+def load_font(size, font_path=None):
+    """Load (and cache) a TrueType font, falling back to Pillow's default font."""
+    try:
+        return ImageFont.truetype(font_path or get_system_font(), size)
+    except Exception as e:
+        print(f"⚠️ Could not load system font: {e}. Using default.")
+        return ImageFont.load_default()
+
+
+def draw_brand_text(
+    img,
+    brand_text,
+    website_text="",
+    text_size=80,
+    bottom_margin=60,
+    font_path=None,
+    wrap_chars=None,
+    align="left",
+    text_color=(255, 255, 255),
+    shadow_color=(0, 0, 0)
+):
+    """Draw centered, shadowed text lines near the bottom of an image (in place).
+
+    Args:
+        img: PIL image to draw on
+        brand_text: Line 1 (wrapped to the image width)
+        website_text: Line 2, drawn 30% smaller (optional)
+        text_size: Font size for line 1
+        bottom_margin: Pixels between the last line and the bottom edge
+        font_path: TrueType font file (default: system font)
+        wrap_chars: Characters per line for line 1 (default: scaled from text_size
+            for landscape images); line 2 wraps 25% wider
+        align: Alignment of wrapped lines within a text block ("left" or "center")
+        text_color: RGB(A) fill of the text
+        shadow_color: RGB(A) fill of the drop shadow (None = no shadow)
+    """
+    draw = ImageDraw.Draw(img)
+
+    # Load fonts with custom size
+    main_font = load_font(text_size, font_path)
+    # Website text slightly smaller
+    website_font = load_font(int(text_size * 0.7), font_path)
+
+    width, height = img.size
+
+    # Prepare text lines
+    texts_to_draw = []
+
+    # Line 1: Brand text
+    if brand_text:
+        wrap_width = wrap_chars or int(40 * (80 / text_size))
+        wrapped_brand = textwrap.fill(brand_text, width=wrap_width)
+        texts_to_draw.append((wrapped_brand, main_font))
+
+    # Line 2: Website text (if provided)
+    if website_text:
+        wrap_width_web = int(wrap_chars * 1.25) if wrap_chars else int(50 * (80 / text_size))
+        wrapped_website = textwrap.fill(website_text, width=wrap_width_web)
+        texts_to_draw.append((wrapped_website, website_font))
+
+    # Calculate total height needed
+    total_height = 0
+    line_spacing = int(text_size * 0.3)  # Space between lines
+
+    for text, font in texts_to_draw:
+        text_bbox = draw.textbbox((0, 0), text, font=font, align=align)
+        text_height = text_bbox[3] - text_bbox[1]
+        total_height += text_height
+        if len(texts_to_draw) > 1:
+            total_height += line_spacing
+
+    # Starting Y position (from bottom)
+    current_y = height - total_height - bottom_margin
+
+    # Draw each text line
+    shadow_offset = max(3, int(text_size / 25))
+
+    for text, font in texts_to_draw:
+        text_bbox = draw.textbbox((0, 0), text, font=font, align=align)
+        text_width = text_bbox[2] - text_bbox[0]
+        text_height = text_bbox[3] - text_bbox[1]
+
+        x = (width - text_width) // 2
+
+        # Draw shadow
+        if shadow_color is not None:
+            draw.text((x + shadow_offset, current_y + shadow_offset), text, font=font, fill=shadow_color, align=align)
+        # Draw text
+        draw.text((x, current_y), text, font=font, fill=text_color, align=align)
+
+        # Move to next line
+        current_y += text_height + line_spacing
+
+
+@lru_cache(maxsize=16)
+def load_watermark(path):
+    """Load (and cache) a watermark image as RGBA."""
+    with Image.open(path) as source:
+        return source.convert("RGBA")
+
+
+def watermark_piece(image_size, watermark_path, position="bottom-right", scale=0.15, opacity=1.0):
+    """Scale a watermark for an image and place it in a corner.
+
+    Args:
+        image_size: (width, height) of the image it goes on
+        watermark_path: Image file (PNG with transparency works best)
+        position: One of WATERMARK_POSITIONS
+        scale: Watermark width as a fraction of the image width
+        opacity: 0.0 (invisible) - 1.0 (as in the file)
+
+    Returns:
+        tuple: (RGBA watermark, (x, y) offset)
+    """
+    if position not in WATERMARK_POSITIONS:
+        raise ValueError(f"Unknown watermark position: {position}")
+
+    image_width, image_height = image_size
+    mark = load_watermark(watermark_path)
+    width = max(1, round(image_width * scale))
+    height = max(1, round(mark.height * width / mark.width))
+    mark = mark.resize((width, height), Image.LANCZOS)
+    if opacity < 1.0:
+        mark.putalpha(mark.getchannel("A").point(lambda a: round(a * opacity)))
+
+    margin = round(image_width * 0.03)
+    x = margin if position.endswith("left") else image_width - width - margin
+    y = margin if position.startswith("top") else image_height - height - margin
+    return mark, (x, y)
+
+
+@lru_cache(maxsize=64)
+def brand_layer(
+    size,
+    brand_text,
+    website_text="",
+    text_size=80,
+    font_path=None,
+    text_color=(255, 255, 255),
+    shadow_color=(0, 0, 0),
+    watermark_path=None,
+    watermark_position="bottom-right",
+    watermark_scale=0.15,
+    watermark_opacity=1.0
+):
+    """Build (and cache) the overlay for one image size.
+
+    All arguments must be hashable (colors as tuples). The text block and
+    the watermark are kept as separate pieces cropped to their content, so
+    applying the overlay only touches those pixels. The returned images are
+    shared between callers - paste them, don't draw on them.
+
+    Returns:
+        tuple: ((RGBA piece, (x, y) offset), ...) for apply_layer
+    """
+    pieces = []
+    if watermark_path:
+        pieces.append(watermark_piece(size, watermark_path, watermark_position, watermark_scale, watermark_opacity))
+
+    text = Image.new("RGBA", size, (0, 0, 0, 0))
+    draw_brand_text(
+        text, brand_text, website_text, text_size,
+        font_path=font_path, text_color=text_color, shadow_color=shadow_color
+    )
+    box = text.getbbox()
+    if box:
+        pieces.append((text.crop(box), box[:2]))
+    return tuple(pieces)
+
+
+def apply_layer(img, pieces):
+    """Paste the pieces from brand_layer / watermark_piece onto an image (in place)."""
+    for piece, offset in pieces:
+        img.paste(piece, offset, piece)
@@ -0,0 +1,282 @@
+import base64
+import hashlib
+import hmac
+import json
+import time
+import threading
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ------------------------------------------------------------
+# ASYNC REPLICATE PREDICTIONS (POLLER + WEBHOOK RECEIVER)
+# ------------------------------------------------------------
+# Instead of holding a thread per image inside replicate_client.run(),
+# predictions are created with predictions.create() and tracked by a
+# single background loop. Every submit() returns a Future, so any number
+# of callers (threads, campaigns) can share one poller and keep dozens of
+# generations in flight at once.
+
+FLUX_MODEL = "black-forest-labs/flux-schnell"
+TERMINAL_STATUSES = ("succeeded", "failed", "canceled")
+WEBHOOK_TOLERANCE = 300  # Seconds a signed webhook timestamp may be off
+
+
+class PredictionError(Exception):
+    """Raised when a prediction fails, is canceled or times out."""
+
+
+class PredictionPoller:
+    """Multiplexes many in-flight Replicate predictions over one loop."""
+
+    def __init__(self, client, poll_interval=1.0, receiver=None, fallback_interval=30.0):
+        """
+        Args:
+            client: replicate.Client
+            poll_interval (float): Seconds between polling rounds
+            receiver (WebhookReceiver): If set, completions arrive by webhook and
+                predictions are only polled every fallback_interval seconds
+            fallback_interval (float): Safety-net polling interval in webhook mode
+        """
+        self.client = client
+        self.poll_interval = poll_interval
+        self.receiver = receiver
+        self.fallback_interval = fallback_interval
+        self._pending = {}  # prediction id -> {"future", "deadline", "last_poll"}
+        self._lock = threading.Lock()
+        self._thread = None
+
+        if receiver is not None:
+            receiver.add_listener(self._on_webhook)
+
+    # --------------------------------------------------------
+    # PUBLIC API
+    # --------------------------------------------------------
+    def submit(self, prompt, model=FLUX_MODEL, extra_input=None, timeout=None):
+        """Create a prediction and return a Future for its result.
+
+        The Future resolves to {"id", "status", "output"} once the prediction
+        succeeds, or raises PredictionError if it fails or exceeds timeout.
+        """
+        inputs = dict(extra_input or {})
+        inputs["prompt"] = prompt
+
+        kwargs = {}
+        if self.receiver is not None and self.receiver.public_url:
+            kwargs["webhook"] = self.receiver.public_url
+            kwargs["webhook_events_filter"] = ["completed"]
+
+        prediction = self.client.models.predictions.create(model=model, input=inputs, **kwargs)
+
+        future = Future()
+        future.prediction_id = prediction.id
+        with self._lock:
+            self._pending[prediction.id] = {
+                "future": future,
+                "deadline": time.monotonic() + timeout if timeout else None,
+                "last_poll": time.monotonic(),
+            }
+            self._ensure_thread()
+        return future
+
+    def cancel(self, future):
+        """Cancel the prediction behind a Future returned by submit()."""
+        prediction_id = getattr(future, "prediction_id", None)
+        with self._lock:
+            entry = self._pending.pop(prediction_id, None)
+        if entry is None:
+            return
+        try:
+            self.client.predictions.cancel(prediction_id)
+        except Exception as e:
+            print(f"⚠️  Could not cancel prediction {prediction_id}: {e}")
+        if not entry["future"].done():
+            entry["future"].set_exception(PredictionError(f"Prediction {prediction_id} canceled"))
+
+    def in_flight(self):
+        """Number of predictions currently tracked."""
+        with self._lock:
+            return len(self._pending)
+
+    # --------------------------------------------------------
+    # POLLING LOOP
+    # --------------------------------------------------------
+    def _ensure_thread(self):
+        # Caller holds self._lock
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="prediction-poller", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._thread = None
+                    return
+                snapshot = list(self._pending.items())
+
+            now = time.monotonic()
+            for prediction_id, entry in snapshot:
+                if entry["deadline"] is not None and now >= entry["deadline"]:
+                    self._expire(prediction_id)
+                    continue
+
+                if self.receiver is not None and now - entry["last_poll"] < self.fallback_interval:
+                    continue
+
+                entry["last_poll"] = now
+                try:
+                    prediction = self.client.predictions.get(prediction_id)
+                except Exception as e:
+                    print(f"⚠️  Polling prediction {prediction_id} failed: {e}")
+                    continue
+
+                if prediction.status in TERMINAL_STATUSES:
+                    self._resolve(prediction_id, prediction.status, prediction.output, prediction.error)
+
+            time.sleep(self.poll_interval)
+
+    def _expire(self, prediction_id):
+        with self._lock:
+            entry = self._pending.pop(prediction_id, None)
+        if entry is None:
+            return
+        try:
+            self.client.predictions.cancel(prediction_id)
+        except Exception:
+            pass
+        entry["future"].set_exception(PredictionError(f"Prediction {prediction_id} timed out"))
+
+    def _resolve(self, prediction_id, status, output, error):
+        with self._lock:
+            entry = self._pending.pop(prediction_id, None)
+        if entry is None or entry["future"].done():
+            return
+
+        if status == "succeeded":
+            if isinstance(output, str):
+                output = [output]
+            entry["future"].set_result({
+                "id": prediction_id,
+                "status": status,
+                "output": [str(url) for url in (output or [])],
+            })
+        else:
+            entry["future"].set_exception(
+                PredictionError(f"Prediction {prediction_id} {status}: {error}")
+            )
+
+    def _on_webhook(self, payload):
+        prediction_id = payload.get("id")
+        with self._lock:
+            if prediction_id not in self._pending:
+                return
+
+        if not self.receiver.secret:
+            # Unsigned webhooks are only a hint: take the result from the API
+            try:
+                prediction = self.client.predictions.get(prediction_id)
+            except Exception as e:
+                print(f"⚠️  Fetching prediction {prediction_id} after webhook failed: {e}")
+                return
+            payload = {"status": prediction.status, "output": prediction.output, "error": prediction.error}
+
+        status = payload.get("status")
+        if status in TERMINAL_STATUSES:
+            self._resolve(prediction_id, status, payload.get("output"), payload.get("error"))
+
+
+# ------------------------------------------------------------
+# LOCAL WEBHOOK RECEIVER
+# ------------------------------------------------------------
+def verify_webhook_signature(secret, headers, body, tolerance=WEBHOOK_TOLERANCE, now=None):
+    """Check a Replicate webhook signature (Standard Webhooks scheme).
+
+    The signature is base64(HMAC-SHA256("<webhook-id>.<webhook-timestamp>.<body>"))
+    keyed with the base64 part of the "whsec_..." signing secret. The
+    webhook-signature header holds one or more space-separated "v1,<signature>".
+
+    Returns:
+        bool: True if one of the signatures matches and the timestamp is recent
+    """
+    webhook_id = headers.get("webhook-id")
+    timestamp = headers.get("webhook-timestamp")
+    signatures = headers.get("webhook-signature")
+    if not webhook_id or not timestamp or not signatures:
+        return False
+    try:
+        if abs((now or time.time()) - int(timestamp)) > tolerance:
+            return False
+        key = base64.b64decode(secret.split("_", 1)[1] if secret.startswith("whsec_") else secret)
+    except ValueError:
+        return False
+
+    signed = f"{webhook_id}.{timestamp}.".encode() + body
+    expected = base64.b64encode(hmac.new(key, signed, hashlib.sha256).digest()).decode()
+    for signature in signatures.split():
+        version, _, value = signature.partition(",")
+        if version == "v1" and hmac.compare_digest(value, expected):
+            return True
+    return False
+
+
+class WebhookReceiver:
+    """Tiny HTTP server that receives Replicate prediction webhooks.
+
+    Replicate must be able to reach it, so public_url is the externally
+    visible address (e.g. a tunnel or reverse proxy) forwarding to
+    host:port on this machine. With a signing secret, requests without a
+    valid signature are rejected; without one, the poller re-fetches each
+    notified prediction from the API instead of trusting the request body.
+    """
+
+    def __init__(self, public_url, host="0.0.0.0", port=8765, secret=None):
+        self.public_url = public_url
+        self.host = host
+        self.port = port
+        self.secret = secret
+        self._listeners = []
+        self._server = None
+
+    def add_listener(self, callback):
+        self._listeners.append(callback)
+
+    def start(self):
+        if self._server is not None:
+            return self
+
+        receiver = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length)
+                if receiver.secret and not verify_webhook_signature(receiver.secret, self.headers, body):
+                    print("⚠️  Rejected Replicate webhook with an invalid signature")
+                    self.send_response(401)
+                    self.end_headers()
+                    return
+                try:
+                    payload = json.loads(body or b"{}")
+                    if not isinstance(payload, dict):
+                        raise ValueError("webhook body is not an object")
+                except ValueError:
+                    self.send_response(400)
+                    self.end_headers()
+                    return
+                for callback in receiver._listeners:
+                    callback(payload)
+                self.send_response(200)
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), _Handler)
+        threading.Thread(target=self._server.serve_forever, name="replicate-webhooks", daemon=True).start()
+        print(f"✓ Replicate webhook receiver listening on {self.host}:{self.port}")
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server = None
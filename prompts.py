@@ -0,0 +1,294 @@
+from string import Template
+
+try:
+    import tiktoken
+except ImportError:  # Optional - falls back to a ~4 characters/token estimate
+    tiktoken = None
+
+# ------------------------------------------------------------
+# PROMPT TEMPLATE REGISTRY
+# ------------------------------------------------------------
+# Every LLM prompt is split into a STATIC prefix (instructions that never
+# change, sent first as the system message so provider-side prompt caching
+# can reuse it) and a small DYNAMIC part compiled once as a string.Template.
+# Templates count their tokens and trim long fields to stay inside a
+# per-call input budget; each also carries its own max_tokens budget.
+# Token counting starts on the first build(), not at import: tiktoken
+# downloads its encoding on first use, and if that fails (offline host)
+# counts fall back to a characters-per-token estimate.
+
+TOKENIZER_ENCODING = "o200k_base"  # gpt-4o / gpt-4.1 family
+CHARS_PER_TOKEN = 4
+
+_encoding = None
+_encoding_failed = False
+
+
+def _get_encoding():
+    global _encoding, _encoding_failed
+    if _encoding is None and tiktoken is not None and not _encoding_failed:
+        try:
+            _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+        except Exception as e:
+            _encoding_failed = True
+            print(f"⚠️  tiktoken encoding unavailable, estimating token counts: {e}")
+    return _encoding
+
+
+def count_tokens(text):
+    """Count tokens with tiktoken, or estimate them if it isn't installed."""
+    encoding = _get_encoding()
+    if encoding is None:
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    return len(encoding.encode(text))
+
+
+def truncate_tokens(text, max_tokens):
+    """Cut text down to at most max_tokens tokens."""
+    if max_tokens <= 0:
+        return ""
+    encoding = _get_encoding()
+    if encoding is None:
+        return text[:max_tokens * CHARS_PER_TOKEN]
+    tokens = encoding.encode(text)
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+
+
+class PromptTemplate:
+    """A compiled prompt: static cacheable prefix + dynamic template."""
+
+    def __init__(self, name, static_prefix, template, max_input_tokens=None, max_tokens=None, trim_fields=()):
+        """
+        Args:
+            name (str): Registry name
+            static_prefix (str): Instructions shared by every call (system message)
+            template (str): Dynamic part with $placeholders (user message)
+            max_input_tokens (int): Input budget for prefix + dynamic part (None = unlimited)
+            max_tokens (int): Output budget passed to the completion (None = model default)
+            trim_fields (tuple): Fields that may be shortened, in order, to fit the input budget
+        """
+        self.name = name
+        self.static_prefix = static_prefix.strip()
+        self.template = Template(template.strip())
+        self.max_input_tokens = max_input_tokens
+        self.max_tokens = max_tokens
+        self.trim_fields = trim_fields
+        self._prefix_tokens = None
+
+    @property
+    def prefix_tokens(self):
+        """Tokens in the static prefix (counted on first use)."""
+        if self._prefix_tokens is None:
+            self._prefix_tokens = count_tokens(self.static_prefix)
+        return self._prefix_tokens
+
+    def build(self, max_tokens=None, **fields):
+        """Render the prompt for one call.
+
+        Returns:
+            dict: {"messages", "max_tokens", "input_tokens"} ready for a chat completion
+        """
+        fields = {key: str(value) for key, value in fields.items()}
+        dynamic = self.template.substitute(fields)
+        input_tokens = self.prefix_tokens + count_tokens(dynamic)
+
+        if self.max_input_tokens and input_tokens > self.max_input_tokens:
+            for field in self.trim_fields:
+                over = input_tokens - self.max_input_tokens
+                if over <= 0:
+                    break
+                fields[field] = truncate_tokens(fields[field], count_tokens(fields[field]) - over)
+                dynamic = self.template.substitute(fields)
+                input_tokens = self.prefix_tokens + count_tokens(dynamic)
+
+            if input_tokens > self.max_input_tokens:
+                raise ValueError(
+                    f"Prompt '{self.name}' needs {input_tokens} tokens, "
+                    f"over its budget of {self.max_input_tokens}"
+                )
+
+        return {
+            "messages": [
+                {"role": "system", "content": self.static_prefix},
+                {"role": "user", "content": dynamic},
+            ],
+            "max_tokens": max_tokens or self.max_tokens,
+            "input_tokens": input_tokens,
+        }
+
+
+# ------------------------------------------------------------
+# TEMPLATES
+# ------------------------------------------------------------
+POSTS_STYLE_RULES = """STYLE RULES:
+- Write captions with 2-3 sentences.
+- Professional and motivational.
+- Relevant to the UAE.
+- No repetition across posts.
+- Include EXACTLY 5 high-performing hashtags.
+- Return VALID JSON ONLY."""
+
+POST_SHAPE = '{"title": "", "caption": "", "hashtags": ""}'
+
+REEL_SCRIPT_SHAPE = """{
+    "hook": "",
+    "scenes": [
+      {"scene": 1, "description": "", "camera_direction": "", "narration": ""},
+      {"scene": 2, "description": "", "camera_direction": "", "narration": ""},
+      {"scene": 3, "description": "", "camera_direction": "", "narration": ""}
+    ],
+    "cta": ""
+  }"""
+
+PROMPTS = {
+    "posts": PromptTemplate(
+        "posts",
+        static_prefix=f"""
+You are a Social Media Creative Agent.
+
+You will be asked for an exact number of posts about a topic.
+
+{POSTS_STYLE_RULES}
+
+Return JSON ONLY, with one object per requested post:
+{{
+  "posts": [
+    {POST_SHAPE}
+  ]
+}}
+""",
+        template="Generate EXACTLY $num_posts posts about: $topic",
+        max_input_tokens=1000,
+        trim_fields=("topic",),
+    ),
+    "image_prompt": PromptTemplate(
+        "image_prompt",
+        static_prefix="""
+Generate a detailed image prompt for AI image generation based on the social media post you are given.
+
+Create a professional product photography prompt that:
+1. Shows the actual products/items mentioned or implied in the post
+2. Uses appropriate styling for the industry (beauty/cosmetics/tech/fashion/etc)
+3. Is visually appealing and commercial-quality
+4. Relevant to UAE market
+5. No text in the image
+
+Return ONLY the image generation prompt, nothing else. Be specific about products, lighting, and composition.
+""",
+        template="""
+Title: $title
+Caption: $caption
+""",
+        max_input_tokens=600,
+        max_tokens=200,
+        trim_fields=("caption", "title"),
+    ),
+    "reel_script": PromptTemplate(
+        "reel_script",
+        static_prefix=f"""
+Create a TikTok/Reel Script about the topic you are given.
+
+Return JSON ONLY:
+{{
+  "reel_script": {REEL_SCRIPT_SHAPE}
+}}
+""",
+        template="Topic: $topic",
+        max_input_tokens=800,
+        max_tokens=800,
+        trim_fields=("topic",),
+    ),
+
+    # Batched variants: several topics per request, answered per topic id
+    "posts_batch": PromptTemplate(
+        "posts_batch",
+        static_prefix=f"""
+You are a Social Media Creative Agent.
+
+You will be given a numbered list of topics and an exact number of posts to write for EACH topic.
+Treat every topic independently.
+
+{POSTS_STYLE_RULES}
+
+Return JSON ONLY, with one entry per topic id:
+{{
+  "results": [
+    {{"id": "1", "posts": [{POST_SHAPE}]}}
+  ]
+}}
+""",
+        template="""
+Generate EXACTLY $num_posts posts for EACH topic:
+$topics
+""",
+        max_input_tokens=4000,
+    ),
+    "reel_script_batch": PromptTemplate(
+        "reel_script_batch",
+        static_prefix=f"""
+Create a TikTok/Reel Script for EACH topic in the numbered list you are given.
+Treat every topic independently.
+
+Return JSON ONLY, with one entry per topic id:
+{{
+  "results": [
+    {{"id": "1", "reel_script": {REEL_SCRIPT_SHAPE}}}
+  ]
+}}
+""",
+        template="""
+Topics:
+$topics
+""",
+        max_input_tokens=4000,
+    ),
+}
+
+# Output tokens per requested post (title + 2-3 sentence caption + hashtags),
+# with headroom: a JSON-mode answer cut off at max_tokens is invalid JSON
+TOKENS_PER_POST = 220
+POSTS_TOKENS_OVERHEAD = 100
+
+
+def posts_max_tokens(num_posts):
+    """Output budget for a posts completion with num_posts posts."""
+    return TOKENS_PER_POST * num_posts + POSTS_TOKENS_OVERHEAD
+
+
+def numbered_topics(topics):
+    """Render topics as '1. topic' lines; ids are the 1-based positions."""
+    return "\n".join(f"{i}. {topic.strip()}" for i, topic in enumerate(topics, 1))
+
+
+# ------------------------------------------------------------
+# IMAGE (FLUX) PROMPT FRAGMENTS
+# ------------------------------------------------------------
+NO_TEXT_SUFFIX = """CRITICAL: Absolutely NO text, NO words, NO letters, NO signs, NO labels, NO typography anywhere in the image.
+Do not generate: store signs, product labels, brand names, written text, numbers, letters, Arabic text, English text, or any readable characters.
+Clean product photography without any visible text or writing."""
+
+FALLBACK_IMAGE_PROMPT = Template("""Professional commercial photograph.
+Subject: $title
+Context: $caption
+Style: high-quality product photography, studio lighting
+Mood: professional, commercial, aspirational""")
+
+
+def finalize_image_prompt(body, tail="Aspect ratio: 16:9.", style=None):
+    """Append the brand style (optional) and the shared no-text specification to an image prompt."""
+    brand_style = f"\nBrand style: {style}" if style else ""
+    return f"{body.strip()}{brand_style}\n{NO_TEXT_SUFFIX}\n{tail}"
+
+
+def image_prompt_body(prompt):
+    """The subject of a finalized image prompt, without the brand style and shared suffix."""
+    for marker in ("\nBrand style: ", f"\n{NO_TEXT_SUFFIX}"):
+        prompt = prompt.split(marker, 1)[0]
+    return prompt.strip()
+
+
+def fallback_image_prompt(title, caption, style=None):
+    """Deterministic image prompt used when no AI-written prompt is available."""
+    return finalize_image_prompt(
+        FALLBACK_IMAGE_PROMPT.substitute(title=title, caption=caption[:100]), style=style
+    )
@@ -0,0 +1,241 @@
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+from overlay import draw_brand_text, watermark_piece
+
+# ------------------------------------------------------------
+# LOCAL REEL RENDERING (VERTICAL MP4)
+# ------------------------------------------------------------
+# Turns a reel_script (hook, scenes, CTA) and the campaign images into a
+# 1080x1920 MP4. Every scene is one image with a slow zoom and its text
+# drawn with the same overlay as the branded feed images. Scenes render in
+# parallel worker processes; each streams raw frames straight into its own
+# ffmpeg process, so only one frame per scene is in memory. The finished
+# scene clips are joined without re-encoding.
+
+REEL_SIZE = (1080, 1920)
+REEL_FPS = 30
+REEL_TEXT_SIZE = 64
+REEL_WRAP_CHARS = 26         # Caption characters per line at REEL_TEXT_SIZE on 1080px
+REEL_BOTTOM_MARGIN = 320     # Keep captions above the Instagram/TikTok UI
+ZOOM = 0.08                  # Ken Burns zoom over a scene (8%)
+
+WORDS_PER_SECOND = 2.5       # Reading speed used to time each scene
+MIN_SCENE_SECONDS = 2.5
+MAX_SCENE_SECONDS = 8.0
+
+REELS_DIR = "reels"
+
+
+def find_ffmpeg():
+    """Locate an ffmpeg binary (FFMPEG_PATH, PATH, or the imageio-ffmpeg package)."""
+    path = os.getenv("FFMPEG_PATH") or shutil.which("ffmpeg")
+    if path:
+        return path
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        raise RuntimeError(
+            "ffmpeg not found - install it, set FFMPEG_PATH, or `pip install imageio-ffmpeg`"
+        )
+
+
+def scene_duration(text):
+    """Seconds a scene stays on screen: long enough to read its text."""
+    words = len((text or "").split())
+    return min(MAX_SCENE_SECONDS, max(MIN_SCENE_SECONDS, words / WORDS_PER_SECOND))
+
+
+def build_scenes(reel_script, num_images):
+    """Turn a reel script into scenes: [{"text", "duration", "image_index"}].
+
+    The hook opens the reel, each script scene contributes its narration, and
+    the CTA closes it. Images are used in order and repeat if there are fewer
+    images than scenes.
+    """
+    script = reel_script.get("reel_script", reel_script) if reel_script else {}
+
+    texts = []
+    if script.get("hook"):
+        texts.append(script["hook"])
+    for scene in script.get("scenes") or []:
+        text = scene.get("narration") or scene.get("description")
+        if text:
+            texts.append(text)
+    if script.get("cta"):
+        texts.append(script["cta"])
+
+    return [
+        {"text": text, "duration": scene_duration(text), "image_index": i % num_images}
+        for i, text in enumerate(texts)
+    ]
+
+
+def _render_scene(job):
+    """Render one scene to an MP4 clip (runs in a worker process)."""
+    width, height = job["size"]
+    frames = max(1, round(job["duration"] * job["fps"]))
+
+    # Start zoomed out on a slightly larger canvas and move in to the frame size
+    zoom_w, zoom_h = round(width * (1 + ZOOM)), round(height * (1 + ZOOM))
+    with Image.open(BytesIO(job["image_bytes"])) as source:
+        base = ImageOps.fit(source.convert("RGB"), (zoom_w, zoom_h), method=Image.LANCZOS)
+
+    # The text is drawn once on a transparent layer and pasted onto every frame
+    caption = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    style = job["style"]
+    if style.get("watermark_path"):
+        mark, position = watermark_piece(
+            (width, height), style["watermark_path"], style["watermark_position"],
+            style["watermark_scale"], style["watermark_opacity"]
+        )
+        caption.alpha_composite(mark, position)
+    draw_brand_text(
+        caption, job["text"], job["brand_text"], job["text_size"],
+        bottom_margin=REEL_BOTTOM_MARGIN,
+        font_path=style.get("font_path"),
+        wrap_chars=max(8, round(REEL_WRAP_CHARS * (width / 1080) * (REEL_TEXT_SIZE / job["text_size"]))),
+        align="center",
+        text_color=style.get("text_color", (255, 255, 255)),
+        shadow_color=style.get("shadow_color", (0, 0, 0))
+    )
+
+    encoder = subprocess.Popen(
+        [
+            job["ffmpeg"], "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}",
+            "-r", str(job["fps"]), "-i", "-",
+            "-c:v", "libx264", "-preset", "veryfast", "-crf", "23", "-pix_fmt", "yuv420p",
+            job["path"],
+        ],
+        stdin=subprocess.PIPE
+    )
+    try:
+        for n in range(frames):
+            t = n / max(1, frames - 1)
+            crop_w = round(zoom_w - (zoom_w - width) * t)
+            crop_h = round(zoom_h - (zoom_h - height) * t)
+            left, top = (zoom_w - crop_w) // 2, (zoom_h - crop_h) // 2
+            frame = base.resize((width, height), Image.BILINEAR, box=(left, top, left + crop_w, top + crop_h))
+            frame.paste(caption, (0, 0), caption)
+            encoder.stdin.write(frame.tobytes())
+            frame.close()
+    finally:
+        encoder.stdin.close()
+        encoder.wait()
+
+    if encoder.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed for scene {job['path']} (exit {encoder.returncode})")
+    return job["path"]
+
+
+def render_reel(
+    reel_script,
+    images,
+    brand_text=None,
+    output_path=None,
+    workers=None,
+    fps=REEL_FPS,
+    size=REEL_SIZE,
+    text_size=REEL_TEXT_SIZE,
+    brand=None
+):
+    """Render a vertical MP4 reel from a reel script and campaign images.
+
+    Args:
+        reel_script: Output of generate_reels_script ({"reel_script": {...}} or the inner dict)
+        images: Image URLs or local paths, used in scene order
+        brand_text: Shown under every caption (None = captions only)
+        output_path: MP4 path (default: reels/reel_<timestamp>.mp4)
+        workers: Scene render processes (default: CPU count)
+        fps: Frames per second
+        size: (width, height) of the video
+        text_size: Caption font size
+        brand: Optional BrandProfile - font, colors and watermark of the captions
+
+    Returns:
+        str: Path of the rendered MP4
+    """
+    from tools import download_image
+
+    if not images:
+        raise ValueError("At least one image is needed to render a reel")
+    scenes = build_scenes(reel_script, len(images))
+    if not scenes:
+        raise ValueError("Reel script has no hook, scenes or CTA to render")
+
+    ffmpeg = find_ffmpeg()
+    started = time.monotonic()
+
+    image_bytes = []
+    for source in images:
+        if source.startswith(("http://", "https://")):
+            buffer = download_image(source)
+            image_bytes.append(buffer.getvalue())
+            buffer.close()
+        else:
+            with open(source, "rb") as f:
+                image_bytes.append(f.read())
+
+    style = brand.overlay_style() if brand is not None else {}
+
+    if output_path is None:
+        os.makedirs(REELS_DIR, exist_ok=True)
+        output_path = os.path.join(REELS_DIR, f"reel_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.mp4")
+
+    video_seconds = sum(scene["duration"] for scene in scenes)
+    workers = min(len(scenes), workers or os.cpu_count() or 1)
+    print(f"🎞️  Rendering reel: {len(scenes)} scenes, {video_seconds:.1f}s of video, {workers} worker(s)")
+
+    with tempfile.TemporaryDirectory(prefix="reel_") as tmp:
+        jobs = [
+            {
+                "image_bytes": image_bytes[scene["image_index"]],
+                "text": scene["text"],
+                "brand_text": brand_text,
+                "duration": scene["duration"],
+                "fps": fps,
+                "size": size,
+                "text_size": text_size,
+                "style": style,
+                "ffmpeg": ffmpeg,
+                "path": os.path.join(tmp, f"scene_{i:03d}.mp4"),
+            }
+            for i, scene in enumerate(scenes)
+        ]
+
+        if workers > 1:
+            # Spawned workers: forking a process that runs HTTP servers and
+            # thread pools (worker, scheduler) can copy held locks into the child
+            spawn = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=spawn) as executor:
+                clips = list(executor.map(_render_scene, jobs))
+        else:
+            clips = [_render_scene(job) for job in jobs]
+
+        # Join the clips without re-encoding
+        list_path = os.path.join(tmp, "clips.txt")
+        with open(list_path, "w", encoding="utf-8") as f:
+            for clip in clips:
+                f.write(f"file '{clip}'\n")
+        subprocess.run(
+            [ffmpeg, "-y", "-loglevel", "error", "-f", "concat", "-safe", "0",
+             "-i", list_path, "-c", "copy", "-movflags", "+faststart", output_path],
+            check=True
+        )
+
+    elapsed = time.monotonic() - started
+    print(f"✓ Reel saved to: {output_path} "
+          f"({video_seconds:.1f}s video in {elapsed:.1f}s, {elapsed / video_seconds:.2f}s per video second)")
+    return output_path
@@ -1,9 +1,5 @@
 from main import SocialMediaPipelineAgent
-
-# -------------------------------
-# INITIALIZE AGENT
-# -------------------------------
-agent = SocialMediaPipelineAgent()
+from brands import USE_PROFILE
 
 # -------------------------------
 # USER SETTINGS (EDIT FREELY)
@@ -16,10 +12,24 @@ USE_CUSTOM_IMAGE = False       # True → use your own design
 CUSTOM_IMAGE_PATH = "images/mydesign.jpg"  # Used only if USE_CUSTOM_IMAGE=True
 
 PUSH_TO_ZAPIER = True          # True → send to Instagram via Zapier
+ZAPIER_MODE = "first"          # "first" → first post only, "batch" / "concurrent" → all posts
+ASYNC_DELIVERY = False         # True → queue Zapier/ImgBB deliveries (drain with: python delivery_queue.py)
+
+NUM_POSTS = 3                  # Post variants per campaign
+IMAGES_PER_PROMPT = 1          # Image variants per post (1-4)
+PREDICTION_MODE = "blocking"    # "blocking" | "poll" | "webhook" (needs REPLICATE_WEBHOOK_URL)
+SPECULATIVE_IMAGES = False     # True → start images from the fallback prompt while smart prompts are written
+SPECULATION_POLICY = "first_ready"  # "first_ready" | "smart_within_deadline"
+RENDER_REEL = False            # True → render the reel script into reels/*.mp4 (needs ffmpeg)
 
-# Text Overlay Settings
-BRAND_TEXT = "Experts Group FZE"  # Text to display on images
-TEXT_SIZE = 80                    # Font size (30-150)
+# Run limits (None → no limit)
+DEADLINE_SECONDS = None        # e.g. 120 → finish (degraded if needed) within 2 minutes
+MAX_COST = None                # e.g. 0.02 → estimated USD budget per run
+
+# Brand & Text Overlay Settings
+BRAND = "default"                 # Brand profile (text, website, font, colors, watermark) from brands.json
+BRAND_TEXT = None                 # None → profile text, or a string to override it
+TEXT_SIZE = None                  # None → profile size, or a font size (30-150)
 ADD_TEXT_OVERLAY = True           # True → add text, False → clean images
 
 # Custom Image Prompt (Optional)
@@ -33,24 +43,27 @@ Composition: [layout description]
 NO TEXT in image.
 """
 
-# -------------------------------
-# VALIDATION
-# -------------------------------
-if USE_CUSTOM_IMAGE and GENERATE_IMAGE:
-    print("\n⚠️ Warning: Both USE_CUSTOM_IMAGE and GENERATE_IMAGE are True.")
-    print("   Only USE_CUSTOM_IMAGE will be used.\n")
-
-if USE_CUSTOM_IMAGE:
-    import os
-    if not os.path.exists(CUSTOM_IMAGE_PATH):
-        print(f"\n❌ Error: Custom image not found at: {CUSTOM_IMAGE_PATH}")
-        print("   Please check the path or set USE_CUSTOM_IMAGE=False\n")
-        exit(1)
-
 # -------------------------------
 # RUN THE PIPELINE
 # -------------------------------
+# Everything below runs only when this file is executed: reel rendering uses
+# spawned worker processes, which re-import the __main__ module.
 if __name__ == "__main__":
+    # VALIDATION
+    if USE_CUSTOM_IMAGE and GENERATE_IMAGE:
+        print("\n⚠️ Warning: Both USE_CUSTOM_IMAGE and GENERATE_IMAGE are True.")
+        print("   Only USE_CUSTOM_IMAGE will be used.\n")
+
+    if USE_CUSTOM_IMAGE:
+        import os
+        if not os.path.exists(CUSTOM_IMAGE_PATH):
+            print(f"\n❌ Error: Custom image not found at: {CUSTOM_IMAGE_PATH}")
+            print("   Please check the path or set USE_CUSTOM_IMAGE=False\n")
+            exit(1)
+
+    # INITIALIZE AGENT
+    agent = SocialMediaPipelineAgent()
+
     try:
         result = agent.run(
             topic=TOPIC,
@@ -58,9 +71,20 @@ if __name__ == "__main__":
             use_custom_image=USE_CUSTOM_IMAGE,
             custom_image_path=CUSTOM_IMAGE_PATH,
             push_to_zap=PUSH_TO_ZAPIER,
-            brand_text=BRAND_TEXT if ADD_TEXT_OVERLAY else None,
+            brand=BRAND,
+            brand_text=(BRAND_TEXT or USE_PROFILE) if ADD_TEXT_OVERLAY else None,
             text_size=TEXT_SIZE,
-            custom_image_prompt=CUSTOM_IMAGE_PROMPT if USE_CUSTOM_PROMPT else None
+            custom_image_prompt=CUSTOM_IMAGE_PROMPT if USE_CUSTOM_PROMPT else None,
+            zap_mode=ZAPIER_MODE,
+            async_delivery=ASYNC_DELIVERY,
+            prediction_mode=PREDICTION_MODE,
+            num_posts=NUM_POSTS,
+            images_per_prompt=IMAGES_PER_PROMPT,
+            deadline_seconds=DEADLINE_SECONDS,
+            max_cost=MAX_COST,
+            speculative_images=SPECULATIVE_IMAGES,
+            speculation_policy=SPECULATION_POLICY,
+            render_reel_video=RENDER_REEL
         )
 
         print("\n" + "="*60)
@@ -70,10 +94,14 @@ if __name__ == "__main__":
         print(f"📝 Posts: {len(result['posts'])}")
         print(f"🎨 Images: {len(result['images']['image_urls'])}")
         print(f"🎬 Reel Script: {'✓' if result.get('reel_script') else '✗'}")
+        if result.get('reel_video'):
+            print(f"🎞️  Reel Video: {result['reel_video']}")
         
         if result.get('zapier_status'):
             status = result['zapier_status'].get('status', 'Unknown')
             print(f"📤 Zapier: {status}")
+            if status == "queued":
+                print("   Deliveries are queued - run `python delivery_queue.py` to deliver them")
         
         print("\n💾 Full result saved to JSON file")
         print("="*60 + "\n")
@@ -0,0 +1,391 @@
+import argparse
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from config import OFFPEAK_HOURS
+
+# ------------------------------------------------------------
+# SCHEDULE-AHEAD PRE-GENERATION + PUBLISH-TIME DELIVERY
+# ------------------------------------------------------------
+# Campaigns are scheduled with a publish time. The scheduler generates
+# them ahead of time (push_to_zap=False), preferring off-peak hours, and
+# stores the output. At the publish time a publisher thread, separate from
+# generation, only has to make the Zapier call.
+#
+#   pending -> generating -> generated -> publishing -> published
+#                  \            ^              |
+#                   -> failed   +-- (retry) ---+-> failed
+#
+# Replicate output URLs expire about an hour after generation, so images
+# are re-hosted on ImgBB right after pre-generation and checked again
+# before publishing. A post whose images are gone is generated again.
+
+SCHEDULE_DB_PATH = "schedule.db"
+MAX_PUBLISH_ATTEMPTS = 3     # Zapier calls per post before it is marked failed
+PUBLISH_RETRY_SECONDS = 60   # Backoff between attempts (multiplied by the attempt number)
+
+
+def parse_offpeak_hours(spec):
+    """Parse "1-6" (or "22-5", wrapping midnight) into a set of hours."""
+    start, end = (int(part) % 24 for part in spec.split("-"))
+    hours = set()
+    hour = start
+    while hour != end:
+        hours.add(hour)
+        hour = (hour + 1) % 24
+    return hours
+
+
+class ScheduleStore:
+    """SQLite store of scheduled campaigns and their pre-generated output."""
+
+    def __init__(self, db_path=SCHEDULE_DB_PATH):
+        self.db_path = db_path
+        self._init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @contextmanager
+    def _db(self):
+        conn = self._connect()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _init_db(self):
+        with self._db() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS scheduled_posts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    topic TEXT NOT NULL,
+                    settings TEXT NOT NULL,
+                    publish_at REAL NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    output TEXT,
+                    zapier_status TEXT,
+                    last_error TEXT,
+                    generated_at TEXT,
+                    published_at TEXT,
+                    created_at TEXT NOT NULL,
+                    publish_attempts INTEGER NOT NULL DEFAULT 0,
+                    retry_at REAL
+                )
+            """)
+            # Columns added after the first release
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(scheduled_posts)")}
+            for name, definition in (
+                ("publish_attempts", "INTEGER NOT NULL DEFAULT 0"),
+                ("retry_at", "REAL"),
+            ):
+                if name not in columns:
+                    conn.execute(f"ALTER TABLE scheduled_posts ADD COLUMN {name} {definition}")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_scheduled_status "
+                "ON scheduled_posts (status, publish_at)"
+            )
+
+    def schedule(self, topic, publish_at, settings=None):
+        """Schedule a campaign and return its id.
+
+        Args:
+            topic (str): Campaign topic
+            publish_at (datetime): When the post should go out
+            settings (dict): Keyword arguments for agent.run (push_to_zap is ignored)
+        """
+        with self._db() as conn:
+            cur = conn.execute(
+                "INSERT INTO scheduled_posts (topic, settings, publish_at, created_at) "
+                "VALUES (?, ?, ?, ?)",
+                (topic, json.dumps(settings or {}), publish_at.timestamp(), datetime.now().isoformat())
+            )
+            return cur.lastrowid
+
+    def get(self, post_id):
+        with self._db() as conn:
+            row = conn.execute("SELECT * FROM scheduled_posts WHERE id = ?", (post_id,)).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def list(self, status=None):
+        with self._db() as conn:
+            if status:
+                rows = conn.execute(
+                    "SELECT * FROM scheduled_posts WHERE status = ? ORDER BY publish_at", (status,)
+                ).fetchall()
+            else:
+                rows = conn.execute("SELECT * FROM scheduled_posts ORDER BY publish_at").fetchall()
+        return [self._row_to_dict(row) for row in rows]
+
+    def next_publish_at(self):
+        """Earliest publish (or retry) time of a generated post (None if there is none)."""
+        with self._db() as conn:
+            row = conn.execute(
+                "SELECT MIN(COALESCE(retry_at, publish_at)) AS t FROM scheduled_posts "
+                "WHERE status = 'generated'"
+            ).fetchone()
+        return row["t"]
+
+    def claim(self, from_status, to_status, before):
+        """Atomically move the earliest post in from_status that is due by `before`.
+
+        A post is due at its retry_at if a publish is being retried, else at publish_at.
+        """
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT * FROM scheduled_posts WHERE status = ? AND COALESCE(retry_at, publish_at) <= ? "
+                "ORDER BY COALESCE(retry_at, publish_at), id LIMIT 1",
+                (from_status, before)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE scheduled_posts SET status = ? WHERE id = ?", (to_status, row["id"])
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return self._row_to_dict(row) if row else None
+
+    def update(self, post_id, **fields):
+        if "output" in fields:
+            fields["output"] = json.dumps(fields["output"], ensure_ascii=False)
+        if "zapier_status" in fields:
+            fields["zapier_status"] = json.dumps(fields["zapier_status"], ensure_ascii=False)
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._db() as conn:
+            conn.execute(
+                f"UPDATE scheduled_posts SET {columns} WHERE id = ?", (*fields.values(), post_id)
+            )
+
+    def recover(self):
+        """Reset posts left mid-step by a crashed scheduler.
+
+        Interrupted generations are retried. Interrupted publishes are marked
+        failed rather than retried, since the webhook may already have fired.
+        """
+        with self._db() as conn:
+            conn.execute("UPDATE scheduled_posts SET status = 'pending' WHERE status = 'generating'")
+            conn.execute(
+                "UPDATE scheduled_posts SET status = 'failed', "
+                "last_error = 'interrupted while publishing' WHERE status = 'publishing'"
+            )
+
+    @staticmethod
+    def _row_to_dict(row):
+        post = dict(row)
+        post["settings"] = json.loads(post["settings"])
+        for field in ("output", "zapier_status"):
+            post[field] = json.loads(post[field]) if post[field] else None
+        for field in ("publish_at", "retry_at"):
+            if post[field] is not None:
+                post[field] = datetime.fromtimestamp(post[field]).isoformat()
+        return post
+
+
+class Scheduler:
+    """Timer loop that pre-generates and publishes scheduled campaigns."""
+
+    def __init__(
+        self,
+        store=None,
+        agent=None,
+        offpeak_hours=OFFPEAK_HOURS,
+        lead_hours=24,
+        min_lead_minutes=30,
+        tick_seconds=30
+    ):
+        """
+        Args:
+            store (ScheduleStore): Schedule storage (default: schedule.db)
+            agent: SocialMediaPipelineAgent (created on first use if not provided)
+            offpeak_hours (str): Hours in which generation runs, e.g. "1-6"
+            lead_hours (float): Generate posts at most this far ahead of their publish time
+            min_lead_minutes (float): Posts closer than this to publishing are generated
+                immediately, even outside off-peak hours
+            tick_seconds (float): Longest sleep between checks
+        """
+        self.store = store or ScheduleStore()
+        self.agent = agent
+        self.offpeak = parse_offpeak_hours(offpeak_hours)
+        self.lead = timedelta(hours=lead_hours).total_seconds()
+        self.min_lead = timedelta(minutes=min_lead_minutes).total_seconds()
+        self.tick_seconds = tick_seconds
+        self._stop_event = threading.Event()
+        self._wake_publisher = threading.Event()
+        self._agent_lock = threading.Lock()
+
+    def _get_agent(self):
+        if self.agent is None:
+            # Worker threads may ask at the same time: build exactly one agent
+            with self._agent_lock:
+                if self.agent is None:
+                    from main import SocialMediaPipelineAgent
+                    self.agent = SocialMediaPipelineAgent()
+        return self.agent
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake_publisher.set()
+
+    def run(self):
+        self.store.recover()
+        print(f"🗓️  Scheduler started (off-peak hours: {sorted(self.offpeak)})")
+        # Publishing runs on its own thread so a long generation never delays a due post
+        publisher = threading.Thread(target=self._publish_loop, name="scheduler-publisher", daemon=True)
+        publisher.start()
+        try:
+            while not self._stop_event.is_set():
+                if not self.generate_next():
+                    self._stop_event.wait(self.tick_seconds)
+        finally:
+            self.stop()
+            publisher.join()
+
+    def _publish_loop(self):
+        while not self._stop_event.is_set():
+            try:
+                while self.publish_due():
+                    pass
+            except Exception as e:
+                print(f"❌ Publisher error: {e}")
+            # Woken early when a newly generated post may be due sooner
+            self._wake_publisher.wait(self._sleep_seconds())
+            self._wake_publisher.clear()
+
+    def _sleep_seconds(self):
+        next_at = self.store.next_publish_at()
+        if next_at is None:
+            return self.tick_seconds
+        return max(0.0, min(self.tick_seconds, next_at - time.time()))
+
+    def publish_due(self):
+        """Publish one post whose time has come. Returns False if none is due."""
+        post = self.store.claim("generated", "publishing", time.time())
+        if post is None:
+            return False
+
+        from tools import unavailable_image_urls
+
+        image_urls = ((post["output"] or {}).get("images") or {}).get("image_urls")
+        expired = unavailable_image_urls(image_urls)
+        if expired:
+            print(f"⚠️  Scheduled post {post['id']} has {len(expired)} expired image(s), generating it again")
+            self.store.update(
+                post["id"], status="pending", output=None, retry_at=None,
+                last_error=f"images expired before publishing: {', '.join(expired)}"
+            )
+            return True
+
+        zap_mode = post["settings"].get("zap_mode", "first")
+        print(f"📤 Publishing scheduled post {post['id']}: {post['topic']}")
+        # Always the idempotent item path (ledger + Idempotency-Key), so a retry
+        # after a timeout Zapier actually accepted does not post twice
+        zapier_status = self._get_agent().publish(post["output"], zap_mode, idempotent=True)
+        status = zapier_status.get("status")
+
+        # Only a 2xx from Zapier counts; "partial", "error" and other codes are retried
+        if isinstance(status, int) and 200 <= status < 300:
+            self.store.update(
+                post["id"], status="published", zapier_status=zapier_status,
+                published_at=datetime.now().isoformat()
+            )
+            return True
+
+        attempts = post["publish_attempts"] + 1
+        error = zapier_status.get("error") or zapier_status.get("response") or f"Zapier status {status}"
+        if attempts < MAX_PUBLISH_ATTEMPTS:
+            delay = PUBLISH_RETRY_SECONDS * attempts
+            print(f"⚠️  Publishing post {post['id']} failed ({status}), retrying in {delay}s")
+            self.store.update(
+                post["id"], status="generated", zapier_status=zapier_status, last_error=error,
+                publish_attempts=attempts, retry_at=time.time() + delay
+            )
+        else:
+            print(f"❌ Publishing post {post['id']} failed after {attempts} attempts ({status})")
+            self.store.update(
+                post["id"], status="failed", zapier_status=zapier_status, last_error=error,
+                publish_attempts=attempts
+            )
+        return True
+
+    def generate_next(self):
+        """Pre-generate the next post if allowed now. Returns False if nothing was done."""
+        now = time.time()
+        post = self.store.claim("pending", "generating", now + self.min_lead)
+        if post is None and datetime.now().hour in self.offpeak:
+            post = self.store.claim("pending", "generating", now + self.lead)
+        if post is None:
+            return False
+
+        settings = dict(post["settings"])
+        settings.pop("push_to_zap", None)
+        settings.pop("async_delivery", None)
+        print(f"🛠️  Pre-generating scheduled post {post['id']} (publishes {post['publish_at']})")
+        try:
+            from tools import rehost_images
+
+            output = self._get_agent().run(post["topic"], push_to_zap=False, **settings)
+            if output.get("images"):
+                rehost_images(output["images"])
+            self.store.update(
+                post["id"], status="generated", output=output,
+                generated_at=datetime.now().isoformat()
+            )
+        except Exception as e:
+            print(f"❌ Pre-generation failed for post {post['id']}: {e}")
+            self.store.update(post["id"], status="failed", last_error=str(e))
+        self._wake_publisher.set()
+        return True
+
+
+# ------------------------------------------------------------
+# COMMAND LINE
+# ------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Schedule campaigns ahead of time")
+    parser.add_argument("--db", default=SCHEDULE_DB_PATH)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add = commands.add_parser("add", help="Schedule a campaign")
+    add.add_argument("topic")
+    add.add_argument("publish_at", help="Publish time, e.g. 2025-03-01T09:00")
+    add.add_argument("--settings", default="{}", help="JSON keyword settings for agent.run")
+
+    commands.add_parser("list", help="Show scheduled campaigns")
+
+    run = commands.add_parser("run", help="Run the scheduler loop")
+    run.add_argument("--offpeak", default=OFFPEAK_HOURS, help='Generation hours, e.g. "1-6"')
+    run.add_argument("--lead-hours", type=float, default=24)
+
+    args = parser.parse_args()
+    store = ScheduleStore(args.db)
+
+    if args.command == "add":
+        publish_at = datetime.fromisoformat(args.publish_at)
+        post_id = store.schedule(args.topic, publish_at, json.loads(args.settings))
+        print(f"✓ Scheduled post {post_id} for {publish_at.isoformat()}")
+    elif args.command == "list":
+        for post in store.list():
+            print(f"{post['id']:>4}  {post['publish_at']}  {post['status']:<10}  {post['topic']}")
+    else:
+        scheduler = Scheduler(store, offpeak_hours=args.offpeak, lead_hours=args.lead_hours)
+        try:
+            scheduler.run()
+        except KeyboardInterrupt:
+            print("\n⏹️  Scheduler stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import numpy as np
+from PIL import Image
+
+# ------------------------------------------------------------
+# LOCAL IMAGE SCREENING (BEFORE BRANDING / UPLOAD)
+# ------------------------------------------------------------
+# Cheap NumPy heuristics run on a small grayscale thumbnail of every
+# generated image:
+#   - blank / low-variance frames (flat colour, failed generations)
+#   - edge density: featureless near-uniform frames (a product on a plain
+#     background has few edges too, but its contrast keeps the grayscale std
+#     well above FEATURELESS_STD)
+#   - roughness: mean neighbour difference relative to the grayscale std.
+#     Neighbouring pixels of a photo are strongly correlated (well below 1);
+#     in pure noise they are independent (about 1.1). Unlike edge density,
+#     the ratio survives the thumbnail downscale, which averages noise away
+#     to a low-contrast frame with few strong edges.
+#   - text leaks: flux sometimes draws signs and labels despite the prompt.
+#     Text shows up as rows of small tiles dense in BOTH horizontal and
+#     vertical edges, which product surfaces rarely are.
+#   - near-duplicates of images already accepted in the campaign
+#     (64-bit difference hash, Hamming distance)
+# The thresholds are tuned for flux product photography; adjust them here.
+
+THUMBNAIL_SIZE = 256        # Longest side of the analysed thumbnail
+HASH_SIZE = 8               # dHash grid -> 64-bit hash
+
+BLANK_STD = 8.0             # Grayscale std below this = blank / low-variance frame
+EDGE_THRESHOLD = 40         # Gradient magnitude counted as an edge (0-255 scale)
+MIN_EDGE_DENSITY = 0.003    # Fewer edge pixels than this ...
+FEATURELESS_STD = 20.0      # ... in a frame with a grayscale std below this = featureless
+MAX_ROUGHNESS = 0.95        # Mean neighbour difference / std above this = noise
+
+TEXT_TILE = 16              # Tile size (thumbnail pixels) for the text heuristic
+TEXT_TILE_DENSITY = 0.12    # Min fraction of horizontal AND vertical edges in a text tile
+TEXT_SCORE_LIMIT = 0.03     # Max fraction of tiles in horizontal runs of text-like tiles
+
+DUPLICATE_DISTANCE = 6      # dHash bits that may differ for a near-duplicate
+
+
+def load_gray(source, size=THUMBNAIL_SIZE):
+    """Decode source (path or file object) into a small float32 grayscale array."""
+    with Image.open(source) as img:
+        img.draft("L", (size, size))
+        gray = img.convert("L")
+        gray.thumbnail((size, size))
+        return np.asarray(gray, dtype=np.float32)
+
+
+def difference_hash(gray, hash_size=HASH_SIZE):
+    """64-bit difference hash (dHash) of a grayscale array."""
+    small = Image.fromarray(gray.astype(np.uint8)).resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def image_hash(source):
+    """dHash of an image file or file object."""
+    return difference_hash(load_gray(source))
+
+
+def hamming_distances(value, hashes):
+    """Hamming distance from one 64-bit hash to each hash in a list (vectorized)."""
+    if not len(hashes):
+        return np.zeros(0, dtype=np.int64)
+    xor = np.bitwise_xor(np.asarray(hashes, dtype=np.uint64), np.uint64(value))
+    return np.unpackbits(xor.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+def _edge_maps(gray):
+    gx = np.abs(np.diff(gray, axis=1))[:-1, :] > EDGE_THRESHOLD
+    gy = np.abs(np.diff(gray, axis=0))[:, :-1] > EDGE_THRESHOLD
+    return gx, gy
+
+
+def roughness(gray):
+    """Mean absolute neighbour difference relative to the grayscale std."""
+    std = float(gray.std())
+    if std == 0:
+        return 0.0
+    dx = float(np.abs(np.diff(gray, axis=1)).mean())
+    dy = float(np.abs(np.diff(gray, axis=0)).mean())
+    return (dx + dy) / 2 / std
+
+
+def _tile_means(mask, tile=TEXT_TILE):
+    rows, cols = mask.shape[0] // tile, mask.shape[1] // tile
+    if not rows or not cols:
+        return np.zeros((0, 0))
+    cropped = mask[:rows * tile, :cols * tile]
+    return cropped.reshape(rows, tile, cols, tile).mean(axis=(1, 3))
+
+
+def text_score(gx, gy):
+    """Fraction of tiles that sit in a horizontal run of text-like tiles."""
+    texty = (_tile_means(gx) > TEXT_TILE_DENSITY) & (_tile_means(gy) > TEXT_TILE_DENSITY)
+    if texty.size == 0:
+        return 0.0
+    runs = texty[:, 1:] & texty[:, :-1]
+    in_run = np.zeros_like(texty)
+    in_run[:, 1:] |= runs
+    in_run[:, :-1] |= runs
+    return float(in_run.mean())
+
+
+def screen_image(source, known_hashes=()):
+    """Screen one image.
+
+    Args:
+        source: Path or file object with the image bytes
+        known_hashes: dHashes of images already accepted in this campaign
+
+    Returns:
+        dict: {"ok", "reasons", "hash", "std", "edge_density", "roughness", "text_score"}
+    """
+    gray = load_gray(source)
+    gx, gy = _edge_maps(gray)
+
+    std = float(gray.std())
+    density = float((gx | gy).mean())
+    rough = roughness(gray)
+    score = text_score(gx, gy)
+    image_hash = difference_hash(gray)
+
+    reasons = []
+    if std < BLANK_STD:
+        reasons.append(f"blank or low-variance frame (std {std:.1f})")
+    elif rough > MAX_ROUGHNESS:
+        reasons.append(f"noisy (roughness {rough:.2f})")
+    elif density < MIN_EDGE_DENSITY and std < FEATURELESS_STD:
+        reasons.append(f"featureless (edge density {density:.3f})")
+    if score > TEXT_SCORE_LIMIT:
+        reasons.append(f"possible text in image (text score {score:.3f})")
+
+    distances = hamming_distances(image_hash, list(known_hashes))
+    if distances.size and distances.min() <= DUPLICATE_DISTANCE:
+        reasons.append(f"near-duplicate of an earlier image ({int(distances.min())} bits apart)")
+
+    return {
+        "ok": not reasons,
+        "reasons": reasons,
+        "hash": image_hash,
+        "std": round(std, 2),
+        "edge_density": round(density, 4),
+        "roughness": round(rough, 3),
+        "text_score": round(score, 4),
+    }
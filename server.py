@@ -0,0 +1,275 @@
+import argparse
+import hashlib
+import inspect
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ------------------------------------------------------------
+# HTTP CAMPAIGN SERVICE
+# ------------------------------------------------------------
+# A small JSON API in front of SocialMediaPipelineAgent:
+#
+#   POST /campaigns        {"topic": "...", "settings": {...}, "wait": false, "timeout": 300}
+#                          -> 202 {"job_id", "status", "coalesced"}
+#                          -> 200 {... "result"} when wait=true and it finished in time
+#                          -> 429 when the server is at capacity
+#   GET  /campaigns/<id>   -> job status and result
+#   GET  /health           -> capacity and job counts
+#
+# Identical requests (same topic and settings) that arrive while a run is
+# in flight join that run instead of starting another one (single-flight).
+
+DEFAULT_MAX_RUNNING = 2      # Pipelines executing at once
+DEFAULT_MAX_QUEUED = 8       # Accepted jobs waiting for a free slot
+DEFAULT_RESULT_TTL = 3600    # Seconds finished jobs stay available
+MAX_WAIT_TIMEOUT = 3600      # Longest "timeout" a POST may wait for its result
+
+# agent.run settings HTTP clients may not set (local files would be published)
+BLOCKED_SETTINGS = {"custom_image_path"}
+
+
+class ServiceBusy(Exception):
+    """Raised when no more jobs can be admitted."""
+
+
+def campaign_key(topic, settings):
+    """Single-flight key: identical topic + settings give the same key."""
+    canonical = json.dumps(
+        {"topic": " ".join(topic.split()).lower(), "settings": settings},
+        sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class CampaignService:
+    """Runs campaigns on a bounded pool with single-flight coalescing."""
+
+    def __init__(
+        self,
+        agent=None,
+        max_running=DEFAULT_MAX_RUNNING,
+        max_queued=DEFAULT_MAX_QUEUED,
+        result_ttl=DEFAULT_RESULT_TTL
+    ):
+        """
+        Args:
+            agent: SocialMediaPipelineAgent (created on first use if not provided)
+            max_running (int): Pipelines executing at once
+            max_queued (int): Jobs accepted beyond max_running before returning 429
+            result_ttl (float): Seconds a finished job is kept for GET /campaigns/<id>
+        """
+        self.agent = agent
+        self.max_running = max_running
+        self.max_queued = max_queued
+        self.result_ttl = result_ttl
+        self.jobs = {}
+        self.in_flight = {}      # campaign key -> job id
+        self._lock = threading.Lock()
+        self._agent_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_running, thread_name_prefix="campaign")
+
+    def _get_agent(self):
+        if self.agent is None:
+            # Worker threads may ask at the same time: build exactly one agent
+            with self._agent_lock:
+                if self.agent is None:
+                    from main import SocialMediaPipelineAgent
+                    self.agent = SocialMediaPipelineAgent()
+        return self.agent
+
+    def validate_settings(self, settings):
+        """Raise ValueError for settings agent.run does not accept or HTTP clients may not set."""
+        accepted = set(inspect.signature(self._get_agent().run).parameters) - {"topic"} - BLOCKED_SETTINGS
+        unknown = sorted(set(settings) - accepted)
+        if unknown:
+            raise ValueError(f"Unknown settings: {', '.join(unknown)}")
+
+    def submit(self, topic, settings=None):
+        """Start a campaign or join an identical one in flight.
+
+        Returns:
+            tuple: (job dict, coalesced bool)
+        """
+        settings = settings or {}
+        if not topic or not topic.strip():
+            raise ValueError("Topic cannot be empty")
+        self.validate_settings(settings)
+
+        key = campaign_key(topic, settings)
+        with self._lock:
+            self._expire_finished()
+
+            job_id = self.in_flight.get(key)
+            if job_id is not None:
+                job = self.jobs[job_id]
+                job["subscribers"] += 1
+                return job, True
+
+            active = sum(1 for job in self.jobs.values() if job["status"] in ("queued", "running"))
+            if active >= self.max_running + self.max_queued:
+                raise ServiceBusy(f"{active} campaigns in progress")
+
+            job = {
+                "job_id": uuid.uuid4().hex,
+                "key": key,
+                "topic": topic,
+                "settings": settings,
+                "status": "queued",
+                "subscribers": 1,
+                "result": None,
+                "error": None,
+                "created_at": datetime.now().isoformat(),
+                "finished_at": None,
+                "done": threading.Event(),
+            }
+            self.jobs[job["job_id"]] = job
+            self.in_flight[key] = job["job_id"]
+
+        self._executor.submit(self._run, job)
+        return job, False
+
+    def _run(self, job):
+        job["status"] = "running"
+        try:
+            job["result"] = self._get_agent().run(job["topic"], **job["settings"])
+            job["status"] = "done"
+        except Exception as e:
+            print(f"❌ Campaign {job['job_id']} failed: {e}")
+            job["error"] = str(e)
+            job["status"] = "failed"
+        finally:
+            job["finished_at"] = time.time()
+            with self._lock:
+                self.in_flight.pop(job["key"], None)
+            job["done"].set()
+
+    def _expire_finished(self):
+        cutoff = time.time() - self.result_ttl
+        expired = [
+            job_id for job_id, job in self.jobs.items()
+            if job["finished_at"] is not None and job["finished_at"] < cutoff
+        ]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def stats(self):
+        with self._lock:
+            counts = {}
+            for job in self.jobs.values():
+                counts[job["status"]] = counts.get(job["status"], 0) + 1
+        return {
+            "max_running": self.max_running,
+            "max_queued": self.max_queued,
+            "jobs": counts,
+        }
+
+    @staticmethod
+    def describe(job, coalesced=None):
+        """Public view of a job."""
+        view = {
+            "job_id": job["job_id"],
+            "topic": job["topic"],
+            "status": job["status"],
+            "subscribers": job["subscribers"],
+            "created_at": job["created_at"],
+        }
+        if coalesced is not None:
+            view["coalesced"] = coalesced
+        if job["status"] == "done":
+            view["result"] = job["result"]
+        if job["status"] == "failed":
+            view["error"] = job["error"]
+        return view
+
+
+# ------------------------------------------------------------
+# HTTP LAYER
+# ------------------------------------------------------------
+def make_handler(service):
+    class _Handler(BaseHTTPRequestHandler):
+        def _send(self, status, body, headers=None):
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send(200, service.stats())
+            elif self.path.startswith("/campaigns/"):
+                job = service.get(self.path[len("/campaigns/"):])
+                if job is None:
+                    self._send(404, {"error": "job not found"})
+                else:
+                    self._send(200, service.describe(job))
+            else:
+                self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path != "/campaigns":
+                self._send(404, {"error": "not found"})
+                return
+
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                body = json.loads(self.rfile.read(length) or b"{}")
+                settings = body.get("settings") or {}
+                if not isinstance(settings, dict):
+                    raise ValueError("settings must be an object")
+                timeout = float(body.get("timeout", 300))
+                if not 0 <= timeout <= MAX_WAIT_TIMEOUT:
+                    raise ValueError(f"timeout must be between 0 and {MAX_WAIT_TIMEOUT} seconds")
+                job, coalesced = service.submit(body.get("topic", ""), settings)
+            except ServiceBusy as e:
+                self._send(429, {"error": f"server at capacity: {e}"}, {"Retry-After": "30"})
+                return
+            except (ValueError, TypeError, AttributeError) as e:
+                self._send(400, {"error": str(e)})
+                return
+
+            if body.get("wait"):
+                job["done"].wait(timeout)
+            status = 200 if job["status"] in ("done", "failed") else 202
+            self._send(status, service.describe(job, coalesced))
+
+        def log_message(self, format, *args):
+            pass
+
+    return _Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP API for the social media pipeline")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--max-running", type=int, default=DEFAULT_MAX_RUNNING)
+    parser.add_argument("--max-queued", type=int, default=DEFAULT_MAX_QUEUED)
+    args = parser.parse_args()
+
+    service = CampaignService(max_running=args.max_running, max_queued=args.max_queued)
+    service._get_agent().preload_brands()
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    print(f"🌐 Campaign API listening on http://{args.host}:{args.port} "
+          f"({args.max_running} running, {args.max_queued} queued max)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n⏹️  Server stopped")
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
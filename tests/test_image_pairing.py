@@ -0,0 +1,52 @@
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("replicate")
+
+from tools import primary_image_index, build_zapier_items
+
+
+POSTS = [
+    {"title": "A", "caption": "a", "hashtags": "#a"},
+    {"title": "B", "caption": "b", "hashtags": "#b"},
+    {"title": "C", "caption": "c", "hashtags": "#c"},
+]
+
+
+def _image_urls(payload):
+    return [item["image_url"] for item in build_zapier_items(payload)]
+
+
+def test_dropped_middle_image_leaves_only_its_post_without_image():
+    images = {
+        "image_urls": ["https://img/a.jpg", "https://img/c.jpg"],
+        "variants": [["https://img/a.jpg"], [], ["https://img/c.jpg"]],
+        "post_positions": [0, 1, 2],
+    }
+    payload = {"topic": "t", "posts": POSTS, "images": images}
+    assert _image_urls(payload) == ["https://img/a.jpg", None, "https://img/c.jpg"]
+
+
+def test_single_surviving_ai_image_is_not_shared():
+    images = {
+        "image_urls": ["https://img/b.jpg"],
+        "variants": [[], ["https://img/b.jpg"], []],
+    }
+    assert [primary_image_index(images, position) for position in range(3)] == [None, 0, None]
+
+
+def test_untitled_post_does_not_shift_pairing():
+    posts = [POSTS[0], {"title": "", "caption": "x"}, POSTS[2]]
+    images = {
+        "image_urls": ["https://img/a.jpg", "https://img/c.jpg"],
+        "variants": [["https://img/a.jpg"], ["https://img/c.jpg"]],
+        "post_positions": [0, 2],
+    }
+    payload = {"topic": "t", "posts": posts, "images": images}
+    assert _image_urls(payload) == ["https://img/a.jpg", None, "https://img/c.jpg"]
+
+
+def test_custom_image_is_shared_by_all_posts():
+    images = {"image_urls": ["https://img/custom.jpg"], "shared": True}
+    payload = {"topic": "t", "posts": POSTS, "images": images}
+    assert _image_urls(payload) == ["https://img/custom.jpg"] * 3
@@ -0,0 +1,42 @@
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw, ImageFilter
+
+from screening import screen_image
+
+
+def _encode(pixels, fmt="PNG"):
+    buffer = BytesIO()
+    Image.fromarray(pixels).save(buffer, fmt)
+    buffer.seek(0)
+    return buffer
+
+
+@pytest.mark.parametrize("size", [512, 1024, 1440])
+@pytest.mark.parametrize("fmt", ["PNG", "JPEG"])
+def test_noise_frame_is_rejected_at_generation_resolution(size, fmt):
+    rng = np.random.default_rng(size)
+    noise = rng.integers(0, 256, (size, size, 3), dtype=np.uint8)
+    result = screen_image(_encode(noise, fmt))
+    assert not result["ok"]
+
+
+def test_grayscale_noise_frame_is_reported_as_noisy():
+    rng = np.random.default_rng(0)
+    noise = np.repeat(rng.integers(0, 256, (1024, 1024, 1), dtype=np.uint8), 3, axis=2)
+    result = screen_image(_encode(noise))
+    assert any(reason.startswith("noisy") for reason in result["reasons"])
+
+
+def test_product_shot_passes():
+    rng = np.random.default_rng(1)
+    img = Image.new("RGB", (1024, 1024), (200, 190, 180))
+    draw = ImageDraw.Draw(img)
+    for _ in range(30):
+        x, y = (int(v) for v in rng.integers(0, 900, 2))
+        w, h = (int(v) for v in rng.integers(30, 200, 2))
+        draw.ellipse([x, y, x + w, y + h], fill=tuple(int(v) for v in rng.integers(0, 255, 3)))
+    result = screen_image(_encode(np.asarray(img.filter(ImageFilter.GaussianBlur(1)))))
+    assert result["ok"], result["reasons"]
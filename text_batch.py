@@ -0,0 +1,325 @@
+import argparse
+import json
+
+from config import OPENAI_MODEL_ROUTES, OPENAI_TIMEOUT
+from tools import (
+    client,
+    model_router,
+    generate_posts,
+    generate_reels_script,
+    validate_posts,
+    validate_reel_script
+)
+from prompts import PROMPTS, posts_max_tokens, numbered_topics
+
+# ------------------------------------------------------------
+# SHARED-PREFIX TOPIC BATCHING FOR TEXT GENERATION
+# ------------------------------------------------------------
+# Bulk jobs generate posts and reel scripts for many topics. Instead of
+# one request per topic (each repeating the same instruction block), topics
+# are packed into one JSON-mode request per batch_size topics and the
+# answer is split per topic id. Every topic is validated on its own; a
+# topic that is missing or invalid is retried alone with the normal
+# single-topic call.
+#
+# Packed requests are never hedged (a duplicate of a multi-topic request
+# would double its cost), their timeout grows with the number of topics,
+# and their latencies are tracked apart from single-topic calls.
+#
+# For overnight jobs the same requests can go through the OpenAI Batch API
+# instead (write_batch_file -> submit_batch -> collect_batch).
+#
+# All functions return the same shape:
+#   {"posts": {topic: {"posts": [...]}},
+#    "reel_scripts": {topic: {"reel_script": {...}}},
+#    "errors": {"posts:<topic>" | "reel_script:<topic>": "error message"}}
+
+DEFAULT_BATCH_SIZE = 5
+MAX_BATCH_TIMEOUT = 600      # Seconds, upper bound for one packed request
+BATCH_ENDPOINT = "/v1/chat/completions"
+
+# kind -> (router function, single-topic call, validator, result key)
+TEXT_KINDS = {
+    "posts": ("posts", generate_posts, validate_posts, "posts"),
+    "reel_script": ("reel_script", generate_reels_script, validate_reel_script, "reel_scripts"),
+}
+
+
+def _empty_results():
+    return {"posts": {}, "reel_scripts": {}, "errors": {}}
+
+
+def _unique_topics(topics):
+    seen = []
+    for topic in topics:
+        topic = topic.strip()
+        if topic and topic not in seen:
+            seen.append(topic)
+    return seen
+
+
+def _validate(kind, result, num_posts):
+    if kind == "posts":
+        validate_posts(result, num_posts)
+    else:
+        validate_reel_script(result)
+
+
+def _retry_alone(kind, topic, num_posts, results, reason):
+    """Generate one topic with the normal single-topic call."""
+    function, single_call, _, result_key = TEXT_KINDS[kind]
+    print(f"   ↪️  Retrying {kind} for '{topic}' alone ({reason})")
+    try:
+        if kind == "posts":
+            results[result_key][topic] = single_call(topic, num_posts=num_posts)
+        else:
+            results[result_key][topic] = single_call(topic)
+    except Exception as e:
+        results["errors"][f"{kind}:{topic}"] = str(e)
+
+
+# ------------------------------------------------------------
+# JSON-MODE PACKING (SYNCHRONOUS)
+# ------------------------------------------------------------
+def _generate_chunk(kind, chunk, num_posts):
+    """One packed request for a chunk of topics -> {topic: result or None}."""
+    if kind == "posts":
+        request = PROMPTS["posts_batch"].build(
+            topics=numbered_topics(chunk),
+            num_posts=num_posts,
+            max_tokens=posts_max_tokens(num_posts) * len(chunk)
+        )
+        single_max_tokens = posts_max_tokens(num_posts)
+    else:
+        request = PROMPTS["reel_script_batch"].build(
+            topics=numbered_topics(chunk),
+            max_tokens=PROMPTS["reel_script"].max_tokens * len(chunk)
+        )
+        single_max_tokens = PROMPTS["reel_script"].max_tokens
+
+    # OPENAI_TIMEOUT covers one topic's worth of output tokens; scale it with the request
+    timeout = min(MAX_BATCH_TIMEOUT, OPENAI_TIMEOUT * request["max_tokens"] / single_max_tokens)
+
+    resp = model_router.complete(
+        TEXT_KINDS[kind][0],
+        purpose=f"{kind}_batch",
+        hedge=False,
+        messages=request["messages"],
+        max_tokens=request["max_tokens"],
+        response_format={"type": "json_object"},
+        timeout=timeout
+    )
+    content = resp.choices[0].message.content.strip()
+    if not content:
+        raise ValueError("Empty response from OpenAI")
+
+    entries = json.loads(content).get("results") or []
+    by_id = {str(entry.get("id")): entry for entry in entries if isinstance(entry, dict)}
+
+    answers = {}
+    for i, topic in enumerate(chunk, 1):
+        entry = by_id.get(str(i))
+        answers[topic] = {kind: entry.get(kind)} if entry else None
+    return answers
+
+
+def generate_text_batch(topics, num_posts=3, batch_size=DEFAULT_BATCH_SIZE, include_reel_scripts=True):
+    """Generate posts (and reel scripts) for many topics with packed requests.
+
+    Args:
+        topics (list): Topics to generate for (duplicates are generated once)
+        num_posts (int): Posts per topic
+        batch_size (int): Topics packed into one request
+        include_reel_scripts (bool): Also generate one reel script per topic
+
+    Returns:
+        dict: {"posts", "reel_scripts", "errors"} keyed by topic
+    """
+    topics = _unique_topics(topics)
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1")
+
+    kinds = ["posts", "reel_script"] if include_reel_scripts else ["posts"]
+    results = _empty_results()
+
+    for kind in kinds:
+        result_key = TEXT_KINDS[kind][3]
+        for start in range(0, len(topics), batch_size):
+            chunk = topics[start:start + batch_size]
+            print(f"📦 Generating {kind} for {len(chunk)} topics in one request...")
+            try:
+                answers = _generate_chunk(kind, chunk, num_posts)
+            except Exception as e:
+                print(f"   ⚠️  Batched {kind} request failed: {e}")
+                answers = {topic: None for topic in chunk}
+
+            for topic, answer in answers.items():
+                if answer is None:
+                    _retry_alone(kind, topic, num_posts, results, "missing from batch")
+                    continue
+                try:
+                    _validate(kind, answer, num_posts)
+                    results[result_key][topic] = answer
+                except ValueError as e:
+                    _retry_alone(kind, topic, num_posts, results, e)
+
+    print(f"✓ Text batch done: {len(results['posts'])} topics with posts, {len(results['errors'])} errors")
+    return results
+
+
+# ------------------------------------------------------------
+# OPENAI BATCH API (OVERNIGHT)
+# ------------------------------------------------------------
+def write_batch_file(topics, path="batch_input.jsonl", num_posts=3, include_reel_scripts=True):
+    """Write a Batch API input file with one request per topic and kind.
+
+    Requests use the normal single-topic templates, so every line shares the
+    same static prefix. custom_id is "<kind>-<topic position>".
+
+    Returns:
+        str: path of the written file
+    """
+    topics = _unique_topics(topics)
+    kinds = ["posts", "reel_script"] if include_reel_scripts else ["posts"]
+
+    with open(path, "w", encoding="utf-8") as f:
+        for kind in kinds:
+            model = OPENAI_MODEL_ROUTES[TEXT_KINDS[kind][0]][0]
+            for i, topic in enumerate(topics):
+                if kind == "posts":
+                    request = PROMPTS["posts"].build(
+                        topic=topic, num_posts=num_posts, max_tokens=posts_max_tokens(num_posts)
+                    )
+                else:
+                    request = PROMPTS["reel_script"].build(topic=topic)
+                line = {
+                    "custom_id": f"{kind}-{i}",
+                    "method": "POST",
+                    "url": BATCH_ENDPOINT,
+                    "body": {
+                        "model": model,
+                        "messages": request["messages"],
+                        "max_tokens": request["max_tokens"],
+                        "response_format": {"type": "json_object"},
+                    },
+                }
+                f.write(json.dumps(line, ensure_ascii=False) + "\n")
+
+    print(f"✓ Wrote {len(topics) * len(kinds)} batch requests to {path}")
+    return path
+
+
+def submit_batch(path):
+    """Upload a batch input file and start the batch. Returns the batch id."""
+    with open(path, "rb") as f:
+        batch_file = client.files.create(file=f, purpose="batch")
+    batch = client.batches.create(
+        input_file_id=batch_file.id,
+        endpoint=BATCH_ENDPOINT,
+        completion_window="24h"
+    )
+    print(f"✓ Submitted batch {batch.id} ({path})")
+    return batch.id
+
+
+def collect_batch(batch_id, topics, num_posts=3, include_reel_scripts=True):
+    """Collect a finished batch; failed or missing topics are retried alone.
+
+    Args:
+        batch_id (str): Id returned by submit_batch
+        topics (list): The same topics passed to write_batch_file
+
+    Returns:
+        dict: {"posts", "reel_scripts", "errors"}, or None if the batch is still running
+    """
+    topics = _unique_topics(topics)
+    batch = client.batches.retrieve(batch_id)
+    if batch.status in ("validating", "in_progress", "finalizing"):
+        print(f"⏳ Batch {batch_id} is {batch.status}")
+        return None
+
+    answers = {}
+    if batch.output_file_id:
+        for line in client.files.content(batch.output_file_id).text.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            response = record.get("response") or {}
+            if response.get("status_code") != 200:
+                continue
+            try:
+                content = response["body"]["choices"][0]["message"]["content"]
+                answers[record["custom_id"]] = json.loads(content)
+            except (KeyError, IndexError, TypeError, json.JSONDecodeError):
+                continue
+
+    kinds = ["posts", "reel_script"] if include_reel_scripts else ["posts"]
+    results = _empty_results()
+    for kind in kinds:
+        result_key = TEXT_KINDS[kind][3]
+        for i, topic in enumerate(topics):
+            answer = answers.get(f"{kind}-{i}")
+            if answer is None:
+                _retry_alone(kind, topic, num_posts, results, f"batch {batch.status}, no result")
+                continue
+            try:
+                _validate(kind, answer, num_posts)
+                results[result_key][topic] = answer
+            except ValueError as e:
+                _retry_alone(kind, topic, num_posts, results, e)
+
+    print(f"✓ Collected batch {batch_id}: {len(results['posts'])} topics with posts, {len(results['errors'])} errors")
+    return results
+
+
+# ------------------------------------------------------------
+# COMMAND LINE
+# ------------------------------------------------------------
+def _read_topics(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batched text generation for many topics")
+    parser.add_argument("--num-posts", type=int, default=3)
+    parser.add_argument("--no-reels", action="store_true", help="Skip reel scripts")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Generate now with packed JSON requests")
+    run.add_argument("topics_file", help="Text file with one topic per line")
+    run.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    run.add_argument("--out", default="text_batch.json")
+
+    submit = commands.add_parser("submit", help="Submit an overnight Batch API job")
+    submit.add_argument("topics_file")
+    submit.add_argument("--input", default="batch_input.jsonl")
+
+    collect = commands.add_parser("collect", help="Collect a finished Batch API job")
+    collect.add_argument("batch_id")
+    collect.add_argument("topics_file")
+    collect.add_argument("--out", default="text_batch.json")
+
+    args = parser.parse_args()
+    topics = _read_topics(args.topics_file)
+    include_reels = not args.no_reels
+
+    if args.command == "submit":
+        write_batch_file(topics, args.input, args.num_posts, include_reels)
+        submit_batch(args.input)
+        return
+
+    if args.command == "run":
+        results = generate_text_batch(topics, args.num_posts, args.batch_size, include_reels)
+    else:
+        results = collect_batch(args.batch_id, topics, args.num_posts, include_reels)
+        if results is None:
+            return
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"💾 Saved to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,15 @@
 import json
 import time
+import random
+import hashlib
+import uuid
+import threading
 import requests
 import os
-import textwrap
-import platform
 from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageOps
 from openai import OpenAI
 import replicate
 
@@ -17,65 +20,151 @@ from config import (
     OPENAI_API_KEY,
     REPLICATE_API_TOKEN,
     ZAPIER_WEBHOOK_URL,
-    IMGBB_API_KEY
+    IMGBB_API_KEY,
+    IMGBB_EXPIRATION,
+    IMAGE_TARGET,
+    IMAGE_FORMAT,
+    IMAGE_QUALITY,
+    IMAGE_MAX_KB,
+    REPLICATE_WEBHOOK_URL,
+    REPLICATE_WEBHOOK_PORT,
+    REPLICATE_WEBHOOK_SECRET,
+    MAX_DOWNLOAD_MB,
+    IMAGES_DIR_MAX_MB,
+    IMAGES_MAX_AGE_HOURS,
+    OPENAI_TIMEOUT,
+    OPENAI_MODEL_ROUTES,
+    OPENAI_HEDGE_PERCENTILE,
+    SCREEN_IMAGES,
+    SCREEN_MAX_RETRIES,
+    IMAGE_INDEX,
+    IMAGE_REUSE,
+    IMAGE_REUSE_SIMILARITY,
+    IMAGE_REUSE_COOLDOWN_DAYS,
+    EMBEDDING_MODEL
 )
+from predictions import PredictionPoller, WebhookReceiver
+from budget import BudgetExceeded
+from model_router import ModelRouter
+from prompts import PROMPTS, posts_max_tokens, finalize_image_prompt, fallback_image_prompt, image_prompt_body
+from screening import screen_image, image_hash
+from overlay import get_system_font, brand_layer, apply_layer
+from image_index import ImageIndex, IMAGE_LIBRARY_DIR
+from brands import get_brand
 
 # ------------------------------------------------------------
 # INITIALIZE CLIENTS
 # ------------------------------------------------------------
-client = OpenAI(api_key=OPENAI_API_KEY)
+client = OpenAI(api_key=OPENAI_API_KEY, timeout=OPENAI_TIMEOUT)
+model_router = ModelRouter(client, OPENAI_MODEL_ROUTES, hedge_percentile=OPENAI_HEDGE_PERCENTILE)
 replicate_client = replicate.Client(api_token=REPLICATE_API_TOKEN)
 
+_prediction_pollers = {}
+_prediction_pollers_lock = threading.Lock()
+
+
+def get_prediction_poller(webhook=False):
+    """Return the shared prediction poller (one per mode, per process)."""
+    mode = "webhook" if webhook else "poll"
+    with _prediction_pollers_lock:
+        if mode not in _prediction_pollers:
+            receiver = None
+            if webhook:
+                if not REPLICATE_WEBHOOK_URL:
+                    raise ValueError("REPLICATE_WEBHOOK_URL must be set for prediction_mode='webhook'")
+                receiver = WebhookReceiver(
+                    REPLICATE_WEBHOOK_URL, port=REPLICATE_WEBHOOK_PORT, secret=REPLICATE_WEBHOOK_SECRET
+                ).start()
+            _prediction_pollers[mode] = PredictionPoller(replicate_client, receiver=receiver)
+        return _prediction_pollers[mode]
+
+
+# ------------------------------------------------------------
+# TIMEOUTS
+# ------------------------------------------------------------
+HTTP_TIMEOUT = 30            # Default timeout for image downloads, uploads and webhooks
+SMART_PROMPT_RESERVE = 20    # Seconds that must remain to write smart image prompts
+OVERLAY_RESERVE = 15         # Seconds that must remain to brand and upload an image
+PREDICTION_TIMEOUT = 300     # Seconds before a Replicate prediction is canceled (every mode)
+
+
+def _call_timeout(budget, default):
+    """Per-call timeout: the default, capped by the run deadline if there is one."""
+    return budget.timeout(default) if budget is not None else default
+
+
+# ------------------------------------------------------------
+# RESPONSE VALIDATION
+# ------------------------------------------------------------
+def validate_posts(result, num_posts):
+    """Raise ValueError unless result is {"posts": [...]} with num_posts posts."""
+    posts = result.get("posts") if isinstance(result, dict) else None
+    if not isinstance(posts, list) or len(posts) != num_posts:
+        raise ValueError("Invalid response structure from OpenAI")
+    for post in posts:
+        if not isinstance(post, dict) or not post.get("title") or not post.get("caption"):
+            raise ValueError("Invalid post in OpenAI response")
+
+
+def validate_reel_script(result):
+    """Raise ValueError unless result is {"reel_script": {...}}."""
+    if not isinstance(result, dict) or not isinstance(result.get("reel_script"), dict):
+        raise ValueError("Invalid reel script response structure")
+
+
 # ------------------------------------------------------------
 # TEXT POSTS GENERATOR
 # ------------------------------------------------------------
-def generate_posts(topic):
-    """Generate 3 social media posts about a given topic."""
+def generate_posts(topic, num_posts=3, budget=None):
+    """Generate social media posts about a given topic.
+
+    Args:
+        topic: The topic/theme for the posts
+        num_posts: Number of post variants to request in a single completion (default: 3)
+        budget: Optional RunBudget (raises BudgetExceeded if posts can't be afforded)
+    """
     
     if not topic or not topic.strip():
         raise ValueError("Topic cannot be empty")
+    if num_posts < 1:
+        raise ValueError("num_posts must be at least 1")
+    if budget is not None and not budget.can_afford("text"):
+        raise BudgetExceeded("No budget left to generate posts")
 
-    prompt = f"""
-You are a Social Media Creative Agent.
-
-Generate EXACTLY 3 posts about: {topic}
-
-STYLE RULES:
-- Write captions with 2-3 sentences.
-- Professional and motivational.
-- Relevant to the UAE.
-- No repetition across posts.
-- Include EXACTLY 5 high-performing hashtags.
-- Return VALID JSON ONLY.
-
-Return JSON ONLY:
-{{
-  "posts": [
-    {{"title": "", "caption": "", "hashtags": ""}},
-    {{"title": "", "caption": "", "hashtags": ""}},
-    {{"title": "", "caption": "", "hashtags": ""}}
-  ]
-}}
-"""
+    request = PROMPTS["posts"].build(
+        topic=topic, num_posts=num_posts, max_tokens=posts_max_tokens(num_posts)
+    )
 
+    max_tokens = request["max_tokens"]
+    content = ""
     try:
-        resp = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            response_format={"type": "json_object"}
-        )
-        
-        content = resp.choices[0].message.content.strip()
+        for attempt in range(2):
+            resp = model_router.complete(
+                "posts",
+                budget=budget,
+                messages=request["messages"],
+                max_tokens=max_tokens,
+                response_format={"type": "json_object"},
+                timeout=_call_timeout(budget, OPENAI_TIMEOUT)
+            )
+            if budget is not None:
+                budget.charge("text")
+
+            # A JSON answer cut off at max_tokens can't be parsed: retry once with more room
+            if resp.choices[0].finish_reason != "length" or attempt:
+                break
+            if budget is not None and not budget.can_afford("text"):
+                break
+            max_tokens *= 2
+            print(f"⚠️ Posts were cut off, retrying with max_tokens={max_tokens}")
+
+        content = (resp.choices[0].message.content or "").strip()
         
         if not content:
             raise ValueError("Empty response from OpenAI")
         
         result = json.loads(content)
-        
-        # Validate structure
-        if "posts" not in result or len(result["posts"]) != 3:
-            raise ValueError("Invalid response structure from OpenAI")
-        
+        validate_posts(result, num_posts)
         return result
         
     except json.JSONDecodeError as e:
@@ -90,25 +179,34 @@ Return JSON ONLY:
 # ------------------------------------------------------------
 # IMAGE PROMPT GENERATOR - SMART VERSION WITH CUSTOM TEMPLATE
 # ------------------------------------------------------------
-def generate_image_prompts(posts, custom_prompt_template=None):
+def generate_image_prompts(posts, custom_prompt_template=None, budget=None, style=None):
     """Generate contextually relevant image prompts for each post.
     
     Args:
         posts: Dictionary with posts list
         custom_prompt_template: Optional custom prompt template from user
+        budget: Optional RunBudget - when time or money runs low the
+            template fallback prompt is used instead of an AI-written one
+        style: Brand style fragment added to every prompt (BrandProfile.image_style)
+
+    Returns:
+        dict: image_prompts, and post_positions - the position in posts of the
+        post each prompt was written for (untitled posts get no prompt)
     """
     
     if not posts or "posts" not in posts:
-        return {"image_prompts": []}
+        return {"image_prompts": [], "post_positions": []}
 
     prompts = []
+    post_positions = []
 
-    for p in posts["posts"]:
+    for position, p in enumerate(posts["posts"]):
         title = p.get("title", "")
         caption = p.get("caption", "")
         
         if not title:
             continue
+        post_positions.append(position)
 
         # If user provided custom prompt template, use it
         if custom_prompt_template:
@@ -120,100 +218,81 @@ def generate_image_prompts(posts, custom_prompt_template=None):
             custom_prompt = custom_prompt.replace("[CAPTION]", caption[:100])
             
             # Add strong technical specifications to prevent text generation
-            final_prompt = f"""{custom_prompt}
-CRITICAL: Absolutely NO text, NO words, NO letters, NO signs, NO labels, NO typography anywhere in the image.
-Do not generate: store signs, product labels, brand names, written text, numbers, letters, Arabic text, English text, or any readable characters.
-Clean product photography without any visible text or writing.
-Aspect ratio: 16:9."""
+            final_prompt = finalize_image_prompt(custom_prompt, style=style)
             prompts.append(final_prompt)
             
         else:
             # Use AI to generate a contextually relevant prompt
-            ai_prompt = f"""
-Generate a detailed image prompt for AI image generation based on this social media post:
-
-Title: {title}
-Caption: {caption}
-
-Create a professional product photography prompt that:
-1. Shows the actual products/items mentioned or implied in the post
-2. Uses appropriate styling for the industry (beauty/cosmetics/tech/fashion/etc)
-3. Is visually appealing and commercial-quality
-4. Relevant to UAE market
-5. No text in the image
-
-Return ONLY the image generation prompt, nothing else. Be specific about products, lighting, and composition.
-"""
-
             try:
-                resp = client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=[{"role": "user", "content": ai_prompt}],
-                    max_tokens=200
-                )
-                
-                smart_prompt = resp.choices[0].message.content.strip()
-                
-                # Add strong technical specifications to prevent text generation
-                final_prompt = f"""{smart_prompt}
-CRITICAL: Absolutely NO text, NO words, NO letters, NO signs, NO labels, NO typography anywhere in the image.
-Do not generate: store signs, product labels, brand names, written text, numbers, letters, Arabic text, English text, or any readable characters.
-Clean product photography without any visible text or writing.
-Aspect ratio: 16:9. Professional commercial photography."""
-                
-                prompts.append(final_prompt)
-                print(f"✓ Generated smart prompt for: {title[:50]}...")
-                
+                prompts.append(smart_image_prompt(title, caption, budget, style))
             except Exception as e:
                 print(f"⚠️ Error generating smart prompt, using fallback: {e}")
                 # Fallback to basic prompt
-                fallback_prompt = f"""
-Professional commercial photograph.
-Subject: {title}
-Context: {caption[:100]}
-Style: high-quality product photography, studio lighting
-Mood: professional, commercial, aspirational
-CRITICAL: Absolutely NO text, NO words, NO letters, NO signs, NO labels anywhere in the image.
-Clean photography without any visible text or writing.
-Aspect ratio: 16:9.
-                """
-                prompts.append(fallback_prompt.strip())
+                prompts.append(fallback_image_prompt(title, caption, style))
+
+    return {"image_prompts": prompts, "post_positions": post_positions}
+
+
+def smart_image_prompt(title, caption, budget=None, style=None):
+    """Write an AI image prompt for one post. Raises on failure (caller falls back)."""
+    request = PROMPTS["image_prompt"].build(title=title, caption=caption)
+
+    if budget is not None and not (
+        budget.can_afford("smart_prompt") and budget.has_time_for(SMART_PROMPT_RESERVE)
+    ):
+        budget.degrade(f"using template prompt for: {title[:50]}")
+        raise BudgetExceeded("No budget left for a smart prompt")
+
+    resp = model_router.complete(
+        "image_prompt",
+        budget=budget,
+        cost_kind="smart_prompt",
+        messages=request["messages"],
+        max_tokens=request["max_tokens"],
+        timeout=_call_timeout(budget, OPENAI_TIMEOUT)
+    )
+    if budget is not None:
+        budget.charge("smart_prompt")
+
+    smart_prompt = resp.choices[0].message.content.strip()
 
-    return {"image_prompts": prompts}
+    # Add strong technical specifications to prevent text generation
+    final_prompt = finalize_image_prompt(
+        smart_prompt, tail="Aspect ratio: 16:9. Professional commercial photography.", style=style
+    )
+    print(f"✓ Generated smart prompt for: {title[:50]}...")
+    return final_prompt
 
 
 # ------------------------------------------------------------
 # VIDEO REELS SCRIPT GENERATOR
 # ------------------------------------------------------------
-def generate_reels_script(topic):
-    """Generate a TikTok/Reel script about a given topic."""
+def generate_reels_script(topic, budget=None):
+    """Generate a TikTok/Reel script about a given topic.
+
+    Args:
+        topic: The topic/theme for the reel
+        budget: Optional RunBudget (raises BudgetExceeded if the script can't be afforded)
+    """
     
     if not topic or not topic.strip():
         raise ValueError("Topic cannot be empty")
+    if budget is not None and not budget.can_afford("text"):
+        raise BudgetExceeded("No budget left to generate a reel script")
 
-    prompt = f"""
-Create a TikTok/Reel Script about: {topic}
-
-Return JSON ONLY:
-{{
-  "reel_script": {{
-    "hook": "",
-    "scenes": [
-      {{"scene": 1, "description": "", "camera_direction": "", "narration": ""}},
-      {{"scene": 2, "description": "", "camera_direction": "", "narration": ""}},
-      {{"scene": 3, "description": "", "camera_direction": "", "narration": ""}}
-    ],
-    "cta": ""
-  }}
-}}
-"""
+    request = PROMPTS["reel_script"].build(topic=topic)
 
     try:
-        resp = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            response_format={"type": "json_object"}
+        resp = model_router.complete(
+            "reel_script",
+            budget=budget,
+            messages=request["messages"],
+            max_tokens=request["max_tokens"],
+            response_format={"type": "json_object"},
+            timeout=_call_timeout(budget, OPENAI_TIMEOUT)
         )
+        if budget is not None:
+            budget.charge("text")
         
         content = resp.choices[0].message.content.strip()
         
@@ -221,11 +300,7 @@ Return JSON ONLY:
             raise ValueError("Empty response from OpenAI")
         
         result = json.loads(content)
-        
-        # Validate structure
-        if "reel_script" not in result:
-            raise ValueError("Invalid reel script response structure")
-        
+        validate_reel_script(result)
         return result
         
     except json.JSONDecodeError as e:
@@ -238,107 +313,298 @@ Return JSON ONLY:
 
 
 # ------------------------------------------------------------
-# HELPER: GET SYSTEM FONT
+# IMAGE ENCODE STAGE (RESIZE / COMPRESS / STRIP METADATA)
 # ------------------------------------------------------------
-def get_system_font():
-    """Get appropriate font path based on operating system."""
-    system = platform.system()
-    
-    if system == "Windows":
-        return "arial.ttf"
-    elif system == "Darwin":  # macOS
-        return "/System/Library/Fonts/Helvetica.ttc"
-    else:  # Linux
-        return "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+# Instagram displays feed images at 1080px wide, so nothing larger is kept.
+IMAGE_TARGETS = {
+    "original": None,
+    "instagram_square": (1080, 1080),
+    "instagram_portrait": (1080, 1350),
+    "instagram_landscape": (1080, 566),
+}
+MAX_IMAGE_WIDTH = 1080
+MIN_IMAGE_QUALITY = 50
+
+DEFAULT_ENCODE_SETTINGS = {
+    "target": IMAGE_TARGET,
+    "format": IMAGE_FORMAT,
+    "quality": IMAGE_QUALITY,
+    "max_bytes": IMAGE_MAX_KB * 1024,
+}
+
+
+def fit_to_target(img, target="original"):
+    """Crop/resize an image to an Instagram aspect ratio (or cap its width)."""
+    if target not in IMAGE_TARGETS:
+        raise ValueError(f"Unknown image target: {target}")
+
+    size = IMAGE_TARGETS[target]
+    if size:
+        return ImageOps.fit(img, size, method=Image.LANCZOS)
+
+    if img.width > MAX_IMAGE_WIDTH:
+        height = round(img.height * MAX_IMAGE_WIDTH / img.width)
+        return img.resize((MAX_IMAGE_WIDTH, height), Image.LANCZOS)
+    return img
+
+
+def encode_image(img, image_format="JPEG", quality=85, max_bytes=0):
+    """Encode an image without metadata, lowering quality to meet a size budget.
+
+    Args:
+        img: PIL image (RGB)
+        image_format: "JPEG" (progressive, optimized) or "WEBP"
+        quality: Starting quality (1-100)
+        max_bytes: Maximum encoded size in bytes (0 = no budget)
+
+    Returns:
+        tuple: (encoded bytes, quality used)
+    """
+    image_format = image_format.upper()
+    if image_format not in ("JPEG", "WEBP"):
+        raise ValueError(f"Unsupported image format: {image_format}")
+
+    # Drop EXIF/ICC/comments carried over from the source image
+    img.info = {}
+
+    def _encode(q):
+        buffer = BytesIO()
+        if image_format == "JPEG":
+            img.save(buffer, "JPEG", quality=q, optimize=True, progressive=True)
+        else:
+            img.save(buffer, "WEBP", quality=q, method=6)
+        return buffer.getvalue()
+
+    data = _encode(quality)
+    if not max_bytes or len(data) <= max_bytes:
+        return data, quality
+
+    # Binary search for the highest quality that fits the budget
+    low, high, best = MIN_IMAGE_QUALITY, quality - 1, None
+    while low <= high:
+        mid = (low + high) // 2
+        candidate = _encode(mid)
+        if len(candidate) <= max_bytes:
+            best = (candidate, mid)
+            low = mid + 1
+        else:
+            high = mid - 1
+
+    if best is None:
+        print(f"⚠️  Could not meet size budget of {max_bytes // 1024} KB, using quality {MIN_IMAGE_QUALITY}")
+        return _encode(MIN_IMAGE_QUALITY), MIN_IMAGE_QUALITY
+    return best
+
+
+# ------------------------------------------------------------
+# MEMORY-BOUNDED DOWNLOAD / DECODE
+# ------------------------------------------------------------
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+
+def download_image(image_url, timeout=HTTP_TIMEOUT, max_bytes=None):
+    """Stream an image into memory, refusing anything larger than max_bytes.
+
+    Returns:
+        BytesIO: The downloaded bytes, rewound to the start
+    """
+    max_bytes = max_bytes or MAX_DOWNLOAD_MB * 1024 * 1024
+
+    with requests.get(image_url, timeout=timeout, stream=True) as response:
+        response.raise_for_status()
+
+        declared = int(response.headers.get("Content-Length") or 0)
+        if declared > max_bytes:
+            raise ValueError(f"Image too large: {declared / 1024 / 1024:.1f} MB (limit {MAX_DOWNLOAD_MB} MB)")
+
+        buffer = BytesIO()
+        for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+            buffer.write(chunk)
+            if buffer.tell() > max_bytes:
+                buffer.close()
+                raise ValueError(f"Image download exceeded {MAX_DOWNLOAD_MB} MB limit")
+
+    buffer.seek(0)
+    return buffer
+
+
+def open_image(source, target="original"):
+    """Decode an image as RGB, shrinking it during decode if the output is smaller.
+
+    JPEGs use the decoder's draft mode (scaled DCT), other formats are
+    reduced by an integer factor right after decoding.
+    """
+    img = Image.open(source)
+
+    size = IMAGE_TARGETS.get(target)
+    if not size and img.width > MAX_IMAGE_WIDTH:
+        size = (MAX_IMAGE_WIDTH, max(1, round(img.height * MAX_IMAGE_WIDTH / img.width)))
+
+    if size:
+        if img.format == "JPEG":
+            img.draft("RGB", size)
+        else:
+            factor = min(img.width // size[0], img.height // size[1])
+            if factor >= 2:
+                reduced = img.reduce(factor)
+                img.close()
+                img = reduced
+
+    rgb = img.convert("RGB")
+    if rgb is not img:
+        img.close()
+    return rgb
+
+
+# ------------------------------------------------------------
+# IMAGES DIRECTORY EVICTION
+# ------------------------------------------------------------
+# Only files the pipeline generated are evicted (never user uploads), and
+# never while they may still be waiting for a queued ImgBB upload retry.
+# Image library files (images/library/) count towards the size cap and are
+# evicted least recently used first, but never for age alone; their index
+# entries are removed with them.
+EVICTABLE_PREFIXES = ("branded_", "rehosted_")
+EVICTION_MIN_AGE = 3600      # Seconds a generated file is always kept
+EVICTION_INTERVAL = 60       # Seconds between directory scans
+_last_eviction = 0.0
+_eviction_lock = threading.Lock()
+
+
+def evict_images(directory="images", max_bytes=None, max_age=None, force=False, library_dir=IMAGE_LIBRARY_DIR):
+    """Delete old generated images by age, then oldest-first until under max_bytes.
+
+    Returns:
+        list: Paths that were deleted
+    """
+    global _last_eviction
+
+    max_bytes = max_bytes if max_bytes is not None else IMAGES_DIR_MAX_MB * 1024 * 1024
+    max_age = max_age if max_age is not None else IMAGES_MAX_AGE_HOURS * 3600
+
+    with _eviction_lock:
+        now = time.time()
+        if not force and now - _last_eviction < EVICTION_INTERVAL:
+            return []
+        _last_eviction = now
+
+        if not os.path.isdir(directory):
+            return []
+
+        files = []
+        total = 0
+        for entry in os.scandir(directory):
+            if not entry.is_file():
+                continue
+            stat = entry.stat()
+            total += stat.st_size
+            if entry.name.startswith(EVICTABLE_PREFIXES):
+                files.append((stat.st_mtime, stat.st_size, entry.path, False))
+        if library_dir and os.path.isdir(library_dir):
+            for entry in os.scandir(library_dir):
+                if entry.is_file():
+                    stat = entry.stat()
+                    total += stat.st_size
+                    files.append((stat.st_mtime, stat.st_size, entry.path, True))
+
+        files.sort()
+        deleted = []
+        deleted_library = []
+        for mtime, size, path, in_library in files:
+            age = now - mtime
+            if age < EVICTION_MIN_AGE:
+                break
+            too_old = max_age and age > max_age and not in_library
+            if too_old or (max_bytes and total > max_bytes):
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    print(f"⚠️  Could not evict {path}: {e}")
+                    continue
+                total -= size
+                deleted.append(path)
+                if in_library:
+                    deleted_library.append(path)
+
+    if deleted_library:
+        try:
+            get_image_index().remove_paths(deleted_library)
+        except Exception as e:
+            print(f"⚠️  Could not remove evicted images from the index: {e}")
+    if deleted:
+        print(f"🧹 Evicted {len(deleted)} old image(s) from {directory}/")
+    return deleted
 
 
 # ------------------------------------------------------------
 # BRAND TEXT OVERLAY - RETURNS LOCAL FILE PATH
 # ------------------------------------------------------------
-def add_brand_text(image_url, brand_text="Experts Group FZE", website_text="", text_size=80):
+def add_brand_text(
+    image_url,
+    brand_text=None,
+    website_text="",
+    text_size=80,
+    encode_settings=None,
+    timeout=HTTP_TIMEOUT,
+    image_data=None,
+    brand=None
+):
     """Download image and add brand text overlay with optional second line. Returns local file path.
     
     Args:
         image_url: URL of the image to download
-        brand_text: Text to overlay on the image (Line 1)
+        brand_text: Text to overlay on the image (Line 1). None = the text of
+            `brand`, or of the DEFAULT_BRAND profile when no brand is given
         website_text: Website or tagline text (Line 2, optional)
         text_size: Font size for the text (default: 80)
+        encode_settings: Overrides for DEFAULT_ENCODE_SETTINGS
+            (target, format, quality, max_bytes)
+        timeout: Download timeout in seconds
+        image_data: Already downloaded image bytes (BytesIO) - skips the download
+            and is closed after decoding
+        brand: Optional BrandProfile supplying the font, colors and watermark
     """
     
-    try:
-        response = requests.get(image_url, timeout=30)
-        response.raise_for_status()
-        
-        img = Image.open(BytesIO(response.content)).convert("RGB")
-        draw = ImageDraw.Draw(img)
+    settings = dict(DEFAULT_ENCODE_SETTINGS, **(encode_settings or {}))
+    if brand_text is None:
+        brand_text = (brand or get_brand()).brand_text
 
-        # Load fonts with custom size
-        try:
-            main_font = ImageFont.truetype(get_system_font(), text_size)
-            # Website text slightly smaller
-            website_font = ImageFont.truetype(get_system_font(), int(text_size * 0.7))
-        except Exception as e:
-            print(f"⚠️ Could not load system font: {e}. Using default.")
-            main_font = ImageFont.load_default()
-            website_font = ImageFont.load_default()
-
-        width, height = img.size
-
-        # Prepare text lines
-        texts_to_draw = []
-        
-        # Line 1: Brand text
-        if brand_text:
-            wrap_width = int(40 * (80 / text_size))
-            wrapped_brand = textwrap.fill(brand_text, width=wrap_width)
-            texts_to_draw.append((wrapped_brand, main_font))
-        
-        # Line 2: Website text (if provided)
-        if website_text:
-            wrap_width_web = int(50 * (80 / text_size))
-            wrapped_website = textwrap.fill(website_text, width=wrap_width_web)
-            texts_to_draw.append((wrapped_website, website_font))
-        
-        # Calculate total height needed
-        total_height = 0
-        line_spacing = int(text_size * 0.3)  # Space between lines
-        
-        for text, font in texts_to_draw:
-            text_bbox = draw.textbbox((0, 0), text, font=font)
-            text_height = text_bbox[3] - text_bbox[1]
-            total_height += text_height
-            if len(texts_to_draw) > 1:
-                total_height += line_spacing
-        
-        # Starting Y position (from bottom)
-        current_y = height - total_height - 60
-        
-        # Draw each text line
-        shadow_offset = max(3, int(text_size / 25))
-        
-        for text, font in texts_to_draw:
-            text_bbox = draw.textbbox((0, 0), text, font=font)
-            text_width = text_bbox[2] - text_bbox[0]
-            text_height = text_bbox[3] - text_bbox[1]
-            
-            x = (width - text_width) // 2
-            
-            # Draw shadow
-            draw.text((x + shadow_offset, current_y + shadow_offset), text, font=font, fill=(0, 0, 0))
-            # Draw text
-            draw.text((x, current_y), text, font=font, fill=(255, 255, 255))
-            
-            # Move to next line
-            current_y += text_height + line_spacing
+    try:
+        # Stream the download (size-capped) and decode at reduced size when possible
+        buffer = image_data if image_data is not None else download_image(image_url, timeout=timeout)
+        img = open_image(buffer, settings["target"])
+        buffer.close()
+        # Resize before drawing so the overlay keeps its size and is never cropped
+        img = fit_to_target(img, settings["target"])
+        # The overlay layer is built once per brand and image size, then only pasted
+        style = brand.overlay_style() if brand is not None else {}
+        apply_layer(img, brand_layer(img.size, brand_text, website_text, text_size, **style))
 
         # Create images directory if it doesn't exist
         if not os.path.exists("images"):
             os.makedirs("images")
 
-        output_path = f"images/branded_{int(datetime.now().timestamp())}.jpg"
-        img.save(output_path, quality=95)
+        data, quality = encode_image(
+            img,
+            image_format=settings["format"],
+            quality=settings["quality"],
+            max_bytes=settings["max_bytes"]
+        )
+        extension = "webp" if settings["format"].upper() == "WEBP" else "jpg"
+        # Content digest in the name: images finished in the same second never share a file
+        digest = hashlib.sha256(data).hexdigest()[:16]
+        output_path = f"images/branded_{int(datetime.now().timestamp())}_{digest}.{extension}"
+        with open(output_path, "wb") as f:
+            f.write(data)
+
+        print(f"✓ Branded image saved to: {output_path} "
+              f"({img.width}x{img.height}, {len(data) / 1024:.0f} KB, quality {quality})")
+
+        # Release pixel data now instead of waiting for the garbage collector
+        img.close()
+        del img, data
 
-        print(f"✓ Branded image saved to: {output_path}")
+        evict_images()
         return output_path
         
     except Exception as e:
@@ -346,11 +612,68 @@ def add_brand_text(image_url, brand_text="Experts Group FZE", website_text="", t
         raise
 
 
+# ------------------------------------------------------------
+# IMGBB UPLOAD INDEX (CONTENT-HASH DEDUPLICATION)
+# ------------------------------------------------------------
+IMGBB_INDEX_PATH = "imgbb_index.json"
+IMGBB_EXPIRY_MARGIN = 3600  # Re-upload if the hosted copy expires within this many seconds
+_imgbb_index_lock = threading.Lock()
+
+
+def _load_imgbb_index():
+    """Load the {sha256: {url, expires_at, uploaded_at}} upload index."""
+    if not os.path.exists(IMGBB_INDEX_PATH):
+        return {}
+    try:
+        with open(IMGBB_INDEX_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"⚠️  Could not read ImgBB index: {e}")
+        return {}
+
+
+def _lookup_imgbb_index(digest):
+    """Return the cached URL for an image hash, or None if missing/expiring."""
+    entry = _load_imgbb_index().get(digest)
+    if not entry:
+        return None
+    expires_at = entry.get("expires_at")
+    if expires_at and expires_at - IMGBB_EXPIRY_MARGIN <= time.time():
+        return None
+    return entry["url"]
+
+
+def _record_imgbb_upload(digest, url, expiration):
+    """Store a hosted URL for an image hash."""
+    with _imgbb_index_lock:
+        index = _load_imgbb_index()
+        index[digest] = {
+            "url": url,
+            "expires_at": time.time() + expiration if expiration else None,
+            "uploaded_at": datetime.now().isoformat()
+        }
+        tmp_path = IMGBB_INDEX_PATH + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp_path, IMGBB_INDEX_PATH)
+
+
 # ------------------------------------------------------------
 # UPLOAD IMAGE TO IMGBB (Free Image Hosting)
 # ------------------------------------------------------------
-def upload_to_imgbb(image_path):
-    """Upload local image to ImgBB and return public URL."""
+def file_sha256(path):
+    """SHA-256 hex digest of a file's contents."""
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def upload_to_imgbb(image_path, timeout=HTTP_TIMEOUT):
+    """Upload local image to ImgBB and return public URL.
+
+    Identical image bytes are only uploaded once: the SHA-256 of the file is
+    looked up in a local index and the cached URL is returned while it is
+    still valid.
+    """
     
     # Check if API key is configured
     if not IMGBB_API_KEY or IMGBB_API_KEY == "":
@@ -360,21 +683,38 @@ def upload_to_imgbb(image_path):
         return None
     
     try:
-        print(f"📤 Uploading to ImgBB: {image_path}")
-        
         with open(image_path, "rb") as file:
-            response = requests.post(
-                "https://api.imgbb.com/1/upload",
-                data={"key": IMGBB_API_KEY},
-                files={"image": file},
-                timeout=30
-            )
+            image_bytes = file.read()
+
+        digest = hashlib.sha256(image_bytes).hexdigest()
+        cached_url = _lookup_imgbb_index(digest)
+        if cached_url:
+            print(f"✓ Reusing ImgBB upload (same content): {cached_url}")
+            return cached_url
+
+        print(f"📤 Uploading to ImgBB: {image_path} ({len(image_bytes) / 1024:.0f} KB)")
+
+        data = {"key": IMGBB_API_KEY}
+        if IMGBB_EXPIRATION:
+            data["expiration"] = IMGBB_EXPIRATION
+
+        started = time.monotonic()
+        response = requests.post(
+            "https://api.imgbb.com/1/upload",
+            data=data,
+            files={"image": (os.path.basename(image_path), image_bytes)},
+            timeout=timeout
+        )
+        elapsed = time.monotonic() - started
         
         if response.status_code == 200:
             data = response.json()
             if data.get("success"):
                 url = data["data"]["url"]
-                print(f"✓ Uploaded to ImgBB: {url}")
+                print(f"✓ Uploaded to ImgBB: {url} "
+                      f"({len(image_bytes) / 1024:.0f} KB in {elapsed:.2f}s)")
+                expiration = int(data["data"].get("expiration") or 0)
+                _record_imgbb_upload(digest, url, expiration)
                 return url
             else:
                 print(f"⚠️  ImgBB upload failed: {data.get('error', 'Unknown error')}")
@@ -388,10 +728,364 @@ def upload_to_imgbb(image_path):
         return None
 
 
+# Replicate deletes prediction outputs about an hour after they are created
+REPLICATE_DELIVERY_PREFIX = "https://replicate.delivery/"
+
+
+def rehost_images(images, timeout=HTTP_TIMEOUT):
+    """Copy temporary Replicate image URLs to ImgBB so they outlive Replicate's retention.
+
+    Updates images["image_urls"] and images["variants"] in place. URLs that
+    cannot be re-hosted (no ImgBB key, download or upload error) are kept.
+
+    Returns:
+        int: Number of URLs that were re-hosted
+    """
+    rehosted = {}
+    for url in images.get("image_urls") or []:
+        if url in rehosted or not isinstance(url, str) or not url.startswith(REPLICATE_DELIVERY_PREFIX):
+            continue
+        try:
+            buffer = download_image(url, timeout=timeout)
+            data = buffer.getvalue()
+            buffer.close()
+            ext = os.path.splitext(url.split("?")[0])[1] or ".png"
+            os.makedirs("images", exist_ok=True)
+            local_file = f"images/rehosted_{hashlib.sha256(data).hexdigest()[:16]}{ext}"
+            with open(local_file, "wb") as f:
+                f.write(data)
+        except Exception as e:
+            print(f"⚠️  Could not download {url} for re-hosting: {e}")
+            continue
+        web_url = upload_to_imgbb(local_file, timeout=timeout)
+        if web_url:
+            rehosted[url] = web_url
+
+    if rehosted:
+        images["image_urls"] = [rehosted.get(url, url) for url in images["image_urls"]]
+        if images.get("variants"):
+            images["variants"] = [[rehosted.get(url, url) for url in urls] for urls in images["variants"]]
+        print(f"✓ Re-hosted {len(rehosted)} Replicate image(s) on ImgBB")
+    return len(rehosted)
+
+
+def unavailable_image_urls(urls, timeout=HTTP_TIMEOUT):
+    """Return the web URLs in urls that no longer answer with 2xx (local paths are skipped)."""
+    unavailable = []
+    for url in urls or []:
+        if not isinstance(url, str) or not url.startswith(("http://", "https://")):
+            continue
+        try:
+            response = requests.head(url, timeout=timeout, allow_redirects=True)
+            if not 200 <= response.status_code < 300:
+                unavailable.append(url)
+        except requests.exceptions.RequestException:
+            unavailable.append(url)
+    return unavailable
+
+
 # ------------------------------------------------------------
 # AI IMAGE GENERATION WITH TEXT OVERLAY
 # ------------------------------------------------------------
-def generate_images(prompts, brand_text=None, website_text="", text_size=80):
+def _finish_image(
+    clean_url, brand_text, website_text, text_size, delivery_queue, budget=None, image_data=None, brand=None
+):
+    """Brand and host one generated image.
+
+    Args:
+        image_data: Already downloaded bytes of clean_url (BytesIO), reused for the overlay
+        brand: Optional BrandProfile (font, colors, watermark)
+
+    Returns:
+        tuple: (final URL, delivery id of a queued upload or None)
+    """
+
+    # DECISION: Add text overlay or use clean image?
+    if not brand_text:
+        # No text overlay requested - use clean Replicate URL
+        print(f"   Using clean image (no text overlay)")
+        if image_data is not None:
+            image_data.close()
+        return clean_url, None
+
+    if budget is not None and not budget.has_time_for(OVERLAY_RESERVE):
+        budget.degrade("skipping text overlay, using clean image")
+        if image_data is not None:
+            image_data.close()
+        return clean_url, None
+
+    overlay_info = f"'{brand_text}'"
+    if website_text:
+        overlay_info += f" + '{website_text}'"
+    print(f"✍️  Adding text overlay: {overlay_info} (size: {text_size})")
+    
+    try:
+        # Download and add text overlay with custom size and optional second line
+        local_file = add_brand_text(
+            clean_url,
+            brand_text=brand_text,
+            website_text=website_text,
+            text_size=text_size,
+            timeout=_call_timeout(budget, HTTP_TIMEOUT),
+            image_data=image_data,
+            brand=brand
+        )
+        
+        # Upload branded image to ImgBB
+        uploaded_url = upload_to_imgbb(local_file, timeout=_call_timeout(budget, HTTP_TIMEOUT))
+        
+        if uploaded_url:
+            # Successfully uploaded branded image
+            print(f"✅ Using branded image URL: {uploaded_url}")
+            return uploaded_url, None
+
+        # Upload failed - fallback to clean image
+        print(f"⚠️  Upload failed, using clean image instead")
+        if delivery_queue is not None:
+            delivery_id = delivery_queue.enqueue(
+                "imgbb", {"image_path": local_file}, dedupe_key=f"imgbb:{file_sha256(local_file)}"
+            )
+            print(f"   📬 Branded upload queued for retry (delivery {delivery_id})")
+            return clean_url, delivery_id
+        return clean_url, None
+        
+    except Exception as e:
+        print(f"⚠️ Text overlay failed: {e}")
+        # Fallback to clean image
+        return clean_url, None
+
+
+MAX_IMAGES_PER_PROMPT = 4  # flux-schnell num_outputs limit
+
+
+def _generate_clean_urls_blocking(image_prompts, images_per_prompt=1, timeout=PREDICTION_TIMEOUT):
+    """Yield (index, list of clean URLs) generating one prompt at a time.
+
+    Each prediction goes through the shared poller so it is canceled after
+    timeout seconds (replicate.run() would wait forever).
+    """
+    poller = get_prediction_poller()
+    for i, prompt in enumerate(image_prompts, 1):
+        print(f"\n🎨 Generating image {i}/{len(image_prompts)}...")
+        print(f"   Prompt: {prompt[:100]}...")
+
+        try:
+            # Generate AI image
+            output = poller.submit(
+                prompt, extra_input={"num_outputs": images_per_prompt}, timeout=timeout
+            ).result()["output"]
+            
+            if not output or len(output) == 0:
+                print(f"⚠️ No output from Replicate for prompt {i}")
+                yield i, []
+                continue
+            
+            # Convert FileOutput to string URL
+            yield i, [str(item) for item in output if item]
+
+        except Exception as e:
+            print(f"❌ Image generation error for prompt {i}: {str(e)}")
+            yield i, []
+
+
+def _generate_clean_urls_async(image_prompts, images_per_prompt=1, webhook=False, timeout=None):
+    """Yield (index, list of clean URLs) with all predictions in flight at once."""
+    poller = get_prediction_poller(webhook=webhook)
+
+    futures = []
+    for i, prompt in enumerate(image_prompts, 1):
+        print(f"🎨 Submitting prediction {i}/{len(image_prompts)}: {prompt[:80]}...")
+        try:
+            futures.append((i, poller.submit(
+                prompt, extra_input={"num_outputs": images_per_prompt}, timeout=timeout
+            )))
+        except Exception as e:
+            print(f"❌ Could not create prediction for prompt {i}: {e}")
+            futures.append((i, None))
+
+    print(f"⏳ Waiting for {poller.in_flight()} predictions...")
+    for i, future in futures:
+        if future is None:
+            yield i, []
+            continue
+        try:
+            yield i, future.result()["output"]
+        except Exception as e:
+            print(f"❌ Image generation error for prompt {i}: {str(e)}")
+            yield i, []
+
+
+def _regenerate_image(prompt, prediction_mode="blocking", timeout=PREDICTION_TIMEOUT):
+    """Generate one replacement image for a prompt with a fresh seed. Returns a URL or None."""
+    extra_input = {"num_outputs": 1, "seed": random.randint(0, 2**31 - 1)}
+    try:
+        poller = get_prediction_poller(webhook=prediction_mode == "webhook")
+        urls = poller.submit(prompt, extra_input=extra_input, timeout=timeout).result()["output"]
+    except Exception as e:
+        print(f"❌ Replacement image generation failed: {e}")
+        return None
+    return urls[0] if urls else None
+
+
+def _screen_generated_image(clean_url, prompt, accepted_hashes, prediction_mode, timeout, budget=None):
+    """Screen a generated image and regenerate it while it is rejected.
+
+    Accepted images add their hash to accepted_hashes, so later images of the
+    campaign are checked against them for near-duplicates.
+
+    Returns:
+        tuple: (clean URL, downloaded bytes as BytesIO) - (None, None) if every
+        attempt was rejected
+    """
+    for attempt in range(SCREEN_MAX_RETRIES + 1):
+        if attempt:
+            if budget is not None and not budget.can_afford("image"):
+                budget.degrade("no budget to regenerate a rejected image")
+                return None, None
+            print(f"🔁 Regenerating rejected image (attempt {attempt}/{SCREEN_MAX_RETRIES})...")
+            clean_url = _regenerate_image(prompt, prediction_mode, timeout)
+            if budget is not None:
+                budget.charge("image")
+            if not clean_url:
+                return None, None
+
+        try:
+            buffer = download_image(clean_url, timeout=_call_timeout(budget, HTTP_TIMEOUT))
+            report = screen_image(buffer, accepted_hashes)
+        except Exception as e:
+            # Could not screen - let the normal branding path handle the image
+            print(f"⚠️  Could not screen image: {e}")
+            return clean_url, None
+
+        if report["ok"]:
+            accepted_hashes.append(report["hash"])
+            buffer.seek(0)
+            return clean_url, buffer
+
+        buffer.close()
+        print(f"🚫 Image rejected: {'; '.join(report['reasons'])}")
+
+    print("❌ Dropping image: still rejected after regeneration")
+    return None, None
+
+
+# ------------------------------------------------------------
+# IMAGE LIBRARY (INDEX + REUSE OF GENERATED IMAGES)
+# ------------------------------------------------------------
+_image_index = None
+_image_index_lock = threading.Lock()
+
+
+def get_image_index():
+    """Return the shared image index (one per process)."""
+    global _image_index
+    with _image_index_lock:
+        if _image_index is None:
+            _image_index = ImageIndex()
+        return _image_index
+
+
+def embed_texts(texts, budget=None):
+    """Embed a list of texts in one request (charged to the budget, if any)."""
+    if budget is not None and not budget.can_afford("embedding"):
+        raise BudgetExceeded("No budget left for prompt embeddings")
+    response = client.embeddings.create(
+        model=EMBEDDING_MODEL, input=list(texts), timeout=_call_timeout(budget, OPENAI_TIMEOUT)
+    )
+    if budget is not None:
+        budget.charge("embedding")
+    return [item.embedding for item in response.data]
+
+
+def _find_reusable_images(image_prompts, embeddings, images_per_prompt):
+    """Pick library images for prompts that are close to an indexed prompt.
+
+    A prompt is only served from the library if enough distinct images match
+    and all of them could be hosted.
+
+    Returns:
+        dict: {prompt index (1-based): [library image dicts with a hosted "url"]}
+    """
+    index = get_image_index()
+    reused = {}
+    chosen_hashes = []
+
+    for i, embedding in enumerate(embeddings, 1):
+        matches = index.nearest(
+            embedding,
+            k=images_per_prompt,
+            min_similarity=IMAGE_REUSE_SIMILARITY,
+            exclude_hashes=chosen_hashes,
+            cooldown_seconds=IMAGE_REUSE_COOLDOWN_DAYS * 86400
+        )
+        if len(matches) < images_per_prompt:
+            continue
+
+        for match in matches:
+            match["url"] = upload_to_imgbb(match["path"])
+        if not all(match["url"] for match in matches):
+            print(f"⚠️  Could not host library images for prompt {i}, generating instead")
+            continue
+
+        for match in matches:
+            index.mark_used(match["id"])
+            chosen_hashes.append(match["phash"])
+        reused[i] = matches
+        print(f"♻️  Prompt {i} matches {len(matches)} library image(s) "
+              f"(similarity {matches[0]['similarity']})")
+
+    return reused
+
+
+def _index_generated_image(clean_url, prompt, embedding, image_data=None, budget=None):
+    """Add a generated image to the library. Returns its bytes (BytesIO) for reuse, or None."""
+    try:
+        if image_data is None:
+            image_data = download_image(clean_url, timeout=_call_timeout(budget, HTTP_TIMEOUT))
+        image_bytes = image_data.getvalue()
+        get_image_index().add(
+            prompt, embedding, image_bytes, image_hash(BytesIO(image_bytes)), source_url=clean_url
+        )
+    except Exception as e:
+        print(f"⚠️  Could not index image: {e}")
+    if image_data is not None:
+        image_data.seek(0)
+    return image_data
+
+
+def _merge_reused_images(num_prompts, generate_indices, generated, reused):
+    """Yield (index, items) in prompt order from generated URLs and reused library images.
+
+    Prompts that were neither reused nor generated (cut by the budget) yield [].
+    """
+    generated = iter(generated)
+    generate_indices = set(generate_indices)
+    for i in range(1, num_prompts + 1):
+        if i in reused:
+            yield i, reused[i]
+        elif i in generate_indices:
+            _, urls = next(generated)
+            yield i, urls
+        else:
+            yield i, []
+
+
+def generate_images(
+    prompts,
+    brand_text=None,
+    website_text="",
+    text_size=80,
+    delivery_queue=None,
+    prediction_mode="blocking",
+    prediction_timeout=None,
+    images_per_prompt=1,
+    budget=None,
+    screen=SCREEN_IMAGES,
+    reuse_images=IMAGE_REUSE,
+    index_images=IMAGE_INDEX,
+    generated_urls=None,
+    brand=None
+):
     """Generate images with optional text overlay.
     
     Args:
@@ -399,88 +1093,365 @@ def generate_images(prompts, brand_text=None, website_text="", text_size=80):
         brand_text: Text to overlay on images - Line 1 (None = no overlay, clean images only)
         website_text: Website/tagline text - Line 2 (optional)
         text_size: Font size for text overlay (default: 80)
+        delivery_queue: Optional DeliveryQueue - failed ImgBB uploads are queued for retry
+        prediction_mode: "blocking" (replicate.run, one image at a time), "poll" (all
+            predictions created up front and tracked by the shared poller) or "webhook"
+            (same, completions delivered to the local webhook receiver)
+        prediction_timeout: Seconds before a prediction is canceled (None = PREDICTION_TIMEOUT)
+        images_per_prompt: Image variants per prompt, requested in ONE prediction
+            via the model's num_outputs (1-4)
+        budget: Optional RunBudget - caps the number of images by remaining cost,
+            bounds predictions by the deadline and skips the overlay when time runs out
+        screen: Screen every image (blank frames, text leaks, near-duplicates) before
+            branding; rejected images are regenerated up to SCREEN_MAX_RETRIES times
+            and dropped if they still fail
+        reuse_images: Serve prompts that closely match an indexed prompt from the
+            image library instead of calling Replicate
+        index_images: Add every accepted generated image to the image library
+        generated_urls: {prompt index (1-based): clean URLs} for prompts that were
+            already generated elsewhere (speculative mode); they are not generated again
+        brand: Optional BrandProfile - font, colors and watermark of the overlay
     
     Returns:
         Dictionary with image_urls list
         - If brand_text provided: URLs of uploaded branded images (or clean if upload fails)
         - If brand_text is None: Clean Replicate URLs
+        - clean_urls: the unbranded image behind each image_urls entry
+        - variants: one list of URLs per prompt, in prompt order (empty list if
+          that prompt failed or its images were screened out)
+        - post_positions: the post each prompt belongs to (copied from prompts)
+        - pending_uploads (only with delivery_queue): {image index: delivery id} for
+          branded images whose upload was queued for retry
     """
     
     if not prompts or "image_prompts" not in prompts or not prompts["image_prompts"]:
         print("⚠️ No image prompts provided")
         return {"image_urls": []}
 
-    image_urls = []
+    if not 1 <= images_per_prompt <= MAX_IMAGES_PER_PROMPT:
+        raise ValueError(f"images_per_prompt must be between 1 and {MAX_IMAGES_PER_PROMPT}")
 
-    for i, prompt in enumerate(prompts["image_prompts"], 1):
-        print(f"\n🎨 Generating image {i}/{len(prompts['image_prompts'])}...")
-        print(f"   Prompt: {prompt[:100]}...")
+    image_prompts = prompts["image_prompts"]
+    prediction_timeout = prediction_timeout or PREDICTION_TIMEOUT
 
+    embeddings = None
+    reused = dict(generated_urls or {})
+    if reuse_images or index_images:
         try:
-            # Generate AI image
-            output = replicate_client.run(
-                "black-forest-labs/flux-schnell",
-                input={"prompt": prompt}
+            # Only the subject is embedded: the shared style and no-text suffix
+            # would make every prompt look alike
+            embeddings = embed_texts([image_prompt_body(prompt) for prompt in image_prompts], budget)
+        except Exception as e:
+            print(f"⚠️  Could not embed image prompts, image library skipped: {e}")
+    if reuse_images and embeddings and not generated_urls:
+        reused = _find_reusable_images(image_prompts, embeddings, images_per_prompt)
+    generate_indices = [i for i in range(1, len(image_prompts) + 1) if i not in reused]
+
+    if budget is not None:
+        affordable = budget.affordable("image")
+        if affordable is not None and affordable < len(generate_indices) * images_per_prompt:
+            images_per_prompt = max(1, min(images_per_prompt, affordable))
+            generate_indices = generate_indices[:affordable // images_per_prompt]
+            budget.degrade(
+                f"cutting images to {len(generate_indices)} prompt(s) x {images_per_prompt}"
             )
-            
-            if not output or len(output) == 0:
-                print(f"⚠️ No output from Replicate for prompt {i}")
-                continue
-            
-            # Convert FileOutput to string URL
-            clean_url = str(output[0]) if output[0] else None
-            
-            if not clean_url:
-                print(f"⚠️ No URL in output for prompt {i}")
-                continue
-                
-            print(f"✓ Generated clean image: {clean_url}")
-
-            # DECISION: Add text overlay or use clean image?
-            if brand_text:
-                overlay_info = f"'{brand_text}'"
-                if website_text:
-                    overlay_info += f" + '{website_text}'"
-                print(f"✍️  Adding text overlay: {overlay_info} (size: {text_size})")
-                
-                try:
-                    # Download and add text overlay with custom size and optional second line
-                    local_file = add_brand_text(clean_url, brand_text=brand_text, website_text=website_text, text_size=text_size)
-                    
-                    # Upload branded image to ImgBB
-                    uploaded_url = upload_to_imgbb(local_file)
-                    
-                    if uploaded_url:
-                        # Successfully uploaded branded image
-                        print(f"✅ Using branded image URL: {uploaded_url}")
-                        image_urls.append(uploaded_url)
-                    else:
-                        # Upload failed - fallback to clean image
-                        print(f"⚠️  Upload failed, using clean image instead")
-                        image_urls.append(clean_url)
-                    
-                except Exception as e:
-                    print(f"⚠️ Text overlay failed: {e}")
-                    # Fallback to clean image
-                    image_urls.append(clean_url)
+        if not generate_indices and not reused:
+            return {"image_urls": []}
+
+        # Deadline-bound runs keep every prediction in flight at once
+        if budget.deadline is not None:
+            if prediction_mode == "blocking":
+                prediction_mode = "poll"
+            prediction_timeout = budget.timeout(prediction_timeout)
+        budget.charge("image", len(generate_indices) * images_per_prompt)
+
+    to_generate = [image_prompts[i - 1] for i in generate_indices]
+    if prediction_mode == "blocking":
+        generated = _generate_clean_urls_blocking(to_generate, images_per_prompt, prediction_timeout)
+    elif prediction_mode in ("poll", "webhook"):
+        generated = _generate_clean_urls_async(
+            to_generate,
+            images_per_prompt,
+            webhook=prediction_mode == "webhook",
+            timeout=prediction_timeout
+        )
+    else:
+        raise ValueError(f"Unknown prediction mode: {prediction_mode}")
+    clean_urls = _merge_reused_images(len(image_prompts), generate_indices, generated, reused)
+
+    image_urls = []
+    clean_image_urls = []  # Unbranded source of each image_urls entry (e.g. for reels)
+    variants = []
+    pending_uploads = {}
+    accepted_hashes = []  # dHashes of accepted images, for near-duplicate screening
+
+    for i, prompt_urls in clean_urls:
+        variants.append([])
+        if not prompt_urls:
+            print(f"⚠️ No URL in output for prompt {i}")
+            continue
+
+        for clean_url in prompt_urls:
+            image_data = None
+            if isinstance(clean_url, dict):
+                # Library image: it was screened when it was indexed
+                library_image = clean_url
+                clean_url = library_image["url"]
+                with open(library_image["path"], "rb") as f:
+                    image_data = BytesIO(f.read())
+                accepted_hashes.append(library_image["phash"])
+                print(f"♻️  Reusing library image {library_image['id']}: {clean_url}")
             else:
-                # No text overlay requested - use clean Replicate URL
-                print(f"   Using clean image (no text overlay)")
-                image_urls.append(clean_url)
-            
+                print(f"✓ Generated clean image: {clean_url}")
+                if screen:
+                    clean_url, image_data = _screen_generated_image(
+                        clean_url, image_prompts[i - 1], accepted_hashes,
+                        prediction_mode, prediction_timeout, budget
+                    )
+                    if clean_url is None:
+                        continue
+                if index_images and embeddings:
+                    image_data = _index_generated_image(
+                        clean_url, image_prompts[i - 1], embeddings[i - 1], image_data, budget
+                    )
+            final_url, delivery_id = _finish_image(
+                clean_url, brand_text, website_text, text_size, delivery_queue, budget, image_data, brand
+            )
+            if delivery_id is not None:
+                pending_uploads[len(image_urls)] = delivery_id
+            image_urls.append(final_url)
+            clean_image_urls.append(clean_url)
+            variants[-1].append(final_url)
+
+        if prediction_mode == "blocking" and i not in reused:
             # Small delay to avoid rate limiting
             time.sleep(1)
 
-        except Exception as e:
-            print(f"❌ Image generation error for prompt {i}: {str(e)}")
-            continue
-
     if brand_text:
         print(f"\n✅ Generated {len(image_urls)} images with text overlay: '{brand_text}'")
     else:
         print(f"\n✅ Generated {len(image_urls)} clean images (no text overlay)")
     
-    return {"image_urls": image_urls}
+    result = {"image_urls": image_urls, "clean_urls": clean_image_urls, "variants": variants}
+    if prompts.get("post_positions") is not None:
+        result["post_positions"] = list(prompts["post_positions"])
+    if pending_uploads:
+        result["pending_uploads"] = pending_uploads
+    return result
+
+
+# ------------------------------------------------------------
+# SPECULATIVE IMAGE GENERATION
+# ------------------------------------------------------------
+SPECULATION_POLICIES = ("first_ready", "smart_within_deadline")
+
+
+def _first_successful(futures):
+    """Return (future, result) of the first future that succeeds; raise if all fail."""
+    error = None
+    for future in as_completed(futures):
+        try:
+            return future, future.result()
+        except Exception as e:
+            error = e
+    raise error
+
+
+def _speculate_post(post, poller, images_per_prompt, policy, smart_deadline, timeout, budget, style=None):
+    """Race a fallback-prompt prediction against the smart prompt for one post.
+
+    Every prediction is reserved in the budget before it is submitted. If
+    the race can't be afforded the post gets a single prediction instead.
+
+    Returns:
+        tuple: (winning prompt, list of clean URLs)
+    """
+    title = post.get("title", "")
+    caption = post.get("caption", "")
+    extra_input = {"num_outputs": images_per_prompt}
+    started = time.monotonic()
+    fallback = fallback_image_prompt(title, caption, style)
+
+    if budget is not None and not budget.can_afford("image", 2 * images_per_prompt):
+        budget.degrade(f"no budget to speculate, generating one image prompt: {title[:50]}")
+        return _generate_single_post(title, caption, fallback, poller, extra_input, timeout, budget, style)
+
+    # Start right away from the deterministic fallback prompt
+    if budget is not None and not budget.reserve("image", images_per_prompt):
+        budget.degrade(f"no budget for an image: {title[:50]}")
+        return fallback, []
+    fallback_future = poller.submit(fallback, extra_input=extra_input, timeout=timeout)
+
+    try:
+        smart = smart_image_prompt(title, caption, budget, style)
+    except Exception as e:
+        print(f"⚠️ Smart prompt unavailable for '{title[:50]}', keeping fallback: {e}")
+        smart = None
+
+    if smart is not None and policy == "first_ready" and fallback_future.done() \
+            and fallback_future.exception() is None:
+        print(f"🏁 Fallback image for '{title[:50]}' finished before the smart prompt")
+        smart = None
+    if smart is not None and budget is not None and not budget.reserve("image", images_per_prompt):
+        budget.degrade(f"no budget for a smart-prompt image, keeping fallback: {title[:50]}")
+        smart = None
+
+    if smart is None:
+        return fallback, fallback_future.result()["output"]
+
+    smart_future = poller.submit(smart, extra_input=extra_input, timeout=timeout)
+
+    if policy == "first_ready":
+        winner, result = _first_successful([fallback_future, smart_future])
+    else:
+        remaining = max(0.0, smart_deadline - (time.monotonic() - started))
+        try:
+            winner, result = smart_future, smart_future.result(timeout=remaining)
+        except Exception as e:
+            print(f"⏱️  Smart image for '{title[:50]}' not ready in time, using fallback "
+                  f"({str(e) or 'deadline reached'})")
+            winner, result = _first_successful([fallback_future])
+
+    loser = fallback_future if winner is smart_future else smart_future
+    poller.cancel(loser)
+    label = "smart" if winner is smart_future else "fallback"
+    print(f"🏁 Using {label} image for '{title[:50]}' after {time.monotonic() - started:.1f}s")
+    return (smart if winner is smart_future else fallback), result["output"]
+
+
+def _generate_single_post(title, caption, fallback, poller, extra_input, timeout, budget, style=None):
+    """Non-speculative path for one post: write the prompt, then run one prediction.
+
+    Returns:
+        tuple: (prompt, list of clean URLs)
+    """
+    try:
+        prompt = smart_image_prompt(title, caption, budget, style)
+    except Exception as e:
+        print(f"⚠️ Smart prompt unavailable for '{title[:50]}', using fallback: {e}")
+        prompt = fallback
+
+    if budget is not None and not budget.reserve("image", extra_input["num_outputs"]):
+        budget.degrade(f"no budget for an image: {title[:50]}")
+        return prompt, []
+    return prompt, poller.submit(prompt, extra_input=extra_input, timeout=timeout).result()["output"]
+
+
+def generate_images_speculative(
+    posts,
+    policy="first_ready",
+    smart_deadline=20,
+    brand_text=None,
+    website_text="",
+    text_size=80,
+    delivery_queue=None,
+    webhook=False,
+    prediction_timeout=None,
+    images_per_prompt=1,
+    budget=None,
+    brand=None
+):
+    """Generate images while the smart prompts are still being written.
+
+    For every post a prediction starts immediately from the fallback prompt
+    and another one from the smart prompt once it is ready; the loser is
+    canceled. Costs up to two predictions per post; posts the budget can't
+    race get a single prediction (recorded as a degradation).
+
+    Args:
+        posts: Dictionary with posts list
+        policy: "first_ready" (whichever image finishes first) or "smart_within_deadline"
+            (the smart image if it finishes within smart_deadline, else the fallback)
+        smart_deadline: Seconds from the start of a post's race the smart image may take
+        webhook: Collect predictions by webhook instead of polling
+        brand: Optional BrandProfile - its image_style is added to both prompts
+        Other arguments as for generate_images
+
+    Returns:
+        tuple: (prompts dict with the winning image_prompts, images dict as from generate_images)
+    """
+    if policy not in SPECULATION_POLICIES:
+        raise ValueError(f"Unknown speculation policy: {policy}")
+    if not 1 <= images_per_prompt <= MAX_IMAGES_PER_PROMPT:
+        raise ValueError(f"images_per_prompt must be between 1 and {MAX_IMAGES_PER_PROMPT}")
+
+    post_positions = [i for i, p in enumerate((posts or {}).get("posts", [])) if p.get("title")]
+    post_list = [posts["posts"][i] for i in post_positions]
+    if not post_list:
+        return {"image_prompts": [], "post_positions": []}, {"image_urls": []}
+    prediction_timeout = prediction_timeout or PREDICTION_TIMEOUT
+    if budget is not None:
+        prediction_timeout = budget.timeout(prediction_timeout)
+
+    poller = get_prediction_poller(webhook=webhook)
+    print(f"🏎️  Speculative image generation for {len(post_list)} posts (policy: {policy})")
+
+    with ThreadPoolExecutor(max_workers=len(post_list), thread_name_prefix="speculate") as executor:
+        futures = [
+            executor.submit(
+                _speculate_post, post, poller, images_per_prompt,
+                policy, smart_deadline, prediction_timeout, budget,
+                brand.image_style if brand is not None else None
+            )
+            for post in post_list
+        ]
+
+    image_prompts = []
+    generated_urls = {}
+    for i, (post, future) in enumerate(zip(post_list, futures), 1):
+        try:
+            prompt, urls = future.result()
+        except Exception as e:
+            print(f"❌ Image generation error for prompt {i}: {e}")
+            prompt, urls = fallback_image_prompt(
+                post["title"], post.get("caption", ""), brand.image_style if brand is not None else None
+            ), []
+        image_prompts.append(prompt)
+        generated_urls[i] = urls
+
+    prompts = {"image_prompts": image_prompts, "post_positions": post_positions}
+    images = generate_images(
+        prompts,
+        brand_text=brand_text,
+        website_text=website_text,
+        text_size=text_size,
+        delivery_queue=delivery_queue,
+        prediction_mode="webhook" if webhook else "poll",
+        prediction_timeout=prediction_timeout,
+        images_per_prompt=images_per_prompt,
+        budget=budget,
+        generated_urls=generated_urls,
+        brand=brand
+    )
+    return prompts, images
+
+
+def primary_image_index(images, position):
+    """Return the index in image_urls of the main image for a post position.
+
+    That is the first variant of the prompt written for the post (variants
+    and post_positions), so a prompt that failed or was screened out only
+    leaves its own post without an image. A shared image (custom design) goes
+    with every post. Returns None if there is none.
+    """
+    image_urls = images.get("image_urls") or []
+    if images.get("shared"):
+        return 0 if image_urls else None
+
+    variants = images.get("variants")
+    if variants is None:
+        # Outputs saved before images carried variants: matched by position
+        return position if position < len(image_urls) else None
+
+    post_positions = images.get("post_positions")
+    if post_positions is None:
+        post_positions = list(range(len(variants)))
+    if position not in post_positions:
+        return None
+    prompt_index = post_positions.index(position)
+    if prompt_index >= len(variants) or not variants[prompt_index]:
+        return None
+    return sum(len(v) for v in variants[:prompt_index])
 
 
 # ------------------------------------------------------------
@@ -576,13 +1547,213 @@ def send_to_zapier(payload):
         }
 
 
+# ------------------------------------------------------------
+# MULTI-POST ZAPIER PUBLISHING (BATCH / CONCURRENT)
+# ------------------------------------------------------------
+ZAPIER_LEDGER_PATH = "zapier_sent.json"
+_zapier_ledger_lock = threading.Lock()
+
+
+def build_zapier_items(payload):
+    """Pair every post with its image and build one Zapier item per post.
+
+    Posts are paired with the first image of their own prompt (see
+    primary_image_index). Only a shared custom design goes with every post.
+
+    Returns:
+        list: Ordered list of item dicts, each with a stable idempotency_key
+    """
+
+    posts = payload.get("posts") or []
+    if not posts:
+        raise ValueError("No posts available to send to Zapier")
+
+    images = payload.get("images") or {}
+    images_list = images.get("image_urls") or []
+    web_images = [u if u.startswith("http://") or u.startswith("https://") else None for u in images_list]
+
+    items = []
+    for position, post in enumerate(posts):
+        image_index = primary_image_index(images, position)
+        image_url = web_images[image_index] if image_index is not None else None
+
+        item = {
+            "position": position,
+            "topic": payload.get("topic", ""),
+            "caption": post.get("caption", ""),
+            "hashtags": post.get("hashtags", ""),
+            "full_text": post.get("caption", "") + " " + post.get("hashtags", ""),
+            "image_url": image_url,
+            "post_title": post.get("title", ""),
+        }
+        item["idempotency_key"] = make_idempotency_key(item)
+        items.append(item)
+
+    return items
+
+
+def make_idempotency_key(item):
+    """Return a stable key for a Zapier item (same content → same key)."""
+    raw = "\x1f".join([
+        item.get("topic", ""),
+        item.get("post_title", ""),
+        item.get("caption", ""),
+        item.get("hashtags", ""),
+        item.get("image_url") or "",
+    ])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def _load_zapier_ledger():
+    """Load the set of idempotency keys that were already delivered."""
+    if not os.path.exists(ZAPIER_LEDGER_PATH):
+        return {}
+    try:
+        with open(ZAPIER_LEDGER_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"⚠️  Could not read Zapier ledger: {e}")
+        return {}
+
+
+def _record_zapier_delivery(keys):
+    """Mark idempotency keys as delivered so retries skip them."""
+    if not keys:
+        return
+    with _zapier_ledger_lock:
+        ledger = _load_zapier_ledger()
+        sent_at = datetime.now().isoformat()
+        for key in keys:
+            ledger[key] = sent_at
+        tmp_path = ZAPIER_LEDGER_PATH + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(ledger, f, indent=2)
+        os.replace(tmp_path, ZAPIER_LEDGER_PATH)
+
+
+def _post_to_zapier(body, idempotency_key):
+    """POST a JSON body to the Zapier webhook with an Idempotency-Key header."""
+    return requests.post(
+        ZAPIER_WEBHOOK_URL,
+        json=body,
+        headers={
+            "Content-Type": "application/json",
+            "Idempotency-Key": idempotency_key
+        },
+        timeout=HTTP_TIMEOUT
+    )
+
+
+def _send_zapier_item(item):
+    """Send a single item and return its per-item status."""
+    body = dict(item, timestamp=datetime.now().isoformat())
+    try:
+        r = _post_to_zapier(body, item["idempotency_key"])
+        return {"status": r.status_code, "response": r.text[:500]}
+    except requests.exceptions.RequestException as e:
+        return {"status": "error", "response": str(e)}
+
+
+def send_all_to_zapier(payload, mode="batch", max_workers=3):
+    """Send ALL posts and images to Zapier.
+
+    Args:
+        payload: Pipeline output with posts and images
+        mode: "batch" (one webhook call with an ordered items list),
+              "concurrent" (one webhook call per post, sent in parallel) or
+              "first" (only the first post, as one item call)
+        max_workers: Thread count for concurrent mode
+
+    Returns:
+        dict: Overall status plus ordered per-item status. Items whose
+        idempotency key was already delivered are reported as "skipped".
+    """
+
+    if mode not in ("batch", "concurrent", "first"):
+        raise ValueError(f"Unknown Zapier mode: {mode}")
+
+    print("\n" + "="*60)
+    print(f"📤 SENDING ALL POSTS TO ZAPIER ({mode})")
+    print("="*60)
+
+    items = build_zapier_items(payload)
+    if mode == "first":
+        items = items[:1]
+    ledger = _load_zapier_ledger()
+
+    results = [None] * len(items)
+    pending = []
+    for item in items:
+        if item["idempotency_key"] in ledger:
+            print(f"⏭️  Post {item['position'] + 1} already delivered, skipping")
+            results[item["position"]] = {"status": "skipped", "response": "already delivered"}
+        else:
+            pending.append(item)
+
+    if pending and mode == "batch":
+        batch_key = hashlib.sha256(
+            "".join(i["idempotency_key"] for i in pending).encode("utf-8")
+        ).hexdigest()[:32]
+        body = {
+            "topic": payload.get("topic", ""),
+            "batch_id": batch_key,
+            "count": len(pending),
+            "items": pending,
+            "timestamp": datetime.now().isoformat()
+        }
+        print(f"🌐 Sending batch of {len(pending)} items to: {ZAPIER_WEBHOOK_URL}")
+        try:
+            r = _post_to_zapier(body, batch_key)
+            item_status = {"status": r.status_code, "response": r.text[:500]}
+        except requests.exceptions.RequestException as e:
+            item_status = {"status": "error", "response": str(e)}
+        for item in pending:
+            results[item["position"]] = dict(item_status)
+
+    elif pending:
+        print(f"🌐 Sending {len(pending)} items concurrently to: {ZAPIER_WEBHOOK_URL}")
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            for item, status in zip(pending, pool.map(_send_zapier_item, pending)):
+                results[item["position"]] = status
+
+    delivered = []
+    item_report = []
+    for item, status in zip(items, results):
+        if status["status"] == 200:
+            delivered.append(item["idempotency_key"])
+        print(f"   - Post {item['position'] + 1}: {status['status']}")
+        item_report.append({
+            "position": item["position"],
+            "idempotency_key": item["idempotency_key"],
+            "image_url": item["image_url"],
+            "status": status["status"],
+            "response": status["response"]
+        })
+
+    _record_zapier_delivery(delivered)
+
+    ok = [r for r in item_report if r["status"] in (200, "skipped")]
+    if len(ok) == len(item_report):
+        overall = 200
+    elif ok:
+        overall = "partial"
+    else:
+        overall = "error"
+
+    print(f"\n{'✅' if overall == 200 else '⚠️ '} Zapier status: {overall}")
+    print("="*60 + "\n")
+
+    return {"status": overall, "mode": mode, "items": item_report}
+
+
 # ------------------------------------------------------------
 # SAVE RESULT JSON
 # ------------------------------------------------------------
 def save_result_to_json(data):
     """Save pipeline result to JSON file with timestamp."""
     
-    filename = f"result_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    # Random suffix: concurrent runs (server, workers) can finish in the same second
+    filename = f"result_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.json"
     
     try:
         with open(filename, "w", encoding="utf-8") as f:
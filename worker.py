@@ -0,0 +1,170 @@
+import argparse
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+
+from jobs import get_job_queue, LeaseLost, DEFAULT_LEASE_SECONDS, JOBS_DB_PATH
+
+# ------------------------------------------------------------
+# CAMPAIGN WORKER
+# ------------------------------------------------------------
+# Start as many of these as you like, on as many machines as share the
+# queue backend:
+#
+#   python worker.py work --backend redis --redis-url redis://queue-host:6379/0
+#   python worker.py submit "AI in Education UAE" --settings '{"generate_image": true, "push_to_zap": true}'
+#   python worker.py status <job_id>
+
+
+class Heartbeat(threading.Thread):
+    """Keeps a job lease alive while the pipeline runs."""
+
+    def __init__(self, queue, job_id, worker_id, lease_seconds):
+        super().__init__(name=f"heartbeat-{job_id[:8]}", daemon=True)
+        self.queue = queue
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.lost = False
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.lease_seconds / 3):
+            try:
+                if not self.queue.heartbeat(self.job_id, self.worker_id, self.lease_seconds):
+                    print(f"⚠️  Lease lost for job {self.job_id}")
+                    self.lost = True
+                    return
+            except Exception as e:
+                print(f"⚠️  Heartbeat failed for job {self.job_id}: {e}")
+
+    def stop(self):
+        self._stop_event.set()
+
+
+class JobWorker:
+    """Pulls campaign jobs from a queue and runs them through the pipeline."""
+
+    def __init__(self, queue, agent=None, worker_id=None, lease_seconds=DEFAULT_LEASE_SECONDS, poll_interval=2.0):
+        """
+        Args:
+            queue: JobQueue backend
+            agent: SocialMediaPipelineAgent (created on first use if not provided)
+            worker_id (str): Unique worker name (default: host-pid-random)
+            lease_seconds (float): Lease length, renewed every lease_seconds / 3
+            poll_interval (float): Seconds to sleep when the queue is empty
+        """
+        self.queue = queue
+        self.agent = agent
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+
+    def _get_agent(self):
+        if self.agent is None:
+            from main import SocialMediaPipelineAgent
+            self.agent = SocialMediaPipelineAgent()
+        return self.agent
+
+    def run_forever(self):
+        print(f"👷 Worker {self.worker_id} started")
+        self._get_agent().preload_brands()
+        while True:
+            if not self.run_once():
+                time.sleep(self.poll_interval)
+
+    def run_once(self):
+        """Process one job. Returns False if the queue was empty."""
+        job = self.queue.lease(self.worker_id, self.lease_seconds)
+        if job is None:
+            return False
+        self.process(job)
+        return True
+
+    def process(self, job):
+        agent = self._get_agent()
+        job_id = job["job_id"]
+        settings = dict(job["settings"])
+        publish = settings.pop("push_to_zap", False)
+        zap_mode = settings.get("zap_mode", "first")
+
+        print(f"📥 Job {job_id} (attempt {job['attempts']}): {job['topic']}")
+        heartbeat = Heartbeat(self.queue, job_id, self.worker_id, self.lease_seconds)
+        heartbeat.start()
+
+        try:
+            # Generate without publishing; publishing is guarded below
+            output = agent.run(job["topic"], push_to_zap=False, **settings)
+
+            if publish:
+                if heartbeat.lost:
+                    raise LeaseLost(f"Lease lost before publishing job {job_id}")
+                if self.queue.claim_publish(job_id):
+                    output["zapier_status"] = agent.publish(output, zap_mode)
+                else:
+                    print(f"⏭️  Job {job_id} was already published by an earlier attempt")
+                    output["zapier_status"] = {"status": "skipped", "response": "already published"}
+
+            self.queue.complete(job_id, self.worker_id, output)
+            print(f"✅ Job {job_id} done")
+
+        except LeaseLost as e:
+            print(f"⚠️  {e} - another worker will pick it up")
+        except Exception as e:
+            print(f"❌ Job {job_id} failed: {e}")
+            try:
+                self.queue.fail(job_id, self.worker_id, e)
+            except LeaseLost:
+                pass
+        finally:
+            heartbeat.stop()
+
+
+# ------------------------------------------------------------
+# COMMAND LINE
+# ------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Distributed campaign worker")
+    parser.add_argument("--backend", choices=["sqlite", "redis"], default="sqlite")
+    parser.add_argument("--db", default=JOBS_DB_PATH, help="SQLite file (sqlite backend)")
+    parser.add_argument("--redis-url", default="redis://localhost:6379/0", help="Redis URL (redis backend)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    work = commands.add_parser("work", help="Process jobs until interrupted")
+    work.add_argument("--lease-seconds", type=float, default=DEFAULT_LEASE_SECONDS)
+
+    submit = commands.add_parser("submit", help="Queue a campaign")
+    submit.add_argument("topic")
+    submit.add_argument("--settings", default="{}", help="JSON keyword settings for agent.run")
+
+    status = commands.add_parser("status", help="Show a job")
+    status.add_argument("job_id")
+
+    args = parser.parse_args()
+
+    if args.backend == "redis":
+        queue = get_job_queue("redis", redis_url=args.redis_url)
+    else:
+        queue = get_job_queue("sqlite", db_path=args.db)
+
+    if args.command == "work":
+        try:
+            JobWorker(queue, lease_seconds=args.lease_seconds).run_forever()
+        except KeyboardInterrupt:
+            print("\n⏹️  Worker stopped")
+    elif args.command == "submit":
+        job_id = queue.submit(args.topic, json.loads(args.settings))
+        print(f"✓ Queued job {job_id}")
+    else:
+        job = queue.get(args.job_id)
+        if job is None:
+            print(f"❌ Job not found: {args.job_id}")
+        else:
+            print(json.dumps(job, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()